@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import time
+
+from azure.ai.agents.models import AgentThreadCreationOptions, MessageRole, ThreadMessageOptions
+from azure.ai.projects.aio import AIProjectClient
+from azure.core.credentials import AccessToken
+from azure.identity.aio import DefaultAzureCredential
+
+logger = logging.getLogger(__name__)
+
+TOKEN_SCOPE = "https://ai.azure.com/.default"
+TOKEN_REFRESH_MARGIN = 5 * 60  # seconds before expiry
+TOKEN_RETRY_DELAY = 30  # seconds after a failed refresh
+THREAD_DELETE_WORKERS = 4  # concurrent background thread deletions
+THREAD_DRAIN_TIMEOUT = 10  # seconds close() waits for pending deletions
+
+
+class CachedCredential:
+    """
+    Wraps a credential and hands out a cached token until shortly before
+    it expires, so the credential chain is only probed on refresh.
+    """
+
+    def __init__(self, credential):
+        self.credential = credential
+        self._tokens = {}
+
+    async def get_token(self, *scopes, **kwargs) -> AccessToken:
+        token = self._tokens.get(tuple(scopes))
+        if token and token.expires_on - time.time() > TOKEN_REFRESH_MARGIN:
+            return token
+
+        return await self.refresh(*scopes, **kwargs)
+
+    async def refresh(self, *scopes, **kwargs) -> AccessToken:
+        token = await self.credential.get_token(*scopes, **kwargs)
+        self._tokens[tuple(scopes)] = token
+        return token
+
+    async def close(self):
+        await self.credential.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+async def ask_agent_once(client, agent_id: str, content: str):
+    """
+    Creates a thread with the user message and runs the agent on it in one
+    call, then reads only the agent's last reply.
+    Returns (run, reply text or None); run.thread_id is left for the caller to discard.
+    """
+    run = await client.agents.create_thread_and_process_run(
+        agent_id=agent_id,
+        thread=AgentThreadCreationOptions(
+            messages=[ThreadMessageOptions(role=MessageRole.USER, content=content)]
+        )
+    )
+    if getattr(run, "status", None) == "failed":
+        return run, None
+
+    message = await client.agents.messages.get_last_message_text_by_role(
+        thread_id=run.thread_id,
+        role=MessageRole.AGENT
+    )
+    return run, message.text.value if message else None
+
+
+class ThreadCleaner:
+    """
+    Deletes finished agent threads from background workers, so the reply
+    is not held up by the delete call and threads do not pile up on the project.
+    """
+
+    def __init__(self, workers: int = THREAD_DELETE_WORKERS):
+        self.worker_count = workers
+        self.deleted = 0
+        self.failed = 0
+        self._queue = None
+        self._workers = []
+
+    def start(self):
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.worker_count)]
+
+    def discard(self, client, thread_id: str):
+        if thread_id and self._queue is not None:
+            self._queue.put_nowait((client, thread_id))
+
+    async def close(self, timeout: float = THREAD_DRAIN_TIMEOUT):
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{self._queue.qsize()} agent threads left undeleted")
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "deleted": self.deleted,
+            "failed": self.failed
+        }
+
+    async def _work(self):
+        while True:
+            client, thread_id = await self._queue.get()
+            try:
+                await client.agents.threads.delete(thread_id)
+                self.deleted += 1
+            except Exception:
+                self.failed += 1
+                logger.warning(f"Could not delete agent thread {thread_id}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+
+class AgentClientManager:
+    """
+    Application-scoped AIProjectClient.
+
+    start() builds the (async) client once and keeps its token warm from a
+    background task; close() tears both down. Tests can pass their own
+    client_factory / credential_factory to substitute a local fake.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        credential_factory=DefaultAzureCredential,
+        client_factory=AIProjectClient
+    ):
+        self.endpoint = endpoint
+        self.credential_factory = credential_factory
+        self.client_factory = client_factory
+        self.credential = None
+        self._client = None
+        self._refresher = None
+        self.threads = ThreadCleaner()
+
+    @property
+    def client(self):
+        if self._client is None:
+            raise RuntimeError("Agent client is not started")
+        return self._client
+
+    async def start(self):
+        if self._client is not None:
+            return
+
+        self.credential = CachedCredential(self.credential_factory())
+        self._client = self.client_factory(
+            endpoint=self.endpoint,
+            credential=self.credential
+        )
+        self._refresher = asyncio.create_task(self._refresh_loop())
+        self.threads.start()
+
+    async def close(self):
+        # Pending thread deletions still need the client
+        await self.threads.close()
+
+        if self._refresher is not None:
+            self._refresher.cancel()
+            try:
+                await self._refresher
+            except asyncio.CancelledError:
+                pass
+            self._refresher = None
+
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+        if self.credential is not None:
+            await self.credential.close()
+            self.credential = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self.client
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                token = await self.credential.refresh(TOKEN_SCOPE)
+                delay = max(token.expires_on - time.time() - TOKEN_REFRESH_MARGIN, TOKEN_RETRY_DELAY)
+            except Exception:
+                logger.exception("Agent token refresh failed")
+                delay = TOKEN_RETRY_DELAY
+
+            await asyncio.sleep(delay)
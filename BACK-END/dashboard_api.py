@@ -1,19 +1,83 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
+from fastapi import Depends, FastAPI, HTTPException, Request, Response
+from pydantic import BaseModel, Field, model_validator
+from typing import Literal, Optional
+import asyncio
 import json
-import re
-import requests
 
-from azure.ai.projects import AIProjectClient
-from azure.identity import DefaultAzureCredential
-from azure.ai.agents.models import ListSortOrder
+from azure.ai.projects.aio import AIProjectClient
+from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+
+from agent_client import AgentClientManager, ask_agent_once
+from mcp_client import MCPClient, MCPError
+
+from intent_resolver import resolve_intent
+from json_extract import clean_payload, extract_json_from_response
+from payload_cache import PayloadCache
+from prompts import extraction_prompt
+from tools import employee_kpi, uniform_entitlement_kpi
+from tools.normalize import refresh_normalized
+from tools.pagination import MAX_PAGE_SIZE, PAGE_PARAMS, STREAM_PAGE_ERROR
+from tools.registry import InProcessToolClient, stream_result, stream_tool
+from tools.sql_registry import sql_registry
+from tools.wire_format import MSGPACK_MEDIA_TYPE, pack, wants_msgpack
 
 PROJECT_ENDPOINT = "https://6eopenai-aifoundry-np-ea.services.ai.azure.com/api/projects/6eopenai-aifoundry-np-e-project"
 AGENT_ID = "asst_vDuMomx3g6JlA2og2s6LQrgq"
 MCP_URL = "http://127.0.0.1:8000/mcp"  # Fixed port to match your MCP server
+MCP_TIMEOUT = 30  # seconds per tool call
+
+# "mcp" - call the tools over HTTP through the MCP server
+# "inprocess" - call the same tool functions directly (API and tools on one host)
+TOOL_TRANSPORT = "mcp"
+
+# Agent-extracted payloads, keyed on the normalized question
+PAYLOAD_CACHE_SIZE = 1024
+PAYLOAD_CACHE_TTL = 6 * 60 * 60  # seconds
+PAYLOAD_CACHE_PATH = None  # e.g. "payload_cache.json" to survive restarts
+PAYLOAD_CACHE_FLUSH_INTERVAL = 5  # seconds - writes are batched, and flushed on shutdown
+
+# Upper bound on concurrently resolved tiles per /dashboard/batch request
+BATCH_MAX_CONCURRENCY = 16
+
+# /debug/* endpoints expose SQL text and query plans - enable on trusted hosts only
+DEBUG_ENDPOINTS = False
+
+agent_clients = AgentClientManager(PROJECT_ENDPOINT)
+if TOOL_TRANSPORT == "inprocess":
+    tool_client = InProcessToolClient()
+else:
+    tool_client = MCPClient(MCP_URL, timeout=MCP_TIMEOUT)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One AIProjectClient for the whole process; its token is refreshed in the background
+    await agent_clients.start()
+    # The static extraction prompt lives in the agent definition - only compared here,
+    # deployed with `python prompts.py --sync`
+    await extraction_prompt.check(agent_clients.client, AGENT_ID)
+    await tool_client.start()
+    if TOOL_TRANSPORT == "inprocess":
+        # Tools run in this process - build/refresh their tables before the first request
+        await asyncio.to_thread(refresh_normalized)
+    try:
+        yield
+    finally:
+        await tool_client.aclose()
+        await agent_clients.close()
+        payload_cache.close()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+
+payload_cache = PayloadCache(
+    max_size=PAYLOAD_CACHE_SIZE,
+    ttl=PAYLOAD_CACHE_TTL,
+    path=PAYLOAD_CACHE_PATH,
+    flush_interval=PAYLOAD_CACHE_FLUSH_INTERVAL
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -28,683 +92,279 @@ class DashboardQuery(BaseModel):
     question: str
 
 
-def extract_json_from_response(raw_text: str) -> dict:
-    """Extract JSON from agent response"""
-    if not raw_text or not raw_text.strip():
-        raise ValueError("Agent returned empty response")
+class BatchItem(BaseModel):
+    id: str
+    question: Optional[str] = None
+    tool: Optional[str] = None
+    arguments: Optional[dict] = None
 
-    text = raw_text.strip()
+    @model_validator(mode="after")
+    def check_question_or_tool(self):
+        if not self.question and not self.tool:
+            raise ValueError("Each batch item needs either 'question' or 'tool'")
+        return self
 
-    try:
-        return json.loads(text)
-    except json.JSONDecodeError:
-        pass
 
-    code_block_pattern = r'```(?:json)?\s*([\s\S]*?)```'
-    matches = re.findall(code_block_pattern, text)
-    for match in matches:
-        try:
-            return json.loads(match.strip())
-        except json.JSONDecodeError:
-            continue
+class DashboardBatch(BaseModel):
+    requests: list[BatchItem]
 
-    json_pattern = r'\{[\s\S]*\}'
-    json_matches = re.findall(json_pattern, text)
-    for match in json_matches:
-        try:
-            return json.loads(match)
-        except json.JSONDecodeError:
-            continue
 
-    raise ValueError(f"Could not extract valid JSON from response:\n{text[:500]}")
+TOOL_METRICS = {
+    "employee_kpi": employee_kpi.SUPPORTED_METRICS,
+    "uniform_entitlement_kpi": uniform_entitlement_kpi.SUPPORTED_METRICS,
+}
 
 
-def clean_payload(payload: dict) -> dict:
-    """Remove invalid filter values like '...' """
-    if "arguments" in payload:
-        if "filters" in payload["arguments"]:
-            filters = payload["arguments"]["filters"]
-            cleaned_filters = {
-                k: v for k, v in filters.items() 
-                if v and v != "..." and v != ""
-            }
-            payload["arguments"]["filters"] = cleaned_filters
-            
-            if not cleaned_filters:
-                del payload["arguments"]["filters"]
-    
-    return payload
-
-
-@app.post("/dashboard/query")
-def dashboard_query(payload: DashboardQuery):
-    """
-    Dashboard API endpoint.
-    Sends user question to Azure AI Agent → Agent extracts parameters → Routes to MCP → Returns data to UI
-    
-    The agent is pre-configured with instructions in Azure AI Studio, so we only send the user's question.
-    """
-    try:
-        # Initialize Azure AI client
-        client = AIProjectClient(
-            endpoint=PROJECT_ENDPOINT,
-            credential=DefaultAzureCredential()
-        )
+class TimeRange(BaseModel):
+    from_: str = Field(alias="from", pattern=r"^\d{4}-\d{2}$")
+    to: str = Field(pattern=r"^\d{4}-\d{2}$")
 
-        with client:
-            prompt = f"""
-You are a PARAMETER-EXTRACTION AGENT for a uniform management system.
 
-CRITICAL RULES:
-1. Return ONLY valid JSON (no markdown, no explanation)
-2. ONLY include filters that are EXPLICITLY mentioned in the query
-3. NEVER add placeholder values like "..."
-4. If a parameter is not mentioned, OMIT it completely
+class KPIQuery(BaseModel):
+    tool: Literal["employee_kpi", "uniform_entitlement_kpi"]
+    metric: str
+    group_by: Optional[str] = None
+    filters: Optional[dict] = None
+    time_range: Optional[TimeRange] = None
+    # Keyset pagination for row-returning metrics (tools.pagination)
+    limit: Optional[int] = Field(default=None, ge=1, le=MAX_PAGE_SIZE)
+    cursor: Optional[str] = None
+    order_by: Optional[str] = None
+    # "columnar" sends data as {columns, rows} (tools.wire_format)
+    format: Optional[Literal["rows", "columnar"]] = None
 
---------------------------------------------------
-AVAILABLE TOOLS
---------------------------------------------------
-
-1. employee_kpi - Employee queries (active, inactive, eligible, ineligible)
-2. uniform_entitlement_kpi - Uniform/SKU queries (counts, demand)
-
---------------------------------------------------
-TOOL SELECTION RULES
---------------------------------------------------
-
-Use "employee_kpi" for:
-- Total employees, active employees, inactive employees
-- Employee counts, headcount
-- Employee status (active/inactive breakdown)
-- Employee eligibility (eligible/ineligible employees or departments)
-- Eligible departments, which departments are eligible
-- Employee trends by joining month
-
-Use "uniform_entitlement_kpi" for:
-- SKU counts, unique SKUs, number of SKUs
-- Uniform items, item names
-- SKUs by department/gender/location/frequency
-- SKU demand (quantity needed over time)
-- Common SKUs vs department-specific SKUs
-- Specific month demands
-
---------------------------------------------------
-METRIC SELECTION FOR EMPLOYEE KPI
---------------------------------------------------
-
-"total employees" / "employee count" / "headcount"
-→ metric = "total"
-
-"active employees" / "how many active"
-→ metric = "active"
-
-"inactive employees" / "how many inactive"
-→ metric = "inactive"
+    @model_validator(mode="after")
+    def check_metric(self):
+        if self.metric not in TOOL_METRICS[self.tool]:
+            raise ValueError(
+                f"Unsupported metric '{self.metric}' for {self.tool}. "
+                f"Supported: {', '.join(TOOL_METRICS[self.tool])}"
+            )
 
-"active vs inactive" / "status breakdown" / "employee status" / "department summary"
-→ metric = "status"
+        if self.group_by is not None:
+            if self.tool != "employee_kpi":
+                raise ValueError("group_by is only supported by employee_kpi")
+            if self.group_by not in employee_kpi.SUPPORTED_GROUP_BY:
+                raise ValueError(
+                    f"Unsupported group_by '{self.group_by}'. "
+                    f"Supported: {', '.join(employee_kpi.SUPPORTED_GROUP_BY)}"
+                )
+        return self
 
-"summary of departments"
-→ metric = "status"
+    def arguments(self) -> dict:
+        return self.model_dump(by_alias=True, exclude_none=True, exclude={"tool"})
 
-"eligible employees" / "how many eligible"
-→ metric = "eligible_employees"
 
-"ineligible employees"
-→ metric = "ineligible_employees"
+def get_agent_client() -> AIProjectClient:
+    """FastAPI dependency - override in tests to substitute a fake client"""
+    return agent_clients.client
 
-"total departments" / "how many departments" (ONLY for ALL departments, NOT eligible ones)
-→ metric = "total_departments"
 
-"eligible departments" / "which departments are eligible" / "total number of eligible departments"
-→ metric = "eligible_departments"
+async def ask_agent(question: str, client: AIProjectClient):
+    """
+    Sends the question to the Azure AI Agent.
+    Returns (agent_response, error) - error is a response dict when the run failed.
+    """
+    # Thread + message + run in one call; the thread is deleted in the background
+    run, reply = await ask_agent_once(client, AGENT_ID, extraction_prompt.user_message(question))
+    agent_clients.threads.discard(client, run.thread_id)
+
+    # Check for failures
+    if hasattr(run, 'status') and run.status == "failed":
+        error_msg = getattr(run, 'last_error', 'Unknown error')
+        return None, {
+            "error": "Agent processing failed",
+            "status": "failed",
+            "details": str(error_msg)
+        }
 
-"department eligibility" / "eligibility by department" / "eligible employees breakdown by department" / "eligible employees by department"
-→ metric = "department_eligibility"
+    return reply, None
 
-"eligibility by gender"
-→ metric = "eligibility_by_gender"
 
-"eligibility trend" / "eligible employees over time" / "eligible employees breakdown by month" / "eligible employees by issuance month"
-→ metric = "eligibility_trend"
+async def resolve_payload(question: str, client: AIProjectClient):
+    """
+    Question → {"tool", "arguments"}.
+    Returns (params_payload, error) - error is a response dict.
 
-"headcount vs eligibility"
-→ metric = "headcount_vs_eligibility"
+    Known dashboard questions are resolved locally by the intent resolver;
+    only unrecognised questions are sent to the Azure AI Agent for extraction,
+    and the payload it extracts is cached for the next identical question.
+    """
+    params_payload = resolve_intent(question)
 
---------------------------------------------------
-METRIC SELECTION FOR UNIFORM ENTITLEMENT
---------------------------------------------------
+    if params_payload is None:
+        params_payload = payload_cache.get(question)
 
-**SKU COUNT QUERIES:**
+    if params_payload is None:
+        agent_response, error = await ask_agent(question, client)
+        if error:
+            return None, error
 
-"total SKUs" / "count of SKUs" / "how many SKUs" / "number of SKUs"
-→ metric = "unique_skus"
+        if not agent_response:
+            return None, {"error": "No response from agent"}
 
-"total SKUs for [department]" / "SKUs by department" / "department-wise SKUs" / "total unique SKUs breakdown by department"
-→ metric = "skus_by_department"
+        # Extract JSON payload from agent's response
+        try:
+            params_payload = extract_json_from_response(agent_response)
+            params_payload = clean_payload(params_payload)
+        except Exception as e:
+            return None, {
+                "error": f"Failed to parse agent response: {str(e)}",
+                "raw_response": agent_response[:500]
+            }
 
-"SKUs by gender" / "gender-wise SKUs" / "male vs female SKUs"
-→ metric = "skus_by_gender"
+        if params_payload.get("tool"):
+            payload_cache.set(question, params_payload)
 
-"SKUs by location" / "location-wise SKUs" / "SKUs per location"
-→ metric = "skus_by_location"
+    return params_payload, None
 
-"SKUs by frequency" / "frequency-wise SKUs" / "how often items issued"
-→ metric = "skus_by_frequency"
 
-"entitlement coverage matrix"
-→ metric = "entitlement_coverage_matrix"
+async def call_tool(tool_name: str, arguments: dict) -> dict:
+    """Routes a tool call through the configured transport and unwraps the JSON result"""
+    try:
+        return await tool_client.call_tool(tool_name, arguments, timeout=MCP_TIMEOUT)
+    except MCPError as e:
+        return {
+            "error": str(e),
+            "details": e.details
+        }
 
-**DEMAND QUERIES:**
 
-"SKU demand" / "quantity needed" / "items required" / "how many [item] needed"
-→ metric = "sku_demand" (MUST include time_range OR months)
+async def answer_question(question: str, client: AIProjectClient) -> dict:
+    try:
+        params_payload, error = await resolve_payload(question, client)
+        if error:
+            return error
 
-**SPECIAL METRICS:**
+        # Get tool name and arguments
+        tool_name = params_payload.get("tool")
+        arguments = params_payload.get("arguments", {})
 
-"eligible departments for uniforms"
-→ metric = "eligible_departments" (from employee_kpi)
+        if not tool_name:
+            return {
+                "error": "No tool specified in agent response",
+                "payload": params_payload
+            }
 
-"employees with demand" / "how many will receive items"
-→ metric = "employees_with_demand"
+        return await call_tool(tool_name, arguments)
 
-"total employees in department"
-→ metric = "total_employees"
+    except Exception as e:
+        return {
+            "error": str(e),
+            "error_type": type(e).__name__
+        }
 
-**ENTITLEMENT DETAILS:**
 
-"all uniform entitlement details" / "entitlement details" / "list all entitlements"
-→ metric = "all_uniform_entitlements"
+@app.post("/dashboard/query")
+async def dashboard_query(
+    payload: DashboardQuery,
+    client: AIProjectClient = Depends(get_agent_client)
+):
+    """
+    Dashboard API endpoint.
+    Resolves the question to tool parameters → Routes to MCP → Returns data to UI
+    """
+    return await answer_question(payload.question, client)
 
---------------------------------------------------
-CRITICAL: DEMAND vs COUNT DISTINCTION
---------------------------------------------------
 
-DEMAND queries (use sku_demand):
-- "quantity needed"
-- "items required"
-- "how many [item] needed"
-- "demand for [item]"
-- "T-shirt demand"
-→ These calculate total quantity over time
+def encode_response(result: dict, request: Request):
+    """JSON by default; MessagePack when the client's Accept header asks for it"""
+    if wants_msgpack(request.headers.get("accept")):
+        return Response(pack(result), media_type=MSGPACK_MEDIA_TYPE)
+    return result
 
-COUNT queries (use unique_skus or skus_by_*):
-- "total SKUs"
-- "count of SKUs"
-- "number of different SKUs"
-- "how many types of items"
-→ These count unique item types
 
---------------------------------------------------
-DEPARTMENT NORMALIZATION
---------------------------------------------------
+@app.post("/dashboard/kpi")
+async def dashboard_kpi(payload: KPIQuery, request: Request):
+    """
+    Structured KPI endpoint for tiles that already know their metric.
+    The payload is validated up front and sent straight to the tool - no agent involved.
+    """
+    try:
+        result = await call_tool(payload.tool, payload.arguments())
+    except Exception as e:
+        result = {
+            "error": str(e),
+            "error_type": type(e).__name__
+        }
+    return encode_response(result, request)
 
-"AOCS" / "Airport Ops" → "Airport Operations & Customer Services"
-"Inflight" / "IFS" / "Cabin crew" → "Inflight Services"
-"Engineering" / "Tech" → "Engineering"
-"Flight Ops" / "Pilots" → "Flight Operations"
-"OCC" → "Operation Control Center"
-"Cargo" → "Cargo"
 
---------------------------------------------------
-FILTER RULES (CRITICAL)
---------------------------------------------------
+def error_record(e: Exception) -> dict:
+    return {"type": "error", "reason": str(e), "error_type": type(e).__name__}
 
-1. ONLY include filters EXPLICITLY mentioned in the query
-2. If department is NOT mentioned, DO NOT add department filter
-3. If location is NOT mentioned, DO NOT add location filter
-4. If gender is NOT mentioned, DO NOT add gender filter
-5. If status is NOT mentioned, DO NOT add status filter (it defaults to 'active' in the tool)
-6. ALWAYS include a filter if explicitly mentioned, EVEN IF you are grouping by the same field (e.g., breakdown by gender and gender Male).
-7. NEVER use placeholder values like "..."
-
-Examples:
-✅ "total active employees" → {{"metric": "active", "filters": {{}}}}
-✅ "active employees in AOCS" → {{"metric": "active", "filters": {{"department": "Airport Operations & Customer Services"}}}}
-✅ "ineligible employees with status active" → {{"metric": "ineligible_employees", "filters": {{"status": "active"}}}}
-✅ "active employees in Delhi" → {{"metric": "active", "filters": {{"location": "Delhi"}}}}
-❌ "total active employees" → DO NOT add {{"location": "..."}}
-
---------------------------------------------------
-TIME RANGE RULES (CRITICAL FOR DEMAND)
---------------------------------------------------
-
-**Context:**
-- Last uniform issue: Aug 31, 2025
-- Any query after this date = FUTURE DEMAND
-- Employee joining dates: Dec 2005 - Aug 2025
-
-**For sku_demand metric:**
-
-OPTION 1 - Date Range (from/to):
-- Use when query mentions "from X to Y" or "between X and Y"
-- Format: {{"from": "YYYY-MM", "to": "YYYY-MM"}}
-- Example: "demand from Jan 2026 to Dec 2026"
-  → {{"time_range": {{"from": "2026-01", "to": "2026-12"}}}}
-
-OPTION 2 - Specific Months:
-- Use when query mentions specific months
-- Add to filters: "months": ["YYYY-MM", "YYYY-MM"]
-- Example: "demand for Sep 2025, Dec 2025, and March 2026"
-  → {{"filters": {{"months": ["2025-09", "2025-12", "2026-03"]}}}}
-
-OPTION 3 - No time specified:
-- Default: {{"from": "2025-09", "to": "2026-09"}} (next 12 months)
-
-**For other metrics:**
-- OMIT time_range unless specifically mentioned
-
---------------------------------------------------
-GROUP_BY RULES (EMPLOYEE KPI ONLY)
---------------------------------------------------
-
-"by department" / "department-wise" / "per department" / "department summary"
-→ group_by = "department"
-
-"by gender" / "gender-wise" / "male vs female"
-→ group_by = "gender"
-
-"by location" / "location-wise" / "per location"
-→ group_by = "location"
-
-"summary" / "status breakdown" / "active vs inactive" (for individual counts)
-→ group_by = "status"
-
-If NOT mentioned → OMIT group_by
-
---------------------------------------------------
-EXAMPLES
---------------------------------------------------
-
-**EMPLOYEE KPI EXAMPLES:**
-
-Query: "total inactive employees"
-{{
-  "tool": "employee_kpi",
-  "arguments": {{
-    "metric": "inactive"
-  }}
-}}
-
-Query: "inactive employees in AOCS"
-{{
-  "tool": "employee_kpi",
-  "arguments": {{
-    "metric": "inactive",
-    "filters": {{
-      "department": "Airport Operations & Customer Services"
-    }}
-  }}
-}}
-
-Query: "active vs inactive employees by department"
-{{
-  "tool": "employee_kpi",
-  "arguments": {{
-    "metric": "status",
-    "group_by": "department"
-  }}
-}}
-
-Query: "eligible employees"
-{{
-  "tool": "employee_kpi",
-  "arguments": {{
-    "metric": "eligible_employees"
-  }}
-}}
-
-Query: "which departments are eligible"
-{{
-  "tool": "employee_kpi",
-  "arguments": {{
-    "metric": "department_eligibility"
-  }}
-}}
-
-Query: "eligible employees breakdown by gender"
-{{
-  "tool": "employee_kpi",
-  "arguments": {{
-    "metric": "eligible_employees",
-    "group_by": "gender"
-  }}
-}}
-
-Query: "department summary"
-{{
-  "tool": "employee_kpi",
-  "arguments": {{
-    "metric": "status",
-    "group_by": "department"
-  }}
-}}
-
-Query: "total number of eligible departments"
-{{
-  "tool": "employee_kpi",
-  "arguments": {{
-    "metric": "eligible_departments"
-  }}
-}}
-
-Query: "eligible employees breakdown by issuance month in Cargo department in Bengaluru with status Inactive"
-{{
-  "tool": "employee_kpi",
-  "arguments": {{
-    "metric": "eligibility_trend",
-    "filters": {{
-      "department": "Cargo",
-      "location": "Bengaluru",
-      "status": "Inactive"
-    }}
-  }}
-}}
-
-Query: "active employees breakdown by gender"
-{{
-  "tool": "employee_kpi",
-  "arguments": {{
-    "metric": "active",
-    "group_by": "gender"
-  }}
-}}
-
-Query: "eligible employees breakdown by gender"
-{{
-  "tool": "employee_kpi",
-  "arguments": {{
-    "metric": "eligible_employees",
-    "group_by": "gender"
-  }}
-}}
-
-Query: "eligible employee summary in Cargo department in Delhi and gender Female"
-{{
-  "tool": "employee_kpi",
-  "arguments": {{
-    "metric": "eligible_employees",
-    "group_by": "status",
-    "filters": {{
-      "department": "Cargo",
-      "location": "Delhi",
-      "gender": "Female"
-    }}
-  }}
-}}
-
-Query: "eligible employees breakdown by department"
-{{
-  "tool": "employee_kpi",
-  "arguments": {{
-    "metric": "department_eligibility"
-  }}
-}}
-
-Query: "active employees breakdown by gender in Cargo department in Bengaluru with status Inactive and gender Male"
-{{
-  "tool": "employee_kpi",
-  "arguments": {{
-    "metric": "active",
-    "group_by": "gender",
-    "filters": {{
-      "department": "Cargo",
-      "location": "Bengaluru",
-      "status": "Inactive",
-      "gender": "Male"
-    }}
-  }}
-}}
-
-**UNIFORM ENTITLEMENT EXAMPLES:**
-
-Query: "entitlement coverage matrix"
-{{
-  "tool": "uniform_entitlement_kpi",
-  "arguments": {{
-    "metric": "entitlement_coverage_matrix"
-  }}
-}}
-
-Query: "total SKUs"
-{{
-  "tool": "uniform_entitlement_kpi",
-  "arguments": {{
-    "metric": "unique_skus"
-  }}
-}}
-
-Query: "total SKUs for AOCS"
-{{
-  "tool": "uniform_entitlement_kpi",
-  "arguments": {{
-    "metric": "skus_by_department",
-    "filters": {{
-      "department": "Airport Operations & Customer Services"
-    }}
-  }}
-}}
-
-Query: "SKUs by gender"
-{{
-  "tool": "uniform_entitlement_kpi",
-  "arguments": {{
-    "metric": "skus_by_gender"
-  }}
-}}
-
-Query: "SKUs by frequency"
-{{
-  "tool": "uniform_entitlement_kpi",
-  "arguments": {{
-    "metric": "skus_by_frequency"
-  }}
-}}
-
-Query: "T-shirt demand for Engineering from Jan 2026 to Dec 2026"
-{{
-  "tool": "uniform_entitlement_kpi",
-  "arguments": {{
-    "metric": "sku_demand",
-    "filters": {{
-      "department": "Engineering",
-      "sku": "T-shirts"
-    }},
-    "time_range": {{
-      "from": "2026-01",
-      "to": "2026-12"
-    }}
-  }}
-}}
-
-Query: "demand for September 2025 and December 2025"
-{{
-  "tool": "uniform_entitlement_kpi",
-  "arguments": {{
-    "metric": "sku_demand",
-    "filters": {{
-      "months": ["2025-09", "2025-12"]
-    }}
-  }}
-}}
-
-Query: "SKU demand for AOCS"
-{{
-  "tool": "uniform_entitlement_kpi",
-  "arguments": {{
-    "metric": "sku_demand",
-    "filters": {{
-      "department": "Airport Operations & Customer Services"
-    }},
-    "time_range": {{
-      "from": "2025-09",
-      "to": "2026-09"
-Query: "how many unique SKUs in Inflight Services"
-{{
-  "tool": "uniform_entitlement_kpi",
-  "arguments": {{
-    "metric": "unique_skus",
-    "filters": {{
-      "department": "Inflight Services"
-    }}
-  }}
-}}
-
-Query: "all uniform entitlement details"
-{{
-  "tool": "uniform_entitlement_kpi",
-  "arguments": {{
-    "metric": "all_uniform_entitlements"
-  }}
-}}
-
---------------------------------------------------
-USER QUESTION
---------------------------------------------------
-
-"{payload.question}"
-
-RESPOND WITH ONLY THE JSON OBJECT:
-"""
-            # Create a new thread for this conversation
-            thread = client.agents.threads.create()
-
-            # Send ONLY the user's question - agent has its own system instructions
-            client.agents.messages.create(
-                thread_id=thread.id,
-                role="user",
-                content=prompt
-            )
 
-            # Run the agent
-            run = client.agents.runs.create_and_process(
-                thread_id=thread.id,
-                agent_id=AGENT_ID
-            )
+def ndjson(records):
+    """NDJSON lines; a failure mid-stream ends the body with an error record instead of truncating it"""
+    try:
+        for record in records:
+            yield json.dumps(record, default=str) + "\n"
+    except Exception as e:
+        yield json.dumps(error_record(e)) + "\n"
 
-            # Check for failures
-            if hasattr(run, 'status') and run.status == "failed":
-                error_msg = getattr(run, 'last_error', 'Unknown error')
-                return {
-                    "error": "Agent processing failed",
-                    "status": "failed",
-                    "details": str(error_msg)
-                }
-
-            # Retrieve agent's response
-            messages = client.agents.messages.list(
-                thread_id=thread.id,
-                order=ListSortOrder.ASCENDING
-            )
 
-            agent_response = None
-            for m in reversed(list(messages)):
-                if m.role == "assistant" and m.text_messages:
-                    agent_response = m.text_messages[0].text.value
-                    break
+@app.post("/dashboard/kpi/stream")
+async def dashboard_kpi_stream(payload: KPIQuery):
+    """
+    /dashboard/kpi as NDJSON records (meta, row chunks, end) for large
+    results such as all_uniform_entitlements and multi-year sku_demand.
+    In-process the rows come straight off the database cursor; over MCP
+    the finished result is chunked so the client can still render progressively.
+    """
+    # Streams carry the whole result - page params would be silently dropped
+    if any(getattr(payload, name) is not None for name in PAGE_PARAMS):
+        raise HTTPException(status_code=422, detail=STREAM_PAGE_ERROR)
 
-        if not agent_response:
-            return {"error": "No response from agent"}
+    # NDJSON records have their own shape - the columnar format does not apply
+    arguments = {k: v for k, v in payload.arguments().items() if k != "format"}
 
-        # Extract JSON payload from agent's response
+    if TOOL_TRANSPORT == "inprocess":
+        # Sync generator - Starlette advances it in its threadpool
+        records = stream_tool(payload.tool, arguments)
+    else:
         try:
-            params_payload = extract_json_from_response(agent_response)
-            params_payload = clean_payload(params_payload)
+            records = stream_result(await call_tool(payload.tool, arguments))
         except Exception as e:
-            return {
-                "error": f"Failed to parse agent response: {str(e)}",
-                "raw_response": agent_response[:500]
-            }
-
-        # Get tool name and arguments
-        tool_name = params_payload.get("tool")
-        arguments = params_payload.get("arguments", {})
-
-        if not tool_name:
-            return {
-                "error": "No tool specified in agent response",
-                "payload": params_payload
-            }
+            # Same mapping as /dashboard/kpi, as a one-record stream
+            records = [error_record(e)]
 
-        # Clean up arguments based on tool type
-        if tool_name == "uniform_entitlement_kpi":
-            # Remove group_by - not supported for uniform entitlement
-            arguments.pop("group_by", None)
-            
-            # Remove empty time_range
-            if "time_range" in arguments and not arguments["time_range"]:
-                arguments.pop("time_range")
-
-        # Prepare MCP request
-        mcp_request = {
-            "jsonrpc": "2.0",
-            "method": "tools/call",
-            "params": {
-                "name": tool_name,
-                "arguments": arguments
-            },
-            "id": 1
-        }
-
-        # Call MCP server
-        mcp_response = requests.post(
-            MCP_URL,
-            json=mcp_request,
-            headers={
-                "Accept": "application/json, text/event-stream",
-                "Content-Type": "application/json"
-            },
-            timeout=400
-        )
-
-        if mcp_response.status_code != 200:
-            return {
-                "error": f"MCP call failed with status {mcp_response.status_code}",
-                "details": mcp_response.text[:500]
-            }
+    return StreamingResponse(ndjson(records), media_type="application/x-ndjson")
 
-        # Parse MCP response (handles streaming format)
-        for line in mcp_response.text.splitlines():
-            if not line.startswith("data:"):
-                continue
-
-            try:
-                raw_data = line.replace("data:", "", 1).strip()
-                envelope = json.loads(raw_data)
-                result = envelope.get("result", {})
-
-                # CASE 1: structuredContent
-                structured = result.get("structuredContent", {})
-                structured_content = structured.get("content", [])
-
-                for item in structured_content:
-                    if item.get("type") == "json":
-                        return item["json"]
-
-                # CASE 2: content → text → embedded JSON
-                for item in result.get("content", []):
-                    if item.get("type") == "text":
-                        try:
-                            parsed = json.loads(item["text"])
-                            for c in parsed.get("content", []):
-                                if c.get("type") == "json":
-                                    return c["json"]
-                        except:
-                            pass
-
-            except Exception as e:
-                continue
 
-        return {
-            "error": "No valid JSON response found from MCP",
-            "raw_response": mcp_response.text[:500]
-        }
+@app.post("/dashboard/batch")
+async def dashboard_batch(
+    payload: DashboardBatch,
+    request: Request,
+    client: AIProjectClient = Depends(get_agent_client)
+):
+    """
+    Resolves every tile of a dashboard tab in one request.
 
-    except Exception as e:
-        return {
-            "error": str(e),
-            "error_type": type(e).__name__
+    Each item carries either a question or a direct {tool, arguments} payload.
+    Items run concurrently over the shared agent client and MCP connection pool,
+    so the tab waits for its slowest tile instead of the sum of all of them.
+    """
+    limit = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+
+    async def run_item(item: BatchItem) -> dict:
+        async with limit:
+            if item.tool:
+                try:
+                    return await call_tool(item.tool, item.arguments or {})
+                except Exception as e:
+                    return {
+                        "error": str(e),
+                        "error_type": type(e).__name__
+                    }
+            return await answer_question(item.question, client)
+
+    results = await asyncio.gather(*(run_item(item) for item in payload.requests))
+
+    return encode_response({
+        "results": {
+            item.id: result for item, result in zip(payload.requests, results)
         }
+    }, request)
 
 
 @app.get("/health")
@@ -714,7 +374,25 @@ def health_check():
         "status": "healthy",
         "service": "Dashboard API",
         "agent_id": AGENT_ID,
-        "mcp_url": MCP_URL
+        "mcp_url": MCP_URL,
+        "tool_transport": TOOL_TRANSPORT,
+        "payload_cache": payload_cache.stats(),
+        "agent_threads": agent_clients.threads.stats()
+    }
+
+
+@app.get("/debug/query-plans")
+async def debug_query_plans():
+    """
+    EXPLAIN QUERY PLAN for the SQL shapes this process has already run.
+    Nothing is enumerated here - with the "mcp" transport the tools run in
+    the MCP server, so use the offline audit (python -m tools.sql_registry).
+    """
+    if not DEBUG_ENDPOINTS:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return {
+        "stats": sql_registry.stats(),
+        "shapes": await asyncio.to_thread(sql_registry.explain_all)
     }
 
 
@@ -726,6 +404,9 @@ def root():
         "version": "1.0.0",
         "endpoints": {
             "query": "POST /dashboard/query",
+            "kpi": "POST /dashboard/kpi",
+            "kpi_stream": "POST /dashboard/kpi/stream",
+            "batch": "POST /dashboard/batch",
             "health": "GET /health"
         },
         "usage": {
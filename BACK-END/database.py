@@ -1,22 +1,231 @@
+import logging
+import os
+import queue
 import sqlite3
+import threading
+import time
 from pathlib import Path
 from contextlib import contextmanager
 
+logger = logging.getLogger(__name__)
+
 DB_PATH = Path(__file__).parent / "data" / "Uniform.db"
 
+# -------------------------------
+# CONNECTION POOL
+# -------------------------------
+POOL_SIZE = 8
+POOL_TIMEOUT = 10  # seconds to wait for a free connection
+HEALTH_CHECK_INTERVAL = 30  # seconds idle before a connection is pinged
+CACHED_STATEMENTS = 1024  # per-connection prepared statement cache - holds every KPI query shape (tools.sql_registry)
+STREAM_BATCH_SIZE = 500  # rows fetched per round trip by iter_query
+DEADLINE_CHECK_STEPS = 10_000  # SQLite VM instructions between query_deadline checks
+
+# Per-connection setup for the read-heavy KPI workload
+READ_PRAGMAS = {
+    "query_only": "ON",
+    "cache_size": -64 * 1024,  # negative = KiB, i.e. 64 MB page cache
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY"
+}
+
+
+def read_only_uri(path) -> str:
+    return f"{Path(path).resolve().as_uri()}?mode=ro"
+
+
+# -------------------------------
+# QUERY DEADLINE
+# Pooled connections check the deadline of the thread running them, so
+# SQL past it is interrupted (sqlite3.OperationalError: interrupted)
+# instead of holding its worker and connection to completion.
+# -------------------------------
+_deadline = threading.local()
+
+
+@contextmanager
+def query_deadline(seconds: float = None):
+    """SQL run on this thread inside the block is interrupted after seconds"""
+    previous = getattr(_deadline, "at", None)
+    _deadline.at = time.monotonic() + seconds if seconds else None
+    try:
+        yield
+    finally:
+        _deadline.at = previous
+
+
+def past_deadline() -> bool:
+    """Whether this thread's query_deadline has passed (also the progress handler)"""
+    at = getattr(_deadline, "at", None)
+    return at is not None and time.monotonic() > at
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of read-only SQLite connections.
+
+    The pool never writes, not even to switch the journal mode - the file is
+    put in WAL mode by the ingest / normalize steps (Database.connect_writable).
+
+    Connections are opened lazily up to size and handed out LIFO so the
+    warmest page cache is reused. A connection is pinged after sitting
+    idle and recycled when the database file is replaced on disk.
+    """
+
+    def __init__(self, path, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT, pragmas: dict = None):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = dict(READ_PRAGMAS if pragmas is None else pragmas)
+        self.opened = 0
+        self.recycled = 0
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"No database connection free after {self.timeout}s")
+
+        conn = None
+        try:
+            conn, file_id = self._checkout()
+            yield conn
+        except Exception:
+            # A failed query is usually just bad SQL - only drop the connection if it is broken
+            if conn is not None and not self._ping(conn):
+                self._discard(conn)
+                conn = None
+            raise
+        finally:
+            if conn is not None:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._idle.put((conn, file_id, time.monotonic()))
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                conn, _, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            conn.close()
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize(),
+            "opened": self.opened,
+            "recycled": self.recycled
+        }
+
+    def _checkout(self):
+        file_id = self._file_id()
+        while True:
+            try:
+                conn, conn_file_id, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._open(), file_id
+
+            # Database file swapped underneath us (e.g. a fresh ingest)
+            if conn_file_id != file_id:
+                self._discard(conn)
+                continue
+
+            if time.monotonic() - last_used > HEALTH_CHECK_INTERVAL and not self._ping(conn):
+                self._discard(conn)
+                continue
+
+            return conn, file_id
+
+    def _open(self):
+        conn = sqlite3.connect(
+            read_only_uri(self.path),
+            uri=True,
+            check_same_thread=False,
+            cached_statements=CACHED_STATEMENTS
+        )
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        conn.set_progress_handler(past_deadline, DEADLINE_CHECK_STEPS)
+
+        with self._lock:
+            self.opened += 1
+        return conn
+
+    def _discard(self, conn):
+        with self._lock:
+            self.recycled += 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _file_id(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_dev, st.st_ino)
+
+    @staticmethod
+    def _ping(conn) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+
 class Database:
-    def __init__(self, path=DB_PATH):
+    def __init__(self, path=DB_PATH, pool_size: int = POOL_SIZE):
         self.path = path
+        self.pool_size = pool_size
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._watcher = None
+        self._watcher_path = None
+        self._watcher_lock = threading.Lock()
+
+    @property
+    def pool(self) -> ConnectionPool:
+        with self._pool_lock:
+            # path may be reassigned after import (scripts, tests)
+            if self._pool is None or self._pool.path != self.path:
+                if self._pool is not None:
+                    self._pool.close()
+                self._pool = ConnectionPool(self.path, size=self.pool_size)
+            return self._pool
 
     @contextmanager
-    def connect(self): 
-        conn = sqlite3.connect(self.path)
+    def connect(self):
+        with self.pool.connection() as conn:
+            yield conn
+
+    @contextmanager
+    def connect_writable(self):
+        """
+        Plain read/write connection for ingest and normalization steps.
+        Also switches the file to WAL (stored in the file, a no-op once set)
+        so the pool's readers never block on these writers.
+        """
+        conn = sqlite3.connect(self.path, timeout=30)
         conn.row_factory = sqlite3.Row
         try:
+            conn.execute("PRAGMA journal_mode = WAL")
             yield conn
         finally:
             conn.close()
 
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool = None
+
     def execute_query(self, query: str, params: dict = None):
         with self.connect() as conn:
             cur = conn.cursor()
@@ -24,4 +233,49 @@ class Database:
             rows = cur.fetchall()
             return [dict(row) for row in rows]
 
+    def iter_query(self, query: str, params: dict = None, batch_size: int = STREAM_BATCH_SIZE):
+        """
+        Generator version of execute_query for large results.
+        Holds one pooled connection (and its read snapshot) until the
+        generator is exhausted or closed, so consume it promptly.
+        """
+        with self.connect() as conn:
+            cur = conn.cursor()
+            cur.execute(query, params or {})
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    return
+                for row in rows:
+                    yield dict(row)
+
+    def data_signature(self):
+        """
+        Cheap fingerprint of the database contents.
+        Changes whenever the file (or its WAL) is rewritten or another
+        connection commits (PRAGMA data_version on a long-lived connection).
+        """
+        mtimes = []
+        for suffix in ("", "-wal"):
+            try:
+                mtimes.append(os.stat(f"{self.path}{suffix}").st_mtime_ns)
+            except FileNotFoundError:
+                mtimes.append(None)
+
+        with self._watcher_lock:
+            # path may be reassigned after import (scripts, tests)
+            if self._watcher is not None and self._watcher_path != self.path:
+                self._watcher.close()
+                self._watcher = None
+            if self._watcher is None:
+                self._watcher_path = self.path
+                self._watcher = sqlite3.connect(
+                    read_only_uri(self.path),
+                    uri=True,
+                    check_same_thread=False
+                )
+            data_version = self._watcher.execute("PRAGMA data_version").fetchone()[0]
+
+        return (*mtimes, data_version)
+
 db = Database()
@@ -0,0 +1,246 @@
+import logging
+import re
+import threading
+from datetime import datetime
+
+from database import db
+from tools.departments import DEPARTMENT_ALIASES
+from tools.normalize import EMPLOYEE_SOURCE
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_DEMAND_RANGE = {"from": "2025-09", "to": "2026-09"}
+
+
+# =========================================================
+# METRIC RULES
+# Matched (full match) against the question once all filter
+# phrases have been stripped. First match wins.
+# =========================================================
+EMPLOYEE_RULES = [
+    (r"(total )?(number of )?departments|how many departments", "total_departments", None),
+    (r"(total )?(number of )?eligible departments( for uniforms)?|which departments are eligible", "eligible_departments", None),
+    (r"department eligibility( summary)?|eligibility by department|eligible employees (breakdown )?by department", "department_eligibility", None),
+    (r"eligible employees? summary", "eligible_employees", "status"),
+    (r"eligible employees (breakdown )?by gender|eligibility by gender", "eligible_employees", "gender"),
+    (r"eligible employees (breakdown )?by location", "eligible_employees", "location"),
+    (r"eligible employees (breakdown )?by (issuance )?month|eligibility trend|eligible employees over time", "eligibility_trend", None),
+    (r"headcount vs eligib(le|ility)( trend)?", "headcount_vs_eligibility", None),
+    (r"(total )?(number of )?ineligible employees", "ineligible_employees", None),
+    (r"(total )?(number of )?eligible employees|how many eligible( employees)?", "eligible_employees", None),
+    (r"department summary|summary of departments", "status", "department"),
+    (r"(total )?employees (breakdown )?by status|status breakdown|employee status|active vs inactive( employees)?", "status", None),
+    (r"active vs inactive employees (breakdown )?by department", "status", "department"),
+    (r"(total )?(number of )?active employees (breakdown )?by (department|gender|location)", "active", "group"),
+    (r"(total )?(number of )?inactive employees (breakdown )?by (department|gender|location)", "inactive", "group"),
+    (r"(total )?(number of )?active employees|how many active( employees)?", "active", None),
+    (r"(total )?(number of )?inactive employees|how many inactive( employees)?", "inactive", None),
+    (r"(total )?(number of )?employees (breakdown )?by (department|gender|location)", "total", "group"),
+    (r"(total )?(number of )?employees|employee count|headcount", "total", None),
+]
+
+UNIFORM_RULES = [
+    (r"(all )?(uniform )?entitlement details|list all entitlements", "all_uniform_entitlements"),
+    (r"entitlement coverage matrix", "entitlement_coverage_matrix"),
+    (r"(total )?(unique )?skus? (breakdown )?by department|department-wise skus", "skus_by_department"),
+    (r"(total )?(unique )?skus? (breakdown )?by gender|gender-wise skus", "skus_by_gender"),
+    (r"(total )?(unique )?skus? (breakdown )?by location|location-wise skus", "skus_by_location"),
+    (r"(total )?(unique )?skus? (breakdown )?by frequency|frequency-wise skus", "skus_by_frequency"),
+    (r"(total )?(demand )?sku demand|total demand skus?|demand", "sku_demand"),
+    (r"(total )?(number of )?(unique )?skus|(count of|how many|number of) (unique )?skus", "unique_skus"),
+]
+
+
+# =========================================================
+# FILTER PHRASES
+# Stripped from the end of the question, in any order.
+# =========================================================
+MONTH = r"([a-z]{3,9}\.? \d{4}|\d{4}-\d{1,2})"
+WORDS = r"((?:(?! in )[a-z&' .-])+?)"
+
+SUFFIX_PATTERNS = [
+    ("months", re.compile(rf"\s+for (?:the )?(?:months? )?{MONTH}((?:(?:,| and|, and) {MONTH})*)$")),
+    ("range", re.compile(rf"\s+(?:from|between) {MONTH} (?:to|and) {MONTH}$")),
+    ("department", re.compile(rf"\s+(?:in|for) (?:the )?{WORDS} department$")),
+    ("status", re.compile(r"\s+(?:with|and) status (active|inactive)$")),
+    ("gender", re.compile(r"\s+(?:and|with) gender (male|female)$")),
+    # A known department or (after "in") a known location - anything else is not resolved
+    ("place", re.compile(rf"\s+(in|for) (?:the )?{WORDS}$")),
+]
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    text = re.sub(r"\s+", " ", question or "").strip().lower()
+    return text.rstrip(" ?.!")
+
+
+def parse_month(text: str):
+    """Turn 'Sep 2025' / 'September 2025' / '2025-9' into 'YYYY-MM'"""
+    text = text.strip().rstrip(".")
+    for fmt in ("%Y-%m", "%b %Y", "%B %Y"):
+        try:
+            return datetime.strptime(text.title(), fmt).strftime("%Y-%m")
+        except ValueError:
+            continue
+    if text[:4] == "sept":
+        return parse_month("sep" + text[4:])
+    return None
+
+
+class KnownLocations:
+    """Employee locations as stored in the employee sheet, reloaded when the database changes"""
+
+    def __init__(self, database=db):
+        self.database = database
+        self._locations = {}
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def get(self) -> dict:
+        """lower-cased location → location"""
+        try:
+            signature = (str(self.database.path), self.database.data_signature())
+            if signature != self._signature:
+                with self._lock:
+                    if signature != self._signature:
+                        rows = self.database.execute_query(
+                            f"SELECT DISTINCT baselocationtext AS location FROM {EMPLOYEE_SOURCE} "
+                            "WHERE baselocationtext IS NOT NULL"
+                        )
+                        self._locations = {normalize_question(row["location"]): row["location"] for row in rows}
+                        self._signature = signature
+        except Exception:
+            # No database - location phrases are left to the agent
+            logger.warning("Could not load known locations", exc_info=True)
+            return {}
+        return self._locations
+
+
+known_locations = KnownLocations()
+
+
+def resolve_department(name: str):
+    """Map a department alias to its canonical name"""
+    return DEPARTMENT_ALIASES.get(normalize_question(name))
+
+
+def _strip_filters(text: str, locations: dict):
+    """Peel filter phrases off the end of the question"""
+    found = {}
+
+    progress = True
+    while progress:
+        progress = False
+        for kind, pattern in SUFFIX_PATTERNS:
+            if kind in found:
+                continue
+            match = pattern.search(text)
+            if not match:
+                continue
+
+            if kind == "months":
+                months = [match.group(1)] + re.findall(MONTH, match.group(2) or "")
+                value = [parse_month(m) for m in months]
+                if None in value:
+                    return text, None
+            elif kind == "range":
+                value = {"from": parse_month(match.group(1)), "to": parse_month(match.group(2))}
+                if None in value.values():
+                    return text, None
+            elif kind == "department":
+                value = resolve_department(match.group(1))
+                if not value:
+                    return text, None
+            elif kind == "place":
+                # "in/for AOCS" is a department, "in Delhi" a known location;
+                # anything else ("in total", "in the last month") is not ours to guess
+                value = resolve_department(match.group(2))
+                if value:
+                    kind = "department"
+                elif match.group(1) == "in" and normalize_question(match.group(2)) in locations:
+                    kind = "location"
+                    value = locations[normalize_question(match.group(2))]
+                else:
+                    return text, None
+                if kind in found:
+                    return text, None
+            else:
+                value = match.group(1).title()
+
+            found[kind] = value
+            text = text[:match.start()]
+            progress = True
+            break
+
+    return text.strip(), found
+
+
+# =========================================================
+# RESOLVER
+# =========================================================
+def resolve_intent(question: str, locations: dict = None):
+    """
+    Deterministically map a dashboard question to an MCP tool payload.
+
+    Returns {"tool", "arguments"} or None when the question is not
+    recognised and must go to the agent. locations (lower-cased → name)
+    defaults to the locations in the employee sheet.
+    """
+    text = normalize_question(question)
+    if not text:
+        return None
+
+    if locations is None:
+        locations = known_locations.get()
+    base, found = _strip_filters(text, locations)
+    if found is None:
+        return None
+
+    filters = {k: found[k] for k in ("department", "location", "status", "gender") if k in found}
+
+    for pattern, metric, group_by in EMPLOYEE_RULES:
+        match = re.fullmatch(pattern, base)
+        if not match:
+            continue
+
+        arguments = {"metric": metric}
+        if group_by == "group":
+            group_by = match.group(match.lastindex)
+        if group_by:
+            arguments["group_by"] = group_by
+        if filters:
+            arguments["filters"] = filters
+
+        if "range" in found:
+            arguments["time_range"] = found["range"]
+        elif "months" in found:
+            months = sorted(found["months"])
+            arguments["time_range"] = {"from": months[0], "to": months[-1]}
+
+        return {"tool": "employee_kpi", "arguments": arguments}
+
+    for pattern, metric in UNIFORM_RULES:
+        if not re.fullmatch(pattern, base):
+            continue
+
+        # Only department applies to uniform metrics - other filters would be ignored by the tool
+        if set(filters) - {"department"}:
+            return None
+
+        arguments = {"metric": metric}
+        if metric == "sku_demand":
+            if "months" in found:
+                filters["months"] = found["months"]
+            else:
+                arguments["time_range"] = found.get("range", dict(DEFAULT_DEMAND_RANGE))
+        elif "range" in found or "months" in found:
+            return None
+
+        if filters:
+            arguments["filters"] = filters
+
+        return {"tool": "uniform_entitlement_kpi", "arguments": arguments}
+
+    return None
@@ -0,0 +1,155 @@
+import json
+import re
+
+# =========================================================
+# AGENT RESPONSE → TOOL PAYLOAD
+# Shared by dashboard_api and agent_run.
+#
+# The response is scanned once for balanced {...} spans (strings and
+# escapes are skipped, so braces inside values do not count). Outermost
+# spans are tried first, in document order, then the nested ones; the
+# first one that parses and matches the tool payload schema wins.
+# Parse work is bounded by MAX_ATTEMPTS x MAX_OBJECT_CHARS whatever the
+# response length, and the scan itself is linear.
+# =========================================================
+MAX_ATTEMPTS = 16  # json.loads calls per response
+MAX_OBJECT_CHARS = 64 * 1024  # longer spans are not payloads - skipped
+
+# Structural tokens only: an escape pair, a brace or a quote
+TOKEN = re.compile(r'\\.|[{}"]', re.S)
+KEY_START = re.compile(r'\{\s*"')
+
+
+def object_spans(text: str) -> list:
+    """(start, end) of every balanced {...} span, outermost first, each group in document order"""
+    spans = []
+    opened = []
+    in_string = False
+
+    for match in TOKEN.finditer(text):
+        token = match.group()
+        if in_string:
+            if token == '"':
+                in_string = False
+        elif token == '"':
+            # Quotes only open strings inside an object - prose apostrophes/quotes are ignored
+            in_string = bool(opened)
+        elif token == "{":
+            opened.append(match.start())
+        elif token == "}" and opened:
+            spans.append((opened.pop(), match.end()))
+
+    spans.sort(key=lambda span: (span[0], -span[1]))
+    outer, inner = [], []
+    outer_end = -1
+    for span in spans:
+        if span[1] <= outer_end:
+            inner.append(span)
+        else:
+            outer.append(span)
+            outer_end = span[1]
+    return outer + inner
+
+
+def payload_error(payload):
+    """Why payload is not a tool payload, or None when it is one"""
+    if not isinstance(payload, dict):
+        return "not a JSON object"
+    if not isinstance(payload.get("tool"), str) or not payload["tool"].strip():
+        return "missing 'tool'"
+
+    arguments = payload.get("arguments", {})
+    if not isinstance(arguments, dict):
+        return "'arguments' must be an object"
+    if not isinstance(arguments.get("filters", {}), (dict, type(None))):
+        return "'filters' must be an object"
+    if not isinstance(arguments.get("time_range"), (dict, type(None))):
+        return "'time_range' must be an object"
+    return None
+
+
+def extract_json_from_response(raw_text: str) -> dict:
+    """Extract the tool payload JSON from an agent response"""
+    if not raw_text or not raw_text.strip():
+        raise ValueError("Agent returned empty response")
+
+    text = raw_text.strip()
+
+    # Fast path: the agent followed the instructions and sent bare JSON
+    if text[0] == "{" and text[-1] == "}" and len(text) <= MAX_OBJECT_CHARS:
+        try:
+            payload = json.loads(text)
+            if payload_error(payload) is None:
+                return payload
+        except (json.JSONDecodeError, RecursionError):
+            pass
+
+    rejected = None
+    attempts = 0
+    for start, end in object_spans(text):
+        # A payload opens with a key; {placeholders} and oversized spans are not worth a parse
+        if end - start > MAX_OBJECT_CHARS or KEY_START.match(text, start) is None:
+            continue
+        if attempts >= MAX_ATTEMPTS:
+            break
+        attempts += 1
+
+        try:
+            payload = json.loads(text[start:end])
+        except (json.JSONDecodeError, RecursionError):
+            # RecursionError: nesting deeper than json can parse is not a payload either
+            continue
+
+        error = payload_error(payload)
+        if error is None:
+            return payload
+        rejected = rejected or error
+
+    if rejected:
+        raise ValueError(f"Agent JSON is not a tool payload ({rejected}):\n{text[:500]}")
+    raise ValueError(f"Could not extract valid JSON from response:\n{text[:500]}")
+
+
+def clean_payload(payload: dict) -> dict:
+    """Remove invalid filter values like '...' """
+    if "arguments" in payload:
+        if "filters" in payload["arguments"]:
+            filters = payload["arguments"]["filters"] or {}
+            # Remove any filter with value "..."
+            cleaned_filters = {
+                k: v for k, v in filters.items()
+                if v and v != "..." and v != ""
+            }
+            payload["arguments"]["filters"] = cleaned_filters
+
+            # If filters is now empty, remove it
+            if not cleaned_filters:
+                del payload["arguments"]["filters"]
+
+    return payload
+
+
+# =========================================================
+# BENCHMARK: python json_extract.py
+# Correctness, fuzz and worst-case bounds live in tests/test_json_extract.py.
+# =========================================================
+if __name__ == "__main__":
+    import time
+
+    body = json.dumps({"tool": "employee_kpi", "arguments": {"metric": "active", "filters": {"department": "Cargo"}}})
+    prose = "Based on the question, I'll use the \"employee\" tool; {placeholders} are not filled. "
+
+    print(f"{'input':<34}{'chars':>10}{'ms':>10}")
+    for size in (1_000, 10_000, 50_000):
+        cases = [
+            ("prose + payload", prose * (size // len(prose)) + body),
+            ("unbalanced '{' run", "{" * size),
+            ("many small non-payloads", "{x} " * (size // 4) + body),
+        ]
+        for name, text in cases:
+            started = time.perf_counter()
+            try:
+                extract_json_from_response(text)
+            except ValueError:
+                pass
+            print(f"{name:<34}{len(text):>10}{(time.perf_counter() - started) * 1000:>10.2f}")
@@ -0,0 +1,163 @@
+import json
+
+import httpx
+
+DEFAULT_TIMEOUT = 30.0  # seconds per tool call
+CONNECT_TIMEOUT = 5.0
+MAX_CONNECTIONS = 32
+MAX_KEEPALIVE_CONNECTIONS = 16
+KEEPALIVE_EXPIRY = 60.0
+
+MCP_HEADERS = {
+    "Accept": "application/json, text/event-stream",
+    "Content-Type": "application/json"
+}
+
+
+class MCPError(RuntimeError):
+    """MCP call failed or returned no JSON payload"""
+
+    def __init__(self, message: str, details: str = ""):
+        super().__init__(message)
+        self.details = details
+
+
+def prepare_arguments(tool_name: str, arguments: dict) -> dict:
+    """Drop arguments the tool does not accept"""
+    arguments = dict(arguments or {})
+
+    if tool_name == "uniform_entitlement_kpi":
+        # Remove group_by - not supported for uniform entitlement
+        arguments.pop("group_by", None)
+
+        # Remove empty time_range
+        if "time_range" in arguments and not arguments["time_range"]:
+            arguments.pop("time_range")
+
+    return arguments
+
+
+def unwrap_envelope(envelope: dict):
+    """Pull the tool's JSON payload out of a JSON-RPC result, or None"""
+    if not isinstance(envelope, dict):
+        return None
+
+    result = envelope.get("result", {})
+
+    # CASE 1: structuredContent
+    structured = result.get("structuredContent", {})
+    for item in structured.get("content", []):
+        if item.get("type") == "json":
+            return item["json"]
+
+    # CASE 2: content → text → embedded JSON
+    for item in result.get("content", []):
+        if item.get("type") == "text":
+            try:
+                parsed = json.loads(item["text"])
+                for c in parsed.get("content", []):
+                    if c.get("type") == "json":
+                        return c["json"]
+            except (ValueError, AttributeError):
+                pass
+
+    return None
+
+
+class MCPClient:
+    """
+    Pooled, keep-alive client for the FastMCP streamable-HTTP endpoint.
+
+    One instance is meant to live for the whole process; the SSE stream is
+    parsed line by line and closed as soon as the result arrives.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        timeout: float = DEFAULT_TIMEOUT,
+        max_connections: int = MAX_CONNECTIONS,
+        max_keepalive_connections: int = MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = KEEPALIVE_EXPIRY
+    ):
+        self.url = url
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self._http = None
+        self._request_id = 0
+
+    async def start(self):
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                limits=self.limits,
+                timeout=httpx.Timeout(self.timeout, connect=CONNECT_TIMEOUT),
+                headers=MCP_HEADERS
+            )
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def call_tool(self, tool_name: str, arguments: dict, timeout: float = None):
+        await self.start()
+
+        self._request_id += 1
+        request = {
+            "jsonrpc": "2.0",
+            "method": "tools/call",
+            "params": {
+                "name": tool_name,
+                "arguments": prepare_arguments(tool_name, arguments)
+            },
+            "id": self._request_id
+        }
+
+        call_timeout = httpx.Timeout(timeout or self.timeout, connect=CONNECT_TIMEOUT)
+
+        async with self._http.stream("POST", self.url, json=request, timeout=call_timeout) as response:
+            if response.status_code != 200:
+                body = (await response.aread()).decode("utf-8", "replace")
+                raise MCPError(
+                    f"MCP call failed with status {response.status_code}",
+                    body[:500]
+                )
+
+            # Plain JSON response (json_response servers)
+            if response.headers.get("content-type", "").startswith("application/json"):
+                body = await response.aread()
+                payload = unwrap_envelope(json.loads(body))
+                if payload is None:
+                    raise MCPError("No valid JSON response found from MCP", body[:500].decode("utf-8", "replace"))
+                return payload
+
+            # SSE stream - stop at the first event carrying the result
+            seen = []
+            async for line in response.aiter_lines():
+                if len(seen) < 20:
+                    seen.append(line)
+
+                if not line.startswith("data:"):
+                    continue
+
+                try:
+                    envelope = json.loads(line[len("data:"):].strip())
+                except ValueError:
+                    continue
+
+                payload = unwrap_envelope(envelope)
+                if payload is not None:
+                    return payload
+
+            raise MCPError("No valid JSON response found from MCP", "\n".join(seen)[:500])
@@ -0,0 +1,145 @@
+import copy
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from intent_resolver import normalize_question
+
+
+class PayloadCache:
+    """
+    Question → cleaned tool payload cache.
+
+    LRU eviction once max_size entries are held, entries expire after
+    ttl seconds. When a path is given the cache is loaded from and
+    written back to that JSON file so it survives restarts. Writes are
+    batched: a change schedules one flush flush_interval seconds later
+    (and close() flushes on shutdown), so requests never wait on disk.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 3600, path=None, flush_interval: float = 5.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.flush_interval = flush_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._dirty = False
+        self._timer = None
+        self._load()
+
+    def get(self, question: str):
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._expired(entry):
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(entry["payload"])
+
+    def set(self, question: str, payload: dict):
+        key = normalize_question(question)
+        with self._lock:
+            self._entries[key] = {
+                "payload": copy.deepcopy(payload),
+                "stored_at": time.time()
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._mark_dirty()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._mark_dirty()
+
+    def flush(self):
+        """Writes pending changes to path (temp file + rename)"""
+        with self._lock:
+            self._timer = None
+            if not self.path or not self._dirty:
+                return
+            # Entries are replaced, never mutated, so a shallow copy is a stable snapshot
+            snapshot = dict(self._entries)
+            self._dirty = False
+
+        if not self._write(snapshot):
+            with self._lock:
+                self._dirty = True
+
+    def close(self):
+        """Cancels the pending timer and flushes - call on shutdown"""
+        with self._lock:
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "persistent": self.path is not None
+            }
+
+    def _expired(self, entry: dict) -> bool:
+        return self.ttl is not None and time.time() - entry["stored_at"] > self.ttl
+
+    # -------------------------------
+    # PERSISTENCE
+    # -------------------------------
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+
+        for key, entry in stored.items():
+            if not self._expired(entry):
+                self._entries[key] = entry
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _mark_dirty(self):
+        """Called with the lock held"""
+        if not self.path:
+            return
+        self._dirty = True
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _write(self, snapshot: dict) -> bool:
+        # Persistence is best effort - a read-only disk must not fail the request
+        with self._write_lock:
+            tmp_path = f"{self.path}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(snapshot, f)
+                os.replace(tmp_path, self.path)
+                return True
+            except OSError:
+                return False
@@ -1,7 +1,8 @@
+import asyncio
 import logging
 from fastmcp import FastMCP
-from tools.uniform_entitlement_kpi import uniform_entitlement_kpi_mcp
-from tools.employee_kpi import employee_kpi_mcp
+from tools.registry import run_tool
+from tools.normalize import refresh_normalized
 from database import db
 
 
@@ -15,96 +16,78 @@ mcp = FastMCP(
 
 
 @mcp.tool()
-def employee_kpi(
+async def employee_kpi(
     metric: str = "total",
     group_by: str = "none",
     filters: dict | None = None,
-    time_range: dict | None = None
+    time_range: dict | None = None,
+    limit: int | None = None,
+    cursor: str | None = None,
+    order_by: str | None = None,
+    format: str | None = None
 ):
     """
     Employee KPI MCP Tool
 
     This signature is CRITICAL for FastMCP + Azure Foundry.
     Arguments MUST be flat.
+
+    limit / cursor / order_by page row-returning metrics; the response
+    then carries page.next_cursor for the following page.
+    format="columnar" sends data as {columns, rows} instead of row objects.
+
+    The SQLite work runs in a worker thread so the event loop keeps
+    serving other calls meanwhile.
     """
 
     logger.info("employee_kpi tool called")
 
-    params = {
+    result = await asyncio.to_thread(run_tool, "employee_kpi", {
         "metric": metric,
         "group_by": group_by,
-        "filters": filters or {},
-        "time_range": time_range
+        "filters": filters,
+        "time_range": time_range,
+        "limit": limit,
+        "cursor": cursor,
+        "order_by": order_by,
+        "format": format
+    })
+
+    return {
+        "content": [{
+            "type": "json",
+            "json": result
+        }]
     }
 
-    logger.info(f"normalized params = {params}")
-
-    try:
-        data = employee_kpi_mcp(params)
-
-        return {
-            "content": [{
-                "type": "json",
-                "json": {
-                    "final": True,
-                    "status": "success",
-                    **data
-                }
-            }]
-        }
-
-    except Exception as e:
-        logger.exception("employee_kpi failed")
-
-        return {
-            "content": [{
-                "type": "json",
-                "json": {
-                    "final": True,
-                    "status": "error",
-                    "reason": str(e)
-                }
-            }]
-        }
-
 @mcp.tool()
-def uniform_entitlement_kpi(
+async def uniform_entitlement_kpi(
     metric: str,
     filters: dict | None = None,
-    time_range: dict | None = None
+    time_range: dict | None = None,
+    limit: int | None = None,
+    cursor: str | None = None,
+    order_by: str | None = None,
+    format: str | None = None
 ):
     logger.info("uniform_entitlement_kpi tool called")
 
-    params = {
+    result = await asyncio.to_thread(run_tool, "uniform_entitlement_kpi", {
         "metric": metric,
-        "filters": filters or {},
-        "time_range": time_range
+        "filters": filters,
+        "time_range": time_range,
+        "limit": limit,
+        "cursor": cursor,
+        "order_by": order_by,
+        "format": format
+    })
+
+    return {
+        "content": [{
+            "type": "json",
+            "json": result
+        }]
     }
-    try:
-        data = uniform_entitlement_kpi_mcp(params)
-
-        return {
-            "content": [{
-                "type": "json",
-                "json": {
-                    "final": True,
-                    "status": "success",
-                    **data
-                }
-            }]
-        }
-    except Exception as e:
-        logger.exception("uniform kpi failed")
-        return {
-            "content": [{
-                "type": "json",
-                "json": {
-                    "final": True,
-                    "status": "error",
-                    "reason": str(e)
-                }
-            }]
-        }
 
 
 def startup():
@@ -116,6 +99,10 @@ def startup():
 
 
 if __name__ == "__main__":
+    # Build/refresh the normalized tables before the first tool call -
+    # the request path only checks that they exist
+    refresh_normalized()
+
     mcp.run(
         transport="streamable-http",
         host="127.0.0.1",
@@ -0,0 +1,81 @@
+import random
+import sqlite3
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+import pytest
+
+# Tests import the backend modules the way the servers do (flat, from BACK-END/)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+FUNCTIONS = [
+    "Airport Operations & Customer Services", "Cargo", "cargo", "Engineering",
+    "Flight Operations", "Flight Safety", "Inflight Services", "Finance",
+]
+LOCATIONS = ["Delhi", "Mumbai", "Bengaluru", "Port Blair", None]
+# Entitlement sheet spellings, including the ones the baseline mapping did not touch
+ENTITLEMENT_DEPARTMENTS = ["AOCS", "Inflights", "INFLIGHT", "Engineering", "CARGO", " Flight Safety "]
+ITEMS = ["T-shirts", "Trousers", "Shoes", "Blazer", "Cap", "Belt", "Socks "]
+
+
+def build_fixture_db(path, employees: int = 400, seed: int = 7):
+    """Small copy of the two Excel-sheet source tables, with the quirks of the real data"""
+    from tools.normalize import EMPLOYEE_SOURCE, ENTITLEMENT_SOURCE
+
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript(f"""
+        CREATE TABLE {EMPLOYEE_SOURCE} (
+            iga_code TEXT, function TEXT, status TEXT, gender_picklist_label TEXT,
+            baselocationtext TEXT, dateofjoining TEXT, dateofrelieving TEXT, employee_name TEXT
+        );
+        CREATE TABLE {ENTITLEMENT_SOURCE} (
+            department TEXT, item_name TEXT, gender TEXT, base_location TEXT,
+            frequency INTEGER, quantity INTEGER
+        );
+    """)
+
+    rows = []
+    for i in range(employees):
+        joined = date(2010, 1, 1) + timedelta(days=rng.randint(0, 5600))
+        if rng.random() < 0.1:
+            # Month-end joins exercise date()'s month rollover
+            joined = date(rng.choice([2020, 2024, 2025]), rng.choice([1, 3, 5, 8, 10, 12]), 31)
+        status = rng.choice(["Active", "Active", "Active", "active", "Inactive"])
+        relieved = None if status.lower() == "active" else str(joined + timedelta(days=rng.randint(30, 900)))
+        rows.append((
+            f"IGA{i:05d}", rng.choice(FUNCTIONS), status, rng.choice(["Male", "Female", "female"]),
+            rng.choice(LOCATIONS), str(joined), relieved, f"Employee {i}"
+        ))
+    conn.executemany(f"INSERT INTO {EMPLOYEE_SOURCE} VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    entitlements = []
+    for department in ENTITLEMENT_DEPARTMENTS:
+        for item in rng.sample(ITEMS, 4):
+            entitlements.append((
+                department, item, rng.choice(["M", "F", "B", "b"]), rng.choice(["ALL", "Delhi"]),
+                rng.choice([0, 3, 6, 12, 24]), rng.choice([1, 2])
+            ))
+    conn.executemany(f"INSERT INTO {ENTITLEMENT_SOURCE} VALUES (?, ?, ?, ?, ?, ?)", entitlements)
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture(scope="session")
+def fixture_db(tmp_path_factory):
+    """Points the shared database at a freshly built fixture DB with its derived tables"""
+    from database import db
+    from tools.demand_ledger import refresh_demand_ledger
+    from tools.normalize import normalized_tables
+
+    path = tmp_path_factory.mktemp("db") / "Uniform.db"
+    build_fixture_db(path)
+
+    original = db.path
+    db.path = path
+    normalized_tables.rebuild()
+    refresh_demand_ledger()
+    yield db
+    db.close()
+    db.path = original
@@ -0,0 +1,97 @@
+import copy
+
+import pytest
+
+from database import db
+from conftest import build_fixture_db
+from tools import uniform_entitlement_kpi
+from tools.change_feed import apply_employee_changes
+from tools.demand_engine import demand
+from tools.demand_ledger import demand_ledger
+from tools.normalize import EMPLOYEE_SOURCE, EMPLOYEE_TABLE, normalized_tables, source_fingerprint, stored_fingerprint
+
+run = uniform_entitlement_kpi.uniform_entitlement_kpi_mcp.__wrapped__  # bypass the result cache
+
+BATCH = [
+    {"action": "insert", "iga_code": "IGA90001", "function": "Cargo", "status": "Active",
+     "gender_picklist_label": "Female", "baselocationtext": "Delhi", "dateofjoining": "2024-08-31"},
+    {"action": "update", "iga_code": "IGA00003", "function": "Engineering", "dateofjoining": "2023-05-31"},
+    {"action": "update", "iga_code": "IGA00004", "gender_picklist_label": "Male"},
+    {"action": "relieve", "iga_code": "IGA00005", "dateofrelieving": "2025-10-03"},
+]
+
+
+@pytest.fixture
+def feed_db(tmp_path):
+    """A private copy of the fixture DB with current normalized tables and demand ledger"""
+    original = db.path
+    db.path = tmp_path / "Uniform.db"
+    build_fixture_db(db.path, employees=120)
+    normalized_tables.rebuild()
+    demand_ledger.rebuild(
+        demand_ledger.spec(uniform_entitlement_kpi.LAST_ISSUE_DATE, uniform_entitlement_kpi.DEMAND_MAX_CYCLES)
+    )
+    yield db
+    db.close()
+    db.path = original
+
+
+def employee_rows(database):
+    return sorted(
+        tuple(row.values()) for row in database.execute_query(f"SELECT * FROM {EMPLOYEE_TABLE}")
+    )
+
+
+def test_relieve_requires_an_effective_date(feed_db):
+    location = f"SELECT baselocationtext FROM {EMPLOYEE_SOURCE} WHERE iga_code = 'IGA00001'"
+    before = feed_db.execute_query(location)
+    with pytest.raises(ValueError, match="without dateofrelieving"):
+        apply_employee_changes([
+            {"action": "update", "iga_code": "IGA00001", "baselocationtext": "Agartala"},
+            {"action": "relieve", "iga_code": "IGA00002"},
+        ])
+
+    # The whole batch was rolled back
+    assert feed_db.execute_query(location) == before
+
+
+def test_batch_is_incremental_and_matches_a_full_rebuild(feed_db, monkeypatch):
+    monkeypatch.setattr("tools.change_feed.source_fingerprint", lambda conn: pytest.fail("sheets re-hashed"))
+    result = apply_employee_changes(copy.deepcopy(BATCH))
+    monkeypatch.undo()
+
+    assert result["normalized"] == "incremental"
+    assert result["demand_ledger"] == "incremental"
+    assert result["in_memory"] == "reload on next query"
+    with feed_db.connect() as conn:
+        assert stored_fingerprint(conn) == source_fingerprint(conn)
+
+    patched = employee_rows(feed_db)
+    demand.enabled = False
+    try:
+        params = {"metric": "sku_demand", "filters": {"months": ["2025-10", "2026-03"]}, "time_range": None}
+        from_ledger = run(copy.deepcopy(params))
+        demand_ledger.enabled = False
+        from_sql = run(copy.deepcopy(params))
+    finally:
+        demand.enabled, demand_ledger.enabled = True, True
+
+    assert from_ledger == from_sql
+    normalized_tables.rebuild()
+    assert employee_rows(feed_db) == patched
+
+
+def test_replaying_a_batch_gives_the_same_tables(tmp_path, feed_db):
+    apply_employee_changes(copy.deepcopy(BATCH))
+    first = employee_rows(feed_db)
+    with feed_db.connect() as conn:
+        fingerprint = stored_fingerprint(conn)
+
+    db.path = tmp_path / "Replay.db"
+    build_fixture_db(db.path, employees=120)
+    normalized_tables.rebuild()
+    apply_employee_changes(copy.deepcopy(BATCH))
+
+    assert employee_rows(db) == first
+    with db.connect() as conn:
+        assert stored_fingerprint(conn) == fingerprint
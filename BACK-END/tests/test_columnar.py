@@ -0,0 +1,62 @@
+import copy
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from tools.columnar import columnar
+from tools.employee_kpi import SUPPORTED_GROUP_BY, SUPPORTED_METRICS, employee_kpi_mcp
+
+run = employee_kpi_mcp.__wrapped__  # bypass the result cache
+
+TIME_RANGES = [
+    None,
+    {"from": "2015-01", "to": "2018-06"},
+    {"from": "2024-01", "to": "2024-01"},
+    {"from": "2016-1", "to": "2017-06"},  # not YYYY-MM - the cube hands over to the row engine
+]
+FILTER_SETS = [
+    {},
+    {"department": "Cargo"},
+    {"department": "CARGO"},
+    {"department": "cabin crew"},
+    {"department": "__missing__"},
+    {"location": "delhi"},
+    {"location": "__missing__"},
+    {"gender": "Female", "status": "active"},
+    {"gender": "female"},
+    {"status": "Inactive"},
+    {"department": "Engineering", "location": "Mumbai", "status": "Active"},
+]
+
+# path → (enabled, use_cube)
+PATHS = {"sql": (False, False), "columnar": (True, False), "cube": (True, True)}
+
+
+@pytest.fixture
+def store(fixture_db):
+    yield columnar
+    columnar.enabled, columnar.use_cube = True, True
+
+
+def results_by_path(store, params):
+    results = {}
+    for path, (enabled, use_cube) in PATHS.items():
+        store.enabled, store.use_cube = enabled, use_cube
+        results[path] = run(copy.deepcopy(params))
+    return results
+
+
+def test_both_engines_load_on_the_fixture(store):
+    assert [type(engine).__name__ for engine in store.engines()] == ["EmployeeCube", "ColumnarEngine"]
+
+
+@pytest.mark.parametrize("metric", SUPPORTED_METRICS)
+@pytest.mark.parametrize("group_by", SUPPORTED_GROUP_BY)
+def test_engines_match_sql(store, metric, group_by):
+    for filters in FILTER_SETS:
+        for time_range in TIME_RANGES:
+            params = {"metric": metric, "group_by": group_by, "filters": dict(filters), "time_range": time_range}
+            results = results_by_path(store, params)
+            assert results["columnar"] == results["sql"], params
+            assert results["cube"] == results["sql"], params
@@ -0,0 +1,45 @@
+import sqlite3
+
+from conftest import build_fixture_db
+from database import Database
+
+
+def journal_mode(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("PRAGMA journal_mode").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_pool_opens_read_only_connections_only(tmp_path, monkeypatch):
+    path = tmp_path / "Uniform.db"
+    build_fixture_db(path, employees=20)
+    assert journal_mode(path) != "wal"
+
+    opened = []
+    connect = sqlite3.connect
+
+    def recording_connect(target, *args, **kwargs):
+        opened.append(str(target))
+        return connect(target, *args, **kwargs)
+
+    monkeypatch.setattr("database.sqlite3.connect", recording_connect)
+    database = Database(path)
+    try:
+        database.data_signature()
+        assert database.execute_query("SELECT 1 AS one") == [{"one": 1}]
+    finally:
+        database.close()
+
+    assert opened and all(target.endswith("?mode=ro") for target in opened)
+    assert journal_mode(path) != "wal"
+
+
+def test_writable_connection_switches_to_wal(tmp_path):
+    path = tmp_path / "Uniform.db"
+    build_fixture_db(path, employees=20)
+
+    with Database(path).connect_writable():
+        pass
+    assert journal_mode(path) == "wal"
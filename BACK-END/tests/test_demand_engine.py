@@ -0,0 +1,87 @@
+import copy
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from tools import uniform_entitlement_kpi
+from tools.demand_engine import demand
+from tools.demand_ledger import demand_ledger
+from tools.normalize import EMPLOYEE_TABLE, ENTITLEMENT_TABLE
+
+run = uniform_entitlement_kpi.uniform_entitlement_kpi_mcp.__wrapped__  # bypass the result cache
+
+FILTER_SETS = [
+    {},
+    {"gender": "female"},
+    {"sku": "t-shirts"},
+    {"department": "Cargo"},
+    {"department": "CARGO", "gender": "Male"},
+    {"department": "cabin crew"},
+    {"department": "Engineering", "sku": "socks"},
+]
+WINDOWS = [
+    {"from": "2025-09", "to": "2026-09"},
+    {"from": "2025-01", "to": "2025-12"},
+    {"from": "2026-02", "to": "2030-02"},
+    {"from": "2025-9", "to": "2026-1"},
+    # Aug 31 + 6 months is Feb 31 - date() rolls it over to Mar 3
+    {"from": "2026-02", "to": "2026-02"},
+    {"from": "2026-03", "to": "2026-03"},
+]
+MONTH_LISTS = [
+    ["2025-09"],
+    ["2025-10", "2026-03", "2026-12"],
+    ["2026-02"],
+    ["2026-03"],
+    ["2020-05", "2024-03", "2024-03"],
+    ["2026-02", "bogus"],
+]
+
+# path → (engine enabled, ledger enabled)
+PATHS = {"sql": (False, False), "engine": (True, False), "ledger": (False, True)}
+
+
+@pytest.fixture
+def paths(fixture_db):
+    yield PATHS
+    demand.enabled, demand_ledger.enabled = True, True
+
+
+def cases():
+    for filters in FILTER_SETS:
+        for window in WINDOWS:
+            yield {"metric": "sku_demand", "filters": dict(filters), "time_range": window}
+        for months in MONTH_LISTS:
+            yield {"metric": "sku_demand", "filters": dict(filters, months=months), "time_range": None}
+
+
+def test_fixture_has_month_end_rollovers(fixture_db):
+    rows = fixture_db.execute_query(f"""
+        SELECT COUNT(*) AS n
+        FROM {EMPLOYEE_TABLE} e, (SELECT DISTINCT frequency FROM {ENTITLEMENT_TABLE} WHERE frequency > 0) f
+        WHERE strftime('%d', date(e.dateofjoining, '+' || f.frequency || ' months'))
+            < strftime('%d', e.dateofjoining)
+    """)
+    assert rows[0]["n"] > 0
+
+
+@pytest.mark.parametrize("max_cycles", [20, None])
+def test_engine_and_ledger_match_sql(paths, monkeypatch, max_cycles):
+    monkeypatch.setattr(uniform_entitlement_kpi, "DEMAND_MAX_CYCLES", max_cycles)
+    # The ingest step builds the ledger for the configured cycle cap
+    demand_ledger.refresh(demand_ledger.spec(uniform_entitlement_kpi.LAST_ISSUE_DATE, max_cycles))
+    # Both fast paths must be able to answer, or the comparison proves nothing
+    assert demand.engine() is not None
+    assert demand_ledger.sku_demand(
+        {}, WINDOWS[0], [], uniform_entitlement_kpi.LAST_ISSUE_DATE, max_cycles, False
+    ) is not None
+
+    for params in cases():
+        results = {}
+        for path, (engine_enabled, ledger_enabled) in paths.items():
+            demand.enabled, demand_ledger.enabled = engine_enabled, ledger_enabled
+            results[path] = run(copy.deepcopy(params))
+
+        assert results["engine"] == results["sql"], params
+        assert results["ledger"] == results["sql"], params
@@ -0,0 +1,47 @@
+import sqlite3
+
+import pytest
+
+from database import Database
+from conftest import build_fixture_db
+from tools.demand_ledger import DemandLedger
+from tools.normalize import EMPLOYEE_SOURCE, NormalizedTables
+
+LAST_ISSUE_DATE = "2025-08-31"
+WINDOW = {"from": "2025-09", "to": "2026-08"}
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = tmp_path / "Uniform.db"
+    build_fixture_db(path, employees=50)
+    database = Database(path)
+    NormalizedTables(database).rebuild()
+    yield database
+    database.close()
+
+
+def test_request_path_never_builds_the_ledger(database, monkeypatch):
+    ledger = DemandLedger(database)
+    monkeypatch.setattr(database, "connect_writable", lambda: pytest.fail("wrote on the request path"))
+
+    # Not built yet: the caller falls back to the engine / SQL
+    assert ledger.sku_demand({}, WINDOW, [], LAST_ISSUE_DATE) is None
+    assert ledger.rebuilds == 0
+
+
+def test_stale_ledger_is_skipped_until_the_next_refresh(database):
+    ledger = DemandLedger(database)
+    spec = ledger.spec(LAST_ISSUE_DATE)
+    assert ledger.refresh(spec)
+    assert ledger.sku_demand({}, WINDOW, [], LAST_ISSUE_DATE)
+
+    with sqlite3.connect(database.path) as conn:
+        conn.execute(f"UPDATE {EMPLOYEE_SOURCE} SET function = 'Security' WHERE iga_code = 'IGA00001'")
+    NormalizedTables(database).refresh()
+    assert ledger.sku_demand({}, WINDOW, [], LAST_ISSUE_DATE) is None
+    assert ledger.rebuilds == 1
+
+    assert ledger.refresh(spec)
+    assert ledger.rebuilds == 2
+    assert ledger.sku_demand({}, WINDOW, [], LAST_ISSUE_DATE)
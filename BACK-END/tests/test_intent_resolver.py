@@ -0,0 +1,92 @@
+import pytest
+
+from intent_resolver import resolve_intent
+
+LOCATIONS = {"delhi": "Delhi", "mumbai": "Mumbai", "port blair": "Port Blair"}
+AOCS = "Airport Operations & Customer Services"
+
+
+def resolve(question):
+    return resolve_intent(question, locations=LOCATIONS)
+
+
+def employee(metric, group_by=None, filters=None, time_range=None):
+    arguments = {"metric": metric}
+    if group_by:
+        arguments["group_by"] = group_by
+    if filters:
+        arguments["filters"] = filters
+    if time_range:
+        arguments["time_range"] = time_range
+    return {"tool": "employee_kpi", "arguments": arguments}
+
+
+# Questions built by ActiveEmployeesTab / EligibleEmployeesTab (constructQuery)
+@pytest.mark.parametrize("question, expected", [
+    ("total number of employees", employee("total")),
+    ("total number of active employees", employee("active")),
+    ("total employees breakdown by status", employee("status")),
+    ("active employees breakdown by department", employee("active", "department")),
+    ("active employees breakdown by gender", employee("active", "gender")),
+    ("department summary", employee("status", "department")),
+    ("total number of eligible employees", employee("eligible_employees")),
+    ("eligible employees breakdown by department", employee("department_eligibility")),
+    ("eligible employees breakdown by gender", employee("eligible_employees", "gender")),
+    ("eligible employees breakdown by issuance month", employee("eligibility_trend")),
+    ("headcount vs eligible trend", employee("headcount_vs_eligibility")),
+    ("eligible employee summary", employee("eligible_employees", "status")),
+    (
+        "total number of employees in Cargo department in Delhi with status active and gender female",
+        employee("total", filters={"department": "Cargo", "location": "Delhi", "status": "Active", "gender": "Female"}),
+    ),
+    (
+        "total number of eligible employees in Port Blair and gender male for month Jan 2024",
+        employee("eligible_employees", filters={"location": "Port Blair", "gender": "Male"},
+                 time_range={"from": "2024-01", "to": "2024-01"}),
+    ),
+    ("active employees in AOCS", employee("active", filters={"department": AOCS})),
+])
+def test_frontend_tab_questions(question, expected):
+    assert resolve(question) == expected
+
+
+@pytest.mark.parametrize("question", [
+    "how many active employees in total",
+    "total employees in the last month",
+    "total number of employees in Atlantis",
+    "active employees in Cargo department in AOCS",
+])
+def test_unknown_place_phrases_go_to_the_agent(question):
+    assert resolve(question) is None
+
+
+def test_for_department_resolves_uniform_metrics():
+    assert resolve("total SKUs for AOCS") == {
+        "tool": "uniform_entitlement_kpi",
+        "arguments": {"metric": "unique_skus", "filters": {"department": AOCS}},
+    }
+    assert resolve("SKU demand for AOCS") == {
+        "tool": "uniform_entitlement_kpi",
+        "arguments": {
+            "metric": "sku_demand",
+            "time_range": {"from": "2025-09", "to": "2026-09"},
+            "filters": {"department": AOCS},
+        },
+    }
+
+
+@pytest.mark.parametrize("question", [
+    "sku demand in Delhi",
+    "sku demand with status active",
+    "sku demand and gender female",
+    "total skus in Delhi",
+])
+def test_uniform_metrics_reject_filters_the_tool_ignores(question):
+    assert resolve(question) is None
+
+
+def test_locations_default_to_none_without_a_database(monkeypatch):
+    from intent_resolver import known_locations
+    monkeypatch.setattr(known_locations, "get", lambda: {})
+    assert resolve_intent("total number of employees in Delhi") is None
+    assert resolve_intent("total number of employees") == employee("total")
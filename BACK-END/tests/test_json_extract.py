@@ -0,0 +1,94 @@
+import json
+import random
+import time
+
+import pytest
+
+from json_extract import MAX_OBJECT_CHARS, extract_json_from_response
+
+PAYLOADS = [
+    {"tool": "employee_kpi", "arguments": {"metric": "total", "group_by": "department"}},
+    {"tool": "employee_kpi", "arguments": {"metric": "active", "filters": {"department": "Cargo", "gender": "Female"}}},
+    {"tool": "uniform_entitlement_kpi", "arguments": {"metric": "sku_demand", "time_range": {"from": "2025-09", "to": "2026-09"}}},
+    {"tool": "uniform_entitlement_kpi", "arguments": {"metric": "sku_demand", "filters": {"months": ["2025-09", "2025-12"]}}},
+    {"tool": "uniform_entitlement_kpi", "arguments": {"metric": "all_uniform_entitlements", "filters": {"sku": "T-shirts {L}"}}},
+]
+PROSE = (
+    "Based on the question, the user wants a breakdown. I'll use the \"employee\" tool "
+    "because it's the closest match; note that {placeholders} are not filled. "
+)
+
+# Worst cases stay linear: a generous wall-clock bound per 50k-char input
+WORST_CASE_SECONDS = 0.5
+
+
+def wrappings(payload, rng):
+    body = json.dumps(payload)
+    pretty = json.dumps(payload, indent=2)
+    yield "bare", body
+    yield "pretty", pretty
+    yield "fenced", f"```json\n{pretty}\n```"
+    yield "fence, no lang", f"Here you go:\n```\n{body}\n```\nLet me know!"
+    yield "prose around", f"{PROSE}\n{body}\n{PROSE}"
+    yield "brace commentary", f"{PROSE}{{draft}}\n{body}\nAlternative: {{\"tool\": null}}"
+    yield "stray open brace", f"Payload {{ follows:\n{body}"
+    yield "long preamble", PROSE * rng.randint(50, 200) + body
+
+
+def all_wrapped():
+    rng = random.Random(7)
+    return [(name, payload, text) for payload in PAYLOADS for name, text in wrappings(payload, rng)]
+
+
+WRAPPED = all_wrapped()
+
+
+@pytest.mark.parametrize("name, payload, text", WRAPPED, ids=[f"{i}-{name}" for i, (name, _, _) in enumerate(WRAPPED)])
+def test_realistic_agent_output_yields_the_payload(name, payload, text):
+    assert extract_json_from_response(text) == payload
+
+
+def test_corrupted_outputs_only_raise_value_error():
+    rng = random.Random(7)
+    texts = [text for _, _, text in WRAPPED]
+    for _ in range(2000):
+        text = rng.choice(texts)
+        cut = rng.randrange(len(text))
+        text = text[:cut] + rng.choice(["", "}", "{", "\"", "\\", "```"]) + text[cut + 1:]
+        try:
+            extract_json_from_response(text)
+        except ValueError:
+            pass
+
+
+@pytest.mark.parametrize("text", ["", "   ", "no json here", "{", "}", "{\"tool\": 1}", "[1, 2]", "{\"arguments\": {}}"])
+def test_hostile_inputs_fail_cleanly(text):
+    with pytest.raises(ValueError):
+        extract_json_from_response(text)
+
+
+def test_oversized_object_is_not_parsed():
+    text = json.dumps({"tool": "employee_kpi", "arguments": {"metric": "total", "pad": "x" * MAX_OBJECT_CHARS}})
+    with pytest.raises(ValueError):
+        extract_json_from_response(text)
+
+
+# (name, text, expected payload or None when only ValueError is acceptable)
+WORST_CASES = [
+    ("prose + payload", PROSE * (50_000 // len(PROSE)) + json.dumps(PAYLOADS[1]), PAYLOADS[1]),
+    ("many small non-payloads", "{x} " * 12_500 + json.dumps(PAYLOADS[1]), PAYLOADS[1]),
+    ("unbalanced '{' run", "{" * 50_000, None),
+    ("nested key spans", "{\"a\": " * 5_000 + "1" + "}" * 5_000, None),
+    ("open quotes", "{\"" * 25_000, None),
+]
+
+
+@pytest.mark.parametrize("name, text, expected", WORST_CASES, ids=[name for name, _, _ in WORST_CASES])
+def test_worst_case_inputs_stay_bounded(name, text, expected):
+    started = time.perf_counter()
+    if expected is None:
+        with pytest.raises(ValueError):
+            extract_json_from_response(text)
+    else:
+        assert extract_json_from_response(text) == expected
+    assert time.perf_counter() - started < WORST_CASE_SECONDS
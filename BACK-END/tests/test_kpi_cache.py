@@ -0,0 +1,36 @@
+import pytest
+
+from tools.employee_kpi import employee_kpi_mcp
+from tools.uniform_entitlement_kpi import uniform_entitlement_kpi_mcp
+from tools.kpi_cache import kpi_cache
+
+
+def test_redirected_metric_pages_do_not_poison_the_cache(fixture_db):
+    kpi_cache.clear()
+    base = {"metric": "eligibility_by_gender", "group_by": "none", "filters": {}, "time_range": None}
+
+    full = employee_kpi_mcp(dict(base))["data"]
+    assert len(full) >= 2
+
+    first = employee_kpi_mcp({**base, "limit": 1})
+    assert first["page"]["total_rows"] == len(full)
+    second = employee_kpi_mcp({**base, "limit": 1, "cursor": first["page"]["next_cursor"]})
+    assert second["page"]["total_rows"] == len(full)
+    assert first["data"] + second["data"] == full[:2]
+
+    # The cached entry is still the full result
+    assert employee_kpi_mcp(dict(base))["data"] == full
+
+
+def test_redirect_leaves_caller_params_alone(fixture_db):
+    kpi_cache.clear()
+    params = {"metric": "eligibility_by_gender", "group_by": "none", "filters": {}, "time_range": None, "limit": 1}
+    employee_kpi_mcp(params)
+    assert params["metric"] == "eligibility_by_gender"
+    assert params["group_by"] == "none"
+
+
+def test_streaming_calls_reject_page_params(fixture_db):
+    params = {"metric": "all_uniform_entitlements", "filters": {}, "stream": True, "limit": 10}
+    with pytest.raises(ValueError, match="cannot be combined with streaming"):
+        uniform_entitlement_kpi_mcp(params)
@@ -0,0 +1,81 @@
+import sqlite3
+
+import pytest
+
+from database import Database
+from tools.normalize import (
+    EMPLOYEE_SOURCE, EMPLOYEE_TABLE, ENTITLEMENT_SOURCE, ENTITLEMENT_TABLE, NormalizedTables, source_fingerprint
+)
+from conftest import build_fixture_db
+
+
+# The CASE expression the tools ran before the department_alias table existed
+BASELINE_DEPARTMENT = """
+CASE
+    WHEN UPPER(department) = 'AOCS'
+        THEN 'Airport Operations & Customer Services'
+    WHEN UPPER(department) IN ('INFLIGHTS', 'INFLIGHT')
+        THEN 'Inflight Services'
+    WHEN UPPER(department) = 'ENGINEERING'
+        THEN 'Engineering'
+    WHEN UPPER(department) = 'CARGO'
+        THEN 'Cargo'
+    ELSE TRIM(department)
+END
+"""
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = tmp_path / "Uniform.db"
+    build_fixture_db(path, employees=50)
+    database = Database(path)
+    yield database
+    database.close()
+
+
+def test_request_path_never_hashes_or_builds(database, monkeypatch):
+    tables = NormalizedTables(database)
+    monkeypatch.setattr("tools.normalize.source_fingerprint", lambda conn: pytest.fail("hashed on the request path"))
+    monkeypatch.setattr("tools.normalize.build", lambda conn, fp: pytest.fail("built on the request path"))
+
+    with pytest.raises(RuntimeError, match="Normalized tables are missing"):
+        tables.ensure()
+
+
+def test_refresh_builds_once_and_ensure_accepts_changed_data(database, monkeypatch):
+    tables = NormalizedTables(database)
+    tables.refresh()
+    tables.refresh()
+    assert tables.rebuilds == 1
+
+    with sqlite3.connect(database.path) as conn:
+        conn.execute(f"UPDATE {EMPLOYEE_SOURCE} SET status = 'Inactive' WHERE iga_code = 'IGA00001'")
+
+    # Source changed: the request path keeps serving the existing tables without hashing
+    monkeypatch.setattr("tools.normalize.source_fingerprint", lambda conn: pytest.fail("hashed on the request path"))
+    tables.ensure()
+    monkeypatch.undo()
+
+    tables.refresh()
+    assert tables.rebuilds == 2
+    rows = database.execute_query(f"SELECT status FROM {EMPLOYEE_TABLE} WHERE iga_code = 'IGA00001'")
+    assert rows == [{"status": "Inactive"}]
+    with database.connect() as conn:
+        assert source_fingerprint(conn)
+
+
+def test_entitlement_departments_match_the_baseline_case(database):
+    # Padded codes and query-only phrasings must come through exactly as the CASE left them
+    extra = [" cargo ", "AOCS ", "aocs", "Cabin Crew", "Flight Ops", "pilots", None]
+    with sqlite3.connect(database.path) as conn:
+        conn.executemany(
+            f"INSERT INTO {ENTITLEMENT_SOURCE} VALUES (?, 'Cap', 'M', 'ALL', 12, 1)",
+            [(department,) for department in extra]
+        )
+
+    NormalizedTables(database).refresh()
+    expected = database.execute_query(
+        f"SELECT {BASELINE_DEPARTMENT} AS department FROM {ENTITLEMENT_SOURCE} ORDER BY rowid"
+    )
+    assert database.execute_query(f"SELECT department FROM {ENTITLEMENT_TABLE} ORDER BY rowid") == expected
@@ -0,0 +1,46 @@
+import json
+import time
+
+from payload_cache import PayloadCache
+
+PAYLOAD = {"tool": "employee_kpi", "arguments": {"metric": "total"}}
+
+
+def test_writes_are_batched_until_flush(tmp_path):
+    path = tmp_path / "payload_cache.json"
+    cache = PayloadCache(path=str(path), flush_interval=60)
+
+    for i in range(50):
+        cache.set(f"question {i}", PAYLOAD)
+    assert not path.exists()
+
+    cache.close()
+    assert len(json.loads(path.read_text())) == 50
+    assert not (tmp_path / "payload_cache.json.tmp").exists()
+
+    reloaded = PayloadCache(path=str(path))
+    assert reloaded.get("Question 7?") == PAYLOAD
+
+
+def test_timer_flushes_pending_changes(tmp_path):
+    path = tmp_path / "payload_cache.json"
+    cache = PayloadCache(path=str(path), flush_interval=0.05)
+    cache.set("total employees", PAYLOAD)
+
+    deadline = time.time() + 5
+    while not path.exists() and time.time() < deadline:
+        time.sleep(0.01)
+    assert json.loads(path.read_text())["total employees"]["payload"] == PAYLOAD
+    cache.close()
+
+
+def test_failed_write_is_retried(tmp_path):
+    path = tmp_path / "missing" / "payload_cache.json"
+    cache = PayloadCache(path=str(path), flush_interval=60)
+    cache.set("total employees", PAYLOAD)
+    cache.flush()
+    assert not path.exists()
+
+    path.parent.mkdir()
+    cache.close()
+    assert "total employees" in json.loads(path.read_text())
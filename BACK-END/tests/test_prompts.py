@@ -0,0 +1,52 @@
+import asyncio
+import logging
+from types import SimpleNamespace
+
+from prompts import EXTRACTION_INSTRUCTIONS, SCHEMA_REFERENCE, ExtractionPrompt
+
+
+class FakeAgents:
+    def __init__(self, instructions):
+        self.instructions = instructions
+        self.updates = []
+
+    async def get_agent(self, agent_id):
+        return SimpleNamespace(id=agent_id, instructions=self.instructions)
+
+    async def update_agent(self, agent_id, instructions):
+        self.updates.append(agent_id)
+        self.instructions = instructions
+
+
+def fake_client(instructions):
+    return SimpleNamespace(agents=FakeAgents(instructions))
+
+
+def test_startup_check_never_updates_the_agent(caplog):
+    client = fake_client("old instructions")
+    prompt = ExtractionPrompt()
+
+    with caplog.at_level(logging.WARNING, logger="prompts"):
+        assert asyncio.run(prompt.check(client, "asst_1")) is False
+    assert client.agents.updates == []
+    assert "python prompts.py --sync" in caplog.text
+    assert prompt.user_message("total employees").startswith(EXTRACTION_INSTRUCTIONS)
+
+
+def test_matching_agent_gets_the_compact_message():
+    client = fake_client(EXTRACTION_INSTRUCTIONS)
+    prompt = ExtractionPrompt()
+
+    assert asyncio.run(prompt.check(client, "asst_1")) is True
+    assert client.agents.updates == []
+    assert prompt.user_message("total employees").startswith(SCHEMA_REFERENCE)
+
+
+def test_deploy_step_updates_only_when_the_text_differs():
+    client = fake_client("old instructions")
+
+    assert asyncio.run(ExtractionPrompt().deploy(client, "asst_1")) is True
+    assert client.agents.updates == ["asst_1"]
+    assert asyncio.run(ExtractionPrompt().deploy(client, "asst_1")) is False
+    assert client.agents.updates == ["asst_1"]
+    assert asyncio.run(ExtractionPrompt().check(client, "asst_1")) is True
@@ -0,0 +1,40 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import dashboard_api
+from tools.kpi_cache import kpi_cache
+from tools.registry import InProcessToolClient
+from tools.sql_registry import register_all_shapes, sql_registry
+
+
+@pytest.fixture
+def client(fixture_db, monkeypatch):
+    monkeypatch.setattr(dashboard_api, "tool_client", InProcessToolClient())
+    sql_registry.clear()
+    kpi_cache.clear()
+    return TestClient(dashboard_api.app)
+
+
+def test_hidden_unless_debug_endpoints_are_enabled(client):
+    assert client.get("/debug/query-plans").status_code == 404
+
+
+def test_reports_only_recorded_shapes(client, monkeypatch):
+    monkeypatch.setattr(dashboard_api, "DEBUG_ENDPOINTS", True)
+
+    report = client.get("/debug/query-plans").json()
+    assert report["shapes"] == []
+
+    client.post("/dashboard/kpi", json={"tool": "employee_kpi", "metric": "active", "group_by": "gender"})
+    report = client.get("/debug/query-plans").json()
+    assert [(shape["tool"], shape["metric"]) for shape in report["shapes"]] == [("employee_kpi", "active")]
+    assert report["shapes"][0]["plan"]
+
+
+def test_offline_enumeration_bypasses_the_result_cache(fixture_db):
+    kpi_cache.clear()
+    before = kpi_cache.stats()
+    register_all_shapes()
+
+    assert sql_registry.stats()["shapes"] > 0
+    assert kpi_cache.stats() == before
@@ -0,0 +1,42 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from database import db, query_deadline
+from mcp_client import MCPError
+from tools import registry
+from tools.registry import InProcessToolClient
+
+# Counts far past any timeout used here
+ENDLESS_SQL = """
+    WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n)
+    SELECT count(*) FROM n
+"""
+
+
+def test_deadline_interrupts_pooled_sql(fixture_db):
+    started = time.monotonic()
+    with query_deadline(0.05), pytest.raises(sqlite3.OperationalError, match="interrupted"):
+        db.execute_query(ENDLESS_SQL)
+    assert time.monotonic() - started < 2
+
+    # The connection goes back to the pool usable and without a deadline
+    assert db.execute_query("SELECT 1 AS one") == [{"one": 1}]
+
+
+def test_timed_out_call_frees_its_worker(fixture_db, monkeypatch):
+    monkeypatch.setitem(registry.TOOLS, "endless", lambda params: {"data": db.execute_query(ENDLESS_SQL)})
+    client = InProcessToolClient(workers=1)
+
+    async def calls():
+        with pytest.raises(MCPError, match="timed out"):
+            await client.call_tool("endless", {}, timeout=0.1)
+        # Same single worker: only free if the endless query was interrupted
+        try:
+            return await client.call_tool("employee_kpi", {"metric": "total"}, timeout=5)
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(calls())["status"] == "success"
@@ -0,0 +1,122 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import dashboard_api
+from tools.registry import InProcessToolClient
+
+KPI = {"tool": "employee_kpi", "metric": "total", "group_by": "department"}
+
+
+@pytest.fixture
+def client(fixture_db, monkeypatch):
+    # No lifespan: the tools run in-process and no agent client is needed
+    monkeypatch.setattr(dashboard_api, "tool_client", InProcessToolClient())
+    return TestClient(dashboard_api.app)
+
+
+def rows_from_columnar(data):
+    return [dict(zip(data["columns"], row)) for row in data["rows"]]
+
+
+def test_json_rows_by_default(client):
+    response = client.post("/dashboard/kpi", json=KPI)
+    assert response.headers["content-type"] == "application/json"
+    data = response.json()["data"]
+    assert data and all(isinstance(row, dict) for row in data)
+
+
+def test_columnar_json_carries_the_same_rows(client):
+    rows = client.post("/dashboard/kpi", json=KPI).json()
+    columnar = client.post("/dashboard/kpi", json={**KPI, "format": "columnar"}).json()
+
+    assert columnar["format"] == "columnar"
+    assert rows_from_columnar(columnar["data"]) == rows["data"]
+    assert {k: v for k, v in columnar.items() if k not in ("data", "format")} == \
+        {k: v for k, v in rows.items() if k != "data"}
+
+
+@pytest.mark.parametrize("accept", [
+    "application/msgpack",
+    "application/x-msgpack",
+    "application/json;q=0.5, application/msgpack",
+])
+@pytest.mark.parametrize("wire_format", ["rows", "columnar"])
+def test_msgpack_when_accepted(client, accept, wire_format):
+    msgpack = pytest.importorskip("msgpack")
+    expected = client.post("/dashboard/kpi", json={**KPI, "format": wire_format}).json()
+
+    response = client.post("/dashboard/kpi", json={**KPI, "format": wire_format}, headers={"Accept": accept})
+    assert response.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(response.content, raw=False) == expected
+
+
+def test_json_when_msgpack_is_not_accepted_or_not_installed(client, monkeypatch):
+    response = client.post("/dashboard/kpi", json=KPI, headers={"Accept": "application/json, */*"})
+    assert response.headers["content-type"] == "application/json"
+
+    monkeypatch.setattr("tools.wire_format.msgpack", None)
+    response = client.post("/dashboard/kpi", json=KPI, headers={"Accept": "application/msgpack"})
+    assert response.headers["content-type"] == "application/json"
+    assert response.json()["data"]
+
+
+@pytest.mark.parametrize("page", [{"limit": 10}, {"cursor": "abc"}, {"order_by": "item_name"}])
+def test_stream_rejects_page_params(client, page):
+    response = client.post("/dashboard/kpi/stream", json={
+        "tool": "uniform_entitlement_kpi", "metric": "all_uniform_entitlements", **page
+    })
+    assert response.status_code == 422
+    assert "cannot be combined with streaming" in response.json()["detail"]
+
+
+def stream_records(response):
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def test_stream_ends_with_an_error_record_when_rows_fail(client, monkeypatch):
+    def failing_stream(tool, arguments):
+        yield {"type": "meta", "status": "success"}
+        raise RuntimeError("cursor died")
+
+    monkeypatch.setattr(dashboard_api, "TOOL_TRANSPORT", "inprocess")
+    monkeypatch.setattr(dashboard_api, "stream_tool", failing_stream)
+    response = client.post("/dashboard/kpi/stream", json={"tool": "uniform_entitlement_kpi", "metric": "unique_skus"})
+
+    assert response.status_code == 200
+    assert stream_records(response) == [
+        {"type": "meta", "status": "success"},
+        {"type": "error", "reason": "cursor died", "error_type": "RuntimeError"},
+    ]
+
+
+def test_stream_maps_tool_call_failures(client, monkeypatch):
+    async def unreachable(tool_name, arguments):
+        raise ConnectionError("MCP server down")
+
+    monkeypatch.setattr(dashboard_api, "TOOL_TRANSPORT", "mcp")
+    monkeypatch.setattr(dashboard_api, "call_tool", unreachable)
+    response = client.post("/dashboard/kpi/stream", json={"tool": "uniform_entitlement_kpi", "metric": "unique_skus"})
+
+    assert response.status_code == 200
+    assert stream_records(response) == [
+        {"type": "error", "reason": "MCP server down", "error_type": "ConnectionError"}
+    ]
+
+
+def test_batch_tool_items_carry_their_own_format(client):
+    # Tool-only batches never reach the agent
+    dashboard_api.app.dependency_overrides[dashboard_api.get_agent_client] = lambda: None
+    try:
+        response = client.post("/dashboard/batch", json={"requests": [
+            {"id": "rows", "tool": "employee_kpi", "arguments": {"metric": "total", "group_by": "department"}},
+            {"id": "columnar", "tool": "employee_kpi",
+             "arguments": {"metric": "total", "group_by": "department", "format": "columnar"}},
+        ]})
+    finally:
+        dashboard_api.app.dependency_overrides.clear()
+
+    results = response.json()["results"]
+    assert results["columnar"]["format"] == "columnar"
+    assert rows_from_columnar(results["columnar"]["data"]) == results["rows"]["data"]
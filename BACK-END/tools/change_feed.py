@@ -0,0 +1,179 @@
+import json
+import logging
+import sys
+import threading
+
+from database import db
+from tools.demand_ledger import (
+    LEDGER_INSERT_SQL, LEDGER_TABLE, demand_ledger, ledger_fingerprint, ledger_params
+)
+from tools.normalize import (
+    EMPLOYEE_SELECT, EMPLOYEE_SOURCE, EMPLOYEE_TABLE,
+    build as build_normalized, record_fingerprint, rows_digest, shift_fingerprint, source_fingerprint,
+    stored_fingerprint
+)
+
+logger = logging.getLogger(__name__)
+
+# =========================================================
+# EMPLOYEE CHANGE FEED
+# Daily HR feeds arrive as individual joins, updates and relievings.
+# Each batch is applied to the employee sheet and, in the same
+# transaction, to the derived tables - only the touched employees'
+# normalized rows and demand ledger rows are rewritten, and the recorded
+# fingerprint is shifted by their row digests rather than recomputed.
+#
+# Limitation: only the SQLite side is incremental. The in-memory headcount
+# and demand aggregates (OLAP cube, columnar, coverage and demand stores)
+# and the whole KPI result cache are keyed on the database signature, so
+# the first query after a feed reloads them in full from the patched
+# tables - an O(employees) scan per feed, though no ledger recomputation.
+#
+# A relieve must carry its effective date, so replaying a feed always
+# gives the same tables.
+#
+#   {"action": "insert",  "iga_code": "IGA01234", "function": "Cargo", ...}
+#   {"action": "update",  "iga_code": "IGA01234", "baselocationtext": "Delhi"}
+#   {"action": "relieve", "iga_code": "IGA01234", "dateofrelieving": "2025-10-03"}
+# =========================================================
+CHANGE_ACTIONS = ("insert", "update", "relieve")
+CHANGED_TABLE = "changed_employees"
+
+_lock = threading.Lock()
+
+
+def source_columns(conn) -> list:
+    return [row["name"] for row in conn.execute(f"PRAGMA table_info({EMPLOYEE_SOURCE})")]
+
+
+def apply_to_source(conn, change: dict, columns: list) -> str:
+    """Writes one change to the employee sheet; returns its iga_code"""
+    action = change.get("action")
+    iga_code = change.get("iga_code")
+    if action not in CHANGE_ACTIONS:
+        raise ValueError(f"Unsupported change action: {action!r}")
+    if not iga_code:
+        raise ValueError(f"{action} change without iga_code")
+
+    fields = {k: v for k, v in change.items() if k not in ("action", "iga_code")}
+    if action == "relieve":
+        if not fields.get("dateofrelieving"):
+            raise ValueError(f"relieve change for {iga_code} without dateofrelieving")
+        fields = {"status": "Inactive", "dateofrelieving": fields["dateofrelieving"]}
+
+    unknown = set(fields) - set(columns)
+    if unknown:
+        raise ValueError(f"Unknown employee columns: {', '.join(sorted(unknown))}")
+
+    exists = conn.execute(
+        f"SELECT 1 FROM {EMPLOYEE_SOURCE} WHERE iga_code = ? LIMIT 1", (iga_code,)
+    ).fetchone()
+
+    if action == "insert":
+        if exists:
+            raise ValueError(f"Employee {iga_code} already exists")
+        names = ["iga_code", *fields]
+        conn.execute(
+            f"INSERT INTO {EMPLOYEE_SOURCE} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+            (iga_code, *fields.values())
+        )
+    else:
+        if not exists:
+            raise ValueError(f"Employee {iga_code} not found")
+        if fields:
+            assignments = ", ".join(f"{name} = ?" for name in fields)
+            conn.execute(
+                f"UPDATE {EMPLOYEE_SOURCE} SET {assignments} WHERE iga_code = ?",
+                (*fields.values(), iga_code)
+            )
+
+    return iga_code
+
+
+def apply_employee_changes(changes: list, database=db, ledger=demand_ledger) -> dict:
+    """
+    Applies a batch of employee changes atomically.
+
+    Derived tables are patched for the touched employees and their
+    fingerprint shifted by the batch - the sheets are never re-hashed. The
+    recorded fingerprint is trusted: if the tables were already stale, the
+    shifted fingerprint still differs from the sheets' and the next
+    refresh_normalized() rebuilds them. Tables never built are built here.
+    """
+    # Same spec the sku_demand queries use
+    from tools.uniform_entitlement_kpi import DEMAND_MAX_CYCLES, LAST_ISSUE_DATE
+    spec = ledger.spec(LAST_ISSUE_DATE, DEMAND_MAX_CYCLES)
+
+    with _lock, database.connect_writable() as conn:
+        conn.isolation_level = None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            stored = stored_fingerprint(conn)
+            normalized_current = stored is not None
+            ledger_current = (
+                normalized_current
+                and spec is not None
+                and stored_fingerprint(conn, "demand_ledger") == ledger_fingerprint(conn, spec)
+            )
+
+            conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS {CHANGED_TABLE} (iga_code TEXT PRIMARY KEY)")
+            conn.execute(f"DELETE FROM {CHANGED_TABLE}")
+            conn.executemany(
+                f"INSERT OR IGNORE INTO {CHANGED_TABLE} (iga_code) VALUES (?)",
+                [(change.get("iga_code"),) for change in changes if change.get("iga_code")]
+            )
+            changed = f"iga_code IN (SELECT iga_code FROM {CHANGED_TABLE})"
+            before = rows_digest(conn, EMPLOYEE_SOURCE, changed)
+
+            columns = source_columns(conn)
+            counts = dict.fromkeys(CHANGE_ACTIONS, 0)
+            touched = []
+            for change in changes:
+                touched.append(apply_to_source(conn, change, columns))
+                counts[change["action"]] += 1
+
+            if not normalized_current:
+                logger.info("Normalized tables were never built, building them with the change batch")
+                build_normalized(conn, source_fingerprint(conn))
+            else:
+                fingerprint = shift_fingerprint(stored, before, rows_digest(conn, EMPLOYEE_SOURCE, changed))
+                if ledger_current:
+                    conn.execute(f"""
+                        DELETE FROM {LEDGER_TABLE}
+                        WHERE employee_id IN (SELECT rowid FROM {EMPLOYEE_TABLE} WHERE {changed})
+                    """)
+                conn.execute(f"DELETE FROM {EMPLOYEE_TABLE} WHERE {changed}")
+                conn.execute(f"INSERT INTO {EMPLOYEE_TABLE} {EMPLOYEE_SELECT} WHERE s.{changed}")
+                record_fingerprint(conn, "normalized", fingerprint)
+
+                if ledger_current:
+                    conn.execute(LEDGER_INSERT_SQL.format(employees=f"e.{changed}"), ledger_params(spec))
+                    record_fingerprint(conn, "demand_ledger", ledger_fingerprint(conn, spec))
+
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    return {
+        "status": "success",
+        "applied": counts,
+        "employees": len(set(touched)),
+        "normalized": "incremental" if normalized_current else "rebuilt",
+        "demand_ledger": "incremental" if ledger_current else "deferred",
+        # Cube, columnar / coverage / demand stores and the KPI cache (see above)
+        "in_memory": "reload on next query",
+    }
+
+
+if __name__ == "__main__":
+    # Daily feed: python -m tools.change_feed changes.jsonl  (one change per line, "-" for stdin)
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) != 2:
+        raise SystemExit("usage: python -m tools.change_feed <changes.jsonl | ->")
+
+    stream = sys.stdin if sys.argv[1] == "-" else open(sys.argv[1], encoding="utf-8")
+    with stream:
+        batch = [json.loads(line) for line in stream if line.strip()]
+
+    logger.info(json.dumps(apply_employee_changes(batch)))
@@ -0,0 +1,435 @@
+import logging
+import string
+import threading
+
+try:
+    import numpy as np
+except ImportError:  # optional - employee_kpi falls back to SQL without it
+    np = None
+
+from database import db
+from tools.departments import canonicalize_department
+from tools.normalize import EMPLOYEE_TABLE, ELIGIBLE_DEPARTMENTS_TABLE
+
+logger = logging.getLogger(__name__)
+
+# SQLite's built-in LOWER() only folds ASCII
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+LOAD_SQL = f"""
+SELECT
+    e.iga_code,
+    e.function,
+    e.status,
+    e.gender_picklist_label,
+    e.baselocationtext,
+    e.dateofjoining,
+    e.dateofrelieving,
+    strftime('%Y-%m', e.dateofjoining) AS join_month,
+    e.function_key,
+    e.status_key,
+    e.gender_key,
+    e.location_key,
+    ed.normalized_department
+FROM {EMPLOYEE_TABLE} e
+LEFT JOIN {ELIGIBLE_DEPARTMENTS_TABLE} ed
+    ON e.function_key = ed.department_key
+"""
+
+FILTER_COLUMNS = (
+    ("department", "function_key"),
+    ("gender", "gender_key"),
+    ("location", "location_key"),
+    ("status", "status_key"),
+)
+
+GROUP_COLUMNS = {
+    "department": ("function", "department"),
+    "gender": ("gender_picklist_label", "gender"),
+    "location": ("baselocationtext", "location"),
+}
+
+
+class UnsupportedData(Exception):
+    """The snapshot holds values the engine does not model - use SQL"""
+
+
+def sqlite_sort_key(value):
+    """Orders values the way SQLite does: NULL, numbers, text, blobs"""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (3, value)
+
+
+class Categorical:
+    """Dictionary-encoded column; codes follow SQLite sort order"""
+
+    def __init__(self, values):
+        self.labels = sorted(set(values), key=sqlite_sort_key)
+        self.index = {label: code for code, label in enumerate(self.labels)}
+        self.codes = np.fromiter(
+            (self.index[v] for v in values), dtype=np.int64, count=len(values)
+        )
+        self.null_code = self.index.get(None, -1)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def equals(self, value):
+        code = self.index.get(value)
+        if code is None:
+            return np.zeros(len(self.codes), dtype=bool)
+        return self.codes == code
+
+
+class ColumnarEngine:
+    """
+    Employee sheet held as NumPy arrays.
+
+    rows() returns exactly the rows the matching employee_kpi SQL would
+    return, or None when a query is outside what the engine models.
+    """
+
+    def __init__(self, records, eligible_departments: int, total_departments: int):
+        text_columns = (
+            "function", "status", "gender_picklist_label", "baselocationtext",
+            "dateofjoining", "dateofrelieving", "join_month",
+            "function_key", "status_key", "gender_key", "location_key",
+            "normalized_department"
+        )
+        for row in records:
+            for name in text_columns:
+                if row[name] is not None and not isinstance(row[name], str):
+                    raise UnsupportedData(f"{name} holds {type(row[name]).__name__} values")
+
+        self.size = len(records)
+        self.eligible_departments = eligible_departments
+        self.total_departments = total_departments
+
+        self.columns = {
+            name: Categorical([row[name] for row in records])
+            for name in (
+                "function", "status", "gender_picklist_label",
+                "baselocationtext", "join_month",
+                "function_key", "status_key", "gender_key", "location_key"
+            )
+        }
+        self.load_counts(records)
+
+        joined = [row["dateofjoining"] for row in records]
+        relieved = [row["dateofrelieving"] for row in records]
+        self.joined_null = np.array([v is None for v in joined], dtype=bool)
+        self.relieved_null = np.array([v is None for v in relieved], dtype=bool)
+        self.joined = np.array([v or "" for v in joined], dtype=str)
+        self.relieved = np.array([v or "" for v in relieved], dtype=str)
+
+        self.eligible = np.array(
+            [row["normalized_department"] is not None for row in records], dtype=bool
+        )
+        self.active = self.columns["status_key"].equals("active")
+        self.inactive = self.columns["status_key"].equals("inactive")
+
+    def load_counts(self, records):
+        """Per-row weights - a row holding an iga_code counts once"""
+        iga = Categorical([row["iga_code"] for row in records])
+        self.iga = iga.codes
+        self.iga_null_code = iga.null_code
+        self.weights = (iga.codes != iga.null_code).astype(np.int64)
+        present = self.iga[self.weights > 0]
+        # COUNT(DISTINCT iga_code) is a plain count when codes never repeat
+        self.iga_unique = np.unique(present).size == present.size
+
+    def bounds(self, from_month, to_month):
+        """(lower, upper) the date columns are compared against, or None if unsupported"""
+        return f"{from_month}-01", f"{to_month}-31"
+
+    # -------------------------------
+    # PRIMITIVES
+    # -------------------------------
+    def mask(self, filters: dict, time_range):
+        """WHERE clause shared by every employee metric, or None if unsupported"""
+        mask = np.ones(self.size, dtype=bool)
+
+        if time_range:
+            from_month = time_range.get("from")
+            to_month = time_range.get("to")
+            if from_month and to_month:
+                bounds = self.bounds(from_month, to_month)
+                if bounds is None:
+                    return None
+                lower, upper = bounds
+                mask &= ~self.joined_null & (self.joined <= upper)
+                mask &= self.relieved_null | (self.relieved >= lower)
+
+        for key, column in FILTER_COLUMNS:
+            value = filters.get(key)
+            if not value:
+                continue
+            if not isinstance(value, str):
+                return None
+            if key == "department":
+                value = canonicalize_department(value)
+            mask &= self.columns[column].equals(value.translate(ASCII_LOWER))
+
+        return mask
+
+    def between_joined(self, time_range):
+        bounds = self.bounds(time_range["from"], time_range["to"])
+        if bounds is None:
+            return None
+        lower, upper = bounds
+        return ~self.joined_null & (self.joined >= lower) & (self.joined <= upper)
+
+    def count_distinct(self, mask) -> int:
+        if self.iga_unique:
+            return int(self.weights[mask].sum())
+        return int(np.unique(self.iga[mask & (self.weights > 0)]).size)
+
+    def group_distinct(self, mask, groups, n_groups, values=None, null_code=None):
+        """COUNT(DISTINCT values) per group; values default to iga_code"""
+        if values is None:
+            if self.iga_unique:
+                counts = np.bincount(groups[mask], weights=self.weights[mask], minlength=n_groups)
+                return counts.astype(np.int64)
+            values, null_code = self.iga, self.iga_null_code
+
+        rows = mask & (values != null_code)
+        width = int(values.max()) + 1 if values.size else 1
+        pairs = np.unique(groups[rows] * width + values[rows])
+        return np.bincount(pairs // width, minlength=n_groups)
+
+    def grouped(self, mask, column: str, aggregates):
+        """
+        GROUP BY column → list of (label, {name: count}) in SQLite group order.
+        aggregates: name → extra mask for COUNT(DISTINCT CASE ... iga_code), or
+        ("distinct", column) for COUNT(DISTINCT column).
+        """
+        groups = self.columns[column]
+        present = np.bincount(groups.codes[mask], minlength=len(groups)) > 0
+
+        counts = {}
+        for name, spec in aggregates.items():
+            if isinstance(spec, tuple):
+                other = self.columns[spec[1]]
+                counts[name] = self.group_distinct(
+                    mask, groups.codes, len(groups), other.codes, other.null_code
+                )
+            else:
+                extra = mask if spec is None else mask & spec
+                counts[name] = self.group_distinct(extra, groups.codes, len(groups))
+
+        return [
+            (groups.labels[code], {name: int(c[code]) for name, c in counts.items()})
+            for code in np.flatnonzero(present)
+        ]
+
+    # -------------------------------
+    # METRICS
+    # -------------------------------
+    def rows(self, metric: str, group_by: str, filters: dict, time_range):
+        if metric == "eligible_departments":
+            return [{"value": self.eligible_departments}]
+        if metric == "total_departments":
+            return [{"value": self.total_departments}]
+
+        mask = self.mask(filters, time_range)
+        if mask is None:
+            return None
+
+        if metric == "department_eligibility":
+            eligible = {label for label, _ in self.grouped(mask & self.eligible, "function", {})}
+            return [
+                {
+                    "department": label,
+                    "eligibility_status": (
+                        "Eligible"
+                        if label in eligible and counts["active_employees"] > 0
+                        else "Ineligible"
+                    ),
+                    "total_employees": counts["total_employees"],
+                    "active_employees": counts["active_employees"]
+                }
+                for label, counts in self.grouped(mask, "function", {
+                    "total_employees": None,
+                    "active_employees": self.active
+                })
+            ]
+
+        if metric == "eligible_employees":
+            mask = mask & self.eligible
+            if not filters.get("status") and group_by != "status":
+                mask &= self.active
+
+            if group_by in GROUP_COLUMNS:
+                column, alias = GROUP_COLUMNS[group_by]
+                return [
+                    {alias: label, "value": counts["value"]}
+                    for label, counts in self.grouped(mask, column, {"value": None})
+                ]
+            if group_by == "status":
+                return [
+                    {"label": label, "value": counts["value"]}
+                    for label, counts in self.grouped(mask, "status", {"value": None})
+                ]
+            return [{"value": self.count_distinct(mask)}]
+
+        if metric == "ineligible_employees":
+            return [{"value": self.count_distinct(mask & self.active & ~self.eligible)}]
+
+        if metric in ("eligibility_trend", "headcount_vs_eligibility"):
+            if not filters.get("status"):
+                mask = mask & self.active
+            if metric == "eligibility_trend":
+                mask = mask & self.eligible
+            if time_range:
+                if "from" not in time_range or "to" not in time_range:
+                    return None
+                between = self.between_joined(time_range)
+                if between is None:
+                    return None
+                mask = mask & between
+
+            if metric == "eligibility_trend":
+                return [
+                    {"month": label, "eligible_employees": counts["eligible_employees"]}
+                    for label, counts in self.grouped(mask, "join_month", {"eligible_employees": None})
+                ]
+            return [
+                {
+                    "month": label,
+                    "total_headcount": counts["total_headcount"],
+                    "eligible_headcount": counts["eligible_headcount"]
+                }
+                for label, counts in self.grouped(mask, "join_month", {
+                    "total_headcount": None,
+                    "eligible_headcount": self.eligible
+                })
+            ]
+
+        if metric == "department_summary":
+            return self.department_rows(mask, {
+                "total_employees": None,
+                "active_employees": self.active,
+                "inactive_employees": self.inactive
+            })
+
+        return self.standard_rows(metric, group_by, filters, mask)
+
+    def department_rows(self, mask, aggregates: dict):
+        """GROUP BY function with the given counts plus number_of_locations_present"""
+        aggregates = dict(aggregates, number_of_locations_present=("distinct", "baselocationtext"))
+        return [
+            {"department": label, **counts}
+            for label, counts in self.grouped(mask, "function", aggregates)
+        ]
+
+    def standard_rows(self, metric: str, group_by: str, filters: dict, mask):
+        """total / active / inactive / status and their group_by variants"""
+        if metric == "active" and not filters.get("status"):
+            mask = mask & self.active
+        elif metric == "inactive" and not filters.get("status"):
+            mask = mask & self.inactive
+
+        if group_by == "department":
+            if metric in ("active", "inactive"):
+                # Status is already part of the mask
+                return self.department_rows(mask, {f"{metric}_employees": None})
+            return self.department_rows(mask, {
+                "total_employees": None,
+                "active_employees": self.active,
+                "inactive_employees": self.inactive
+            })
+
+        if group_by in ("gender", "location"):
+            column, alias = GROUP_COLUMNS[group_by]
+            name = f"{metric}_employees" if metric in ("active", "inactive") else "value"
+            return [
+                {alias: label, name: counts[name]}
+                for label, counts in self.grouped(mask, column, {name: None})
+            ]
+
+        if metric == "status":
+            return [
+                {"label": label, "value": counts["value"]}
+                for label, counts in self.grouped(mask, "status", {"value": None})
+            ]
+
+        return [{"value": self.count_distinct(mask)}]
+
+
+class ColumnarStore:
+    """
+    Loads the engines lazily and reloads them whenever the database changes.
+    engines() lists them fastest first: the OLAP cube when the snapshot
+    allows it, then the row engine.
+    """
+
+    def __init__(self, database=db):
+        self.database = database
+        self.enabled = np is not None
+        self.use_cube = True
+        self._engines = {}
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def engines(self):
+        if not self.enabled:
+            return []
+
+        signature = (str(self.database.path), self.database.data_signature())
+        if signature != self._signature:
+            with self._lock:
+                if signature != self._signature:
+                    self._engines = self._load()
+                    self._signature = signature
+
+        order = ("cube", "rows") if self.use_cube else ("rows",)
+        return [self._engines[name] for name in order if self._engines.get(name) is not None]
+
+    def engine(self):
+        engines = self.engines()
+        return engines[0] if engines else None
+
+    def _load(self):
+        # Imported here: the cube module builds on ColumnarEngine
+        from tools.olap_cube import build_cube
+
+        engines = {}
+        try:
+            with self.database.connect() as conn:
+                duplicates = conn.execute(f"""
+                    SELECT COUNT(*) FROM (
+                        SELECT department_key FROM {ELIGIBLE_DEPARTMENTS_TABLE}
+                        WHERE department_key IS NOT NULL
+                        GROUP BY department_key HAVING COUNT(*) > 1
+                    )
+                """).fetchone()[0]
+                if duplicates:
+                    raise UnsupportedData("eligible department keys are not unique")
+
+                eligible_departments = conn.execute(
+                    f"SELECT COUNT(DISTINCT normalized_department) FROM {ELIGIBLE_DEPARTMENTS_TABLE}"
+                ).fetchone()[0]
+                total_departments = conn.execute(
+                    f"SELECT COUNT(DISTINCT function) FROM {EMPLOYEE_TABLE}"
+                ).fetchone()[0]
+
+                engines["rows"] = ColumnarEngine(
+                    conn.execute(LOAD_SQL).fetchall(), eligible_departments, total_departments
+                )
+
+                try:
+                    engines["cube"] = build_cube(conn, eligible_departments, total_departments)
+                except UnsupportedData as e:
+                    logger.info(f"OLAP cube disabled for this snapshot: {e}")
+        except UnsupportedData as e:
+            logger.info(f"Columnar engine disabled for this snapshot: {e}")
+
+        return engines
+
+
+columnar = ColumnarStore()
@@ -0,0 +1,79 @@
+import threading
+
+from database import db
+from tools.columnar import sqlite_sort_key
+from tools.normalize import ENTITLEMENT_TABLE
+from tools.sql_registry import sql_registry
+
+# -------------------------------
+# ENTITLEMENT COVERAGE MATRIX
+# One GROUP BY (item_name, department) pass, pivoted in Python into one
+# bitset per SKU (bit i = the SKU applies to departments[i]). The pivot is
+# rebuilt only when the database changes and costs O(entitlement pairs),
+# however many departments there are.
+#
+# Wire forms:
+#   dense  (default) {sku: {department: 0/1, ...}, ...}
+#   sparse           {"departments": [...], "skus": {sku: [department index, ...]}}
+# -------------------------------
+COVERAGE_SQL = f"""
+SELECT item_name, department
+FROM {ENTITLEMENT_TABLE}
+GROUP BY item_name, department
+"""
+
+
+class CoverageMatrix:
+    def __init__(self, rows):
+        pairs = [(row["item_name"], row["department"]) for row in rows]
+
+        # Same orderings as the old pivot: ORDER BY item_name, columns ORDER BY department
+        self.departments = sorted({dept for _, dept in pairs if dept is not None}, key=sqlite_sort_key)
+        self.skus = sorted({sku for sku, _ in pairs}, key=sqlite_sort_key)
+        bits = {dept: 1 << i for i, dept in enumerate(self.departments)}
+
+        masks = dict.fromkeys(self.skus, 0)
+        for sku, dept in pairs:
+            if dept is not None:
+                masks[sku] |= bits[dept]
+        self.masks = [masks[sku] for sku in self.skus]
+
+    def departments_of(self, mask: int) -> list:
+        return [i for i in range(len(self.departments)) if mask >> i & 1]
+
+    def dense(self) -> dict:
+        return {
+            sku: {dept: mask >> i & 1 for i, dept in enumerate(self.departments)}
+            for sku, mask in zip(self.skus, self.masks)
+        }
+
+    def sparse(self) -> dict:
+        return {
+            "departments": list(self.departments),
+            "skus": {sku: self.departments_of(mask) for sku, mask in zip(self.skus, self.masks)}
+        }
+
+
+class CoverageStore:
+    """Keeps the pivoted matrix of the current snapshot"""
+
+    def __init__(self, database=db):
+        self.database = database
+        self._matrix = None
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def matrix(self) -> CoverageMatrix:
+        signature = (str(self.database.path), self.database.data_signature())
+        if signature == self._signature:
+            return self._matrix
+
+        with self._lock:
+            if signature != self._signature:
+                sql = sql_registry.statement("uniform_entitlement_kpi", "entitlement_coverage_matrix", COVERAGE_SQL)
+                self._matrix = CoverageMatrix(self.database.execute_query(sql))
+                self._signature = signature
+            return self._matrix
+
+
+coverage = CoverageStore()
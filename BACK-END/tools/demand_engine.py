@@ -0,0 +1,290 @@
+import logging
+import re
+import threading
+from datetime import date, timedelta
+
+try:
+    import numpy as np
+except ImportError:  # optional - sku_demand falls back to SQL without it
+    np = None
+
+from database import db
+from tools.columnar import ASCII_LOWER, UnsupportedData, sqlite_sort_key
+from tools.departments import canonicalize_department
+from tools.normalize import EMPLOYEE_TABLE, ENTITLEMENT_TABLE
+
+logger = logging.getLogger(__name__)
+
+MONTH_PATTERN = re.compile(r"(\d{4})-(\d{2})")
+DAYS_IN_MONTH = (0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+# Active employees with the join date SQLite itself would start from
+EMPLOYEE_SQL = f"""
+SELECT
+    iga_code,
+    date(dateofjoining) AS join_date,
+    function_key,
+    gender_key,
+    gender_initial
+FROM {EMPLOYEE_TABLE}
+WHERE status_key = 'active'
+"""
+
+# Recurring entitlements; identical rows are folded into one group with copies
+ENTITLEMENT_SQL = f"""
+SELECT
+    department,
+    item_name,
+    frequency,
+    quantity,
+    base_location,
+    gender,
+    MIN(department_key) AS department_key,
+    MIN(item_key) AS item_key,
+    COUNT(*) AS copies
+FROM {ENTITLEMENT_TABLE}
+WHERE frequency > 0
+GROUP BY department, item_name, frequency, quantity, base_location, gender
+"""
+
+GENDER_LABELS = {"M": "Male", "F": "Female", "B": "Both/Common"}
+
+
+def month_index(text):
+    """'YYYY-MM' → months since year 0, or None"""
+    if not isinstance(text, str):
+        return None
+    match = MONTH_PATTERN.fullmatch(text)
+    if not match:
+        return None
+    year, month = int(match.group(1)), int(match.group(2))
+    if not 1 <= month <= 12:
+        return None
+    return year * 12 + month - 1
+
+
+def month_after(day_text: str):
+    """Month index of the day after a 'YYYY-MM-DD' month end, or None if it is not a month end"""
+    following = date.fromisoformat(day_text) + timedelta(days=1)
+    if following.day != 1:
+        return None
+    return following.year * 12 + following.month - 1
+
+
+def rolls_over(months, day):
+    """
+    True where 'day' does not exist in the month. SQLite's '+N months'
+    keeps the day and lets the surplus roll into the next month, so such an
+    issue lands one month later.
+    """
+    year = months // 12
+    month = months % 12 + 1
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    length = np.asarray(DAYS_IN_MONTH)[month] + ((month == 2) & leap)
+    return day > length
+
+
+def issues_between(start, day, frequency, low, high, max_cycles=None):
+    """
+    Issues n >= 0 (joining month start, issue month start + n * frequency)
+    whose effective month falls in [low, high]. Vectorized over pairs.
+    """
+    # First n at or after low - the one before may still roll over into low
+    first = np.maximum(-((start - low) // frequency), 0)
+    previous = start + (first - 1) * frequency
+    first -= (first > 0) & (previous == low - 1) & rolls_over(previous, day)
+
+    # Last n at or before high - drop it if it rolls over past high
+    last = (high - start) // frequency
+    edge = start + last * frequency
+    last -= (last >= 0) & (edge == high) & rolls_over(edge, day)
+
+    if max_cycles is not None:
+        last = np.minimum(last, max_cycles)
+    return np.maximum(last - first + 1, 0)
+
+
+def issues_in_months(start, day, frequency, months, max_cycles=None):
+    """Issues whose effective month is one of the given month indexes"""
+    total = np.zeros(len(start), dtype=np.int64)
+    for month in months:
+        for offset, rolled in ((0, False), (1, True)):
+            cycles = month - offset - start
+            landed = start + cycles
+            hit = (cycles >= 0) & (cycles % frequency == 0) & (rolls_over(landed, day) == rolled)
+            if max_cycles is not None:
+                hit &= cycles // frequency <= max_cycles
+            total += hit
+    return total
+
+
+class DemandEngine:
+    """
+    Employee x SKU issuance pairs for the current snapshot.
+
+    The pairs are the sku_demand join (department, gender rule) computed
+    once; a query masks them by its filters and counts issues in closed form.
+    """
+
+    def __init__(self, employees, entitlements):
+        for row in entitlements:
+            if not isinstance(row["frequency"], int) or not isinstance(row["quantity"], int):
+                raise UnsupportedData("entitlement frequency/quantity is not an integer")
+
+        valid = [row for row in employees if row["join_date"] is not None]
+        self.iga_labels = {}
+        iga = [self.iga_labels.setdefault(row["iga_code"], len(self.iga_labels)) for row in valid]
+        self.iga = np.array(iga, dtype=np.int64)
+        self.iga_present = np.array([row["iga_code"] is not None for row in valid], dtype=bool)
+        present = self.iga[self.iga_present]
+        self.iga_unique = np.unique(present).size == present.size
+
+        joined = [date.fromisoformat(row["join_date"]) for row in valid]
+        self.start = np.array([d.year * 12 + d.month - 1 for d in joined], dtype=np.int64)
+        self.day = np.array([d.day for d in joined], dtype=np.int64)
+        self.function_key = np.array([row["function_key"] for row in valid], dtype=object)
+        self.gender_key = np.array([row["gender_key"] for row in valid], dtype=object)
+        gender_initial = np.array([row["gender_initial"] for row in valid], dtype=object)
+
+        # Groups in GROUP BY order, as SQLite emits them before ORDER BY
+        self.groups = sorted(
+            (dict(row) for row in entitlements),
+            key=lambda g: tuple(
+                sqlite_sort_key(g[name])
+                for name in ("department", "item_name", "frequency", "quantity", "base_location", "gender")
+            )
+        )
+        self.item_key = np.array([g["item_key"] for g in self.groups], dtype=object)
+
+        by_department = {}
+        for index, key in enumerate(self.function_key):
+            by_department.setdefault(key, []).append(index)
+
+        pair_employee, pair_group = [], []
+        for group_index, group in enumerate(self.groups):
+            # NULL never joins in SQL
+            if group["department_key"] is None or group["gender"] is None:
+                continue
+            members = np.array(by_department.get(group["department_key"], []), dtype=np.int64)
+            if group["gender"] != "B":
+                members = members[gender_initial[members] == group["gender"]]
+            pair_employee.append(members)
+            pair_group.append(np.full(len(members), group_index, dtype=np.int64))
+
+        self.pair_employee = np.concatenate(pair_employee) if pair_employee else np.zeros(0, dtype=np.int64)
+        self.pair_group = np.concatenate(pair_group) if pair_group else np.zeros(0, dtype=np.int64)
+        self.pair_frequency = np.array([g["frequency"] for g in self.groups], dtype=np.int64)[self.pair_group]
+        self.pair_start = self.start[self.pair_employee]
+        self.pair_day = self.day[self.pair_employee]
+
+    def sku_demand(self, filters: dict, time_range: dict, months, last_issue_date: str, max_cycles=None):
+        """Rows of the sku_demand query, or None when the engine cannot answer it"""
+        employee_mask = np.ones(len(self.start), dtype=bool)
+        for key, column in (("department", self.function_key), ("gender", self.gender_key)):
+            value = filters.get(key)
+            if not value:
+                continue
+            if not isinstance(value, str):
+                return None
+            if key == "department":
+                value = canonicalize_department(value)
+            employee_mask &= column == value.translate(ASCII_LOWER)
+
+        group_mask = np.ones(len(self.groups), dtype=bool)
+        sku = filters.get("sku")
+        if sku:
+            if not isinstance(sku, str):
+                return None
+            group_mask &= self.item_key == sku.translate(ASCII_LOWER)
+
+        pairs = employee_mask[self.pair_employee] & group_mask[self.pair_group]
+        start = self.pair_start[pairs]
+        day = self.pair_day[pairs]
+        frequency = self.pair_frequency[pairs]
+
+        if months:
+            # Only 'YYYY-MM' strings can equal strftime('%Y-%m', ...)
+            targets = {month_index(m) for m in months} - {None}
+            counts = issues_in_months(start, day, frequency, sorted(targets), max_cycles)
+        else:
+            low, high = month_index(time_range.get("from")), month_index(time_range.get("to"))
+            after_last_issue = month_after(last_issue_date)
+            if low is None or high is None or after_last_issue is None:
+                return None
+            counts = issues_between(start, day, frequency, max(low, after_last_issue), high, max_cycles)
+
+        return self.rows(self.pair_group[pairs], self.pair_employee[pairs], counts)
+
+    def rows(self, groups, employees, counts):
+        issued = counts > 0
+        groups, employees, counts = groups[issued], employees[issued], counts[issued]
+
+        n_groups = len(self.groups)
+        occurrences = np.bincount(groups, weights=counts, minlength=n_groups).astype(np.int64)
+        present = np.bincount(groups, minlength=n_groups) > 0
+
+        counted = self.iga_present[employees]
+        if self.iga_unique:
+            unique = np.bincount(groups[counted], minlength=n_groups)
+        else:
+            width = len(self.iga_labels) or 1
+            keys = np.unique(groups[counted] * width + self.iga[employees[counted]])
+            unique = np.bincount(keys // width, minlength=n_groups)
+
+        result = []
+        for index in np.flatnonzero(present):
+            group = self.groups[index]
+            total = int(occurrences[index]) * group["copies"]
+            result.append({
+                "department": group["department"],
+                "item_name": group["item_name"],
+                "frequency": group["frequency"],
+                "sku_gender": GENDER_LABELS.get(group["gender"], group["gender"]),
+                "base_location": group["base_location"],
+                "quantity_per_issue": group["quantity"],
+                "unique_employees": int(unique[index]),
+                "total_occurrences": total,
+                "total_quantity_needed": total * group["quantity"]
+            })
+
+        # ORDER BY total_quantity_needed DESC; ties keep GROUP BY order
+        result.sort(key=lambda row: -row["total_quantity_needed"])
+        return result
+
+
+class DemandStore:
+    """Builds the DemandEngine lazily and rebuilds it whenever the database changes"""
+
+    def __init__(self, database=db):
+        self.database = database
+        self.enabled = np is not None
+        self._engine = None
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def engine(self):
+        if not self.enabled:
+            return None
+
+        signature = (str(self.database.path), self.database.data_signature())
+        if signature == self._signature:
+            return self._engine
+
+        with self._lock:
+            if signature != self._signature:
+                self._engine = self._load()
+                self._signature = signature
+            return self._engine
+
+    def _load(self):
+        try:
+            with self.database.connect() as conn:
+                employees = conn.execute(EMPLOYEE_SQL).fetchall()
+                entitlements = conn.execute(ENTITLEMENT_SQL).fetchall()
+            return DemandEngine(employees, entitlements)
+        except (UnsupportedData, ValueError) as e:
+            logger.info(f"Demand engine disabled for this snapshot: {e}")
+            return None
+
+
+demand = DemandStore()
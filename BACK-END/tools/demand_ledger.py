@@ -0,0 +1,381 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+
+from database import db
+from tools.demand_engine import month_after, month_index
+from tools.departments import canonicalize_department
+from tools.normalize import EMPLOYEE_TABLE, ENTITLEMENT_TABLE, record_fingerprint, stored_fingerprint
+from tools.sql_registry import sql_registry
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------
+# LEDGER TABLES
+# demand_groups:  one row per recurring entitlement (the sku_demand GROUP BY),
+#                 group_id in GROUP BY order.
+# demand_ledger:  issues per (group, employee, effective month) for the
+#                 horizon. Kept at employee grain so unique_employees over a
+#                 multi-month window stays a COUNT(DISTINCT), not a sum.
+# demand_monthly: the monthly time series (quantity / employees per SKU row).
+# -------------------------------
+GROUPS_TABLE = "demand_groups"
+LEDGER_TABLE = "demand_ledger"
+MONTHLY_VIEW = "demand_monthly"
+
+# Months materialized after LAST_ISSUE_DATE
+LEDGER_HORIZON_MONTHS = 36
+
+# Same issue dates as the sku_demand SQL, but each pair only walks the
+# cycles that can land inside the horizon. {employees} limits the employees
+# (the change feed re-issues only the ones it touched).
+LEDGER_INSERT_SQL = f"""
+INSERT INTO {LEDGER_TABLE} (group_id, month, employee_id, iga_code, gender_key, issues)
+WITH RECURSIVE pairs AS (
+    SELECT
+        g.group_id,
+        g.frequency,
+        e.rowid AS employee_id,
+        e.iga_code,
+        e.gender_key,
+        e.dateofjoining,
+        CAST(strftime('%Y', e.dateofjoining) AS INTEGER) * 12
+            + CAST(strftime('%m', e.dateofjoining) AS INTEGER) - 1 AS join_month
+    FROM {EMPLOYEE_TABLE} e
+    JOIN {GROUPS_TABLE} g
+        ON e.function_key = g.department_key
+    WHERE e.status_key = 'active'
+      AND (g.gender = 'B' OR e.gender_initial = g.gender)
+      AND date(e.dateofjoining) IS NOT NULL
+      AND {{employees}}
+),
+cycles(group_id, frequency, employee_id, iga_code, gender_key, dateofjoining, join_month, n) AS (
+    -- Start one month early: an issue there may roll over into the horizon
+    SELECT
+        group_id, frequency, employee_id, iga_code, gender_key, dateofjoining, join_month,
+        MAX(0, (:first_month_index - 1 - join_month) / frequency)
+    FROM pairs
+    UNION ALL
+    SELECT
+        group_id, frequency, employee_id, iga_code, gender_key, dateofjoining, join_month, n + 1
+    FROM cycles
+    WHERE join_month + (n + 1) * frequency <= :last_month_index
+      AND (:max_cycles IS NULL OR n + 1 <= :max_cycles)
+)
+SELECT
+    group_id,
+    strftime('%Y-%m', date(dateofjoining, '+' || (n * frequency) || ' months')) AS month,
+    employee_id,
+    iga_code,
+    gender_key,
+    COUNT(*)
+FROM cycles
+WHERE (:max_cycles IS NULL OR n <= :max_cycles)
+  AND month BETWEEN :first_month AND :last_month
+GROUP BY group_id, employee_id, month
+"""
+
+BUILD_STATEMENTS = [
+    f"DROP VIEW IF EXISTS {MONTHLY_VIEW}",
+    f"DROP TABLE IF EXISTS {LEDGER_TABLE}",
+    f"DROP TABLE IF EXISTS {GROUPS_TABLE}",
+    f"""
+    CREATE TABLE {GROUPS_TABLE} (
+        group_id INTEGER PRIMARY KEY,
+        department TEXT,
+        item_name TEXT,
+        frequency INTEGER,
+        quantity,
+        base_location TEXT,
+        gender TEXT,
+        department_key TEXT,
+        item_key TEXT,
+        copies INTEGER
+    )
+    """,
+    f"""
+    INSERT INTO {GROUPS_TABLE}
+        (department, item_name, frequency, quantity, base_location, gender, department_key, item_key, copies)
+    SELECT
+        department,
+        item_name,
+        frequency,
+        quantity,
+        base_location,
+        gender,
+        MIN(department_key),
+        MIN(item_key),
+        COUNT(*)
+    FROM {ENTITLEMENT_TABLE}
+    WHERE frequency > 0
+    GROUP BY department, item_name, frequency, quantity, base_location, gender
+    ORDER BY department, item_name, frequency, quantity, base_location, gender
+    """,
+    f"""
+    CREATE TABLE {LEDGER_TABLE} (
+        group_id INTEGER NOT NULL,
+        month TEXT NOT NULL,
+        employee_id INTEGER NOT NULL,
+        iga_code,
+        gender_key TEXT,
+        issues INTEGER NOT NULL
+    )
+    """,
+    LEDGER_INSERT_SQL.format(employees="1=1"),
+    # Covering: window queries never touch the table rows
+    f"CREATE INDEX idx_{LEDGER_TABLE}_month ON {LEDGER_TABLE} (month, group_id, gender_key, iga_code, issues)",
+    f"CREATE INDEX idx_{LEDGER_TABLE}_employee ON {LEDGER_TABLE} (employee_id)",
+    f"""
+    CREATE VIEW {MONTHLY_VIEW} AS
+    SELECT
+        g.department,
+        g.item_name,
+        g.gender,
+        g.base_location,
+        l.month,
+        SUM(l.issues) * g.copies * g.quantity AS quantity,
+        COUNT(DISTINCT l.iga_code) AS unique_employees
+    FROM {LEDGER_TABLE} l
+    JOIN {GROUPS_TABLE} g ON g.group_id = l.group_id
+    GROUP BY l.group_id, l.month
+    """,
+]
+
+# sku_demand rows straight from the ledger
+DEMAND_SQL = f"""
+SELECT
+    g.department,
+    g.item_name,
+    g.frequency,
+    CASE
+        WHEN g.gender = 'M' THEN 'Male'
+        WHEN g.gender = 'F' THEN 'Female'
+        WHEN g.gender = 'B' THEN 'Both/Common'
+        ELSE g.gender
+    END AS sku_gender,
+    g.base_location,
+    g.quantity AS quantity_per_issue,
+    COUNT(DISTINCT l.iga_code) AS unique_employees,
+    SUM(l.issues) * g.copies AS total_occurrences,
+    SUM(l.issues) * g.copies * g.quantity AS total_quantity_needed
+FROM {LEDGER_TABLE} l
+JOIN {GROUPS_TABLE} g ON g.group_id = l.group_id
+WHERE {{conditions}}
+GROUP BY l.group_id
+ORDER BY total_quantity_needed DESC, l.group_id
+"""
+
+
+def month_label(index: int) -> str:
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def ledger_fingerprint(conn, spec):
+    """The ledger is stale when the normalized tables or the horizon / cycle cap change"""
+    normalized = stored_fingerprint(conn)
+    if normalized is None:
+        return None
+    return hashlib.sha1(repr((normalized, spec)).encode("utf-8")).hexdigest()
+
+
+def current(conn, spec) -> bool:
+    """The stored ledger was built for the current normalized tables and spec"""
+    fingerprint = ledger_fingerprint(conn, spec)
+    return fingerprint is not None and stored_fingerprint(conn, "demand_ledger") == fingerprint
+
+
+def supported(conn) -> bool:
+    """The month arithmetic needs whole-month frequencies"""
+    odd = conn.execute(f"""
+        SELECT COUNT(*) FROM {ENTITLEMENT_TABLE}
+        WHERE frequency > 0 AND typeof(frequency) != 'integer'
+    """).fetchone()[0]
+    return odd == 0
+
+
+def ledger_params(spec) -> dict:
+    first, last, max_cycles = spec
+    return {
+        "first_month_index": first,
+        "last_month_index": last,
+        "first_month": month_label(first),
+        "last_month": month_label(last),
+        "max_cycles": max_cycles,
+    }
+
+
+def build(conn, spec, fingerprint: str):
+    """Rebuilds the ledger tables inside the caller's transaction"""
+    params = ledger_params(spec)
+    for statement in BUILD_STATEMENTS:
+        conn.execute(statement, params)
+    record_fingerprint(conn, "demand_ledger", fingerprint)
+
+
+class DemandLedger:
+    """
+    Materialized sku_demand schedule for LEDGER_HORIZON_MONTHS after the
+    last issue date.
+
+    Like NormalizedTables, it is (re)built at startup / ingest (refresh)
+    and the request path only compares fingerprints (ensure): a stale or
+    missing ledger answers None, and so do queries reaching outside the
+    horizon, so the caller falls back to computing demand on the fly.
+    """
+
+    def __init__(self, database=db, horizon_months: int = LEDGER_HORIZON_MONTHS):
+        self.database = database
+        self.horizon_months = horizon_months
+        self.enabled = True
+        self.rebuilds = 0
+        self._checked = None  # (signature, spec) → ledger current
+        self._lock = threading.Lock()
+
+    def spec(self, last_issue_date: str, max_cycles=None):
+        """(first month index, last month index, cycle cap), or None without a month-end last issue date"""
+        first = month_after(last_issue_date)
+        if first is None:
+            return None
+        return first, first + self.horizon_months - 1, max_cycles
+
+    def ensure(self, spec) -> bool:
+        """Request path: True when the stored ledger is current for spec - never builds it"""
+        if not self.enabled or spec is None:
+            return False
+
+        key = (self._current(), spec)
+        checked = self._checked
+        if checked is None or checked[0] != key:
+            with self.database.connect() as conn:
+                checked = (key, current(conn, spec))
+            self._checked = checked
+        return checked[1]
+
+    def refresh(self, spec) -> bool:
+        """Startup / ingest: rebuilds the ledger when it is stale; False when it cannot be built"""
+        if spec is None:
+            return False
+        with self._lock:
+            ready = self._refresh(spec)
+            self._checked = None
+            return ready
+
+    def rebuild(self, spec):
+        """Unconditional rebuild, for the ingest step"""
+        with self._lock:
+            with self.database.connect_writable() as conn:
+                conn.isolation_level = None
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    if not supported(conn):
+                        raise ValueError("entitlement frequency is not an integer")
+                    build(conn, spec, ledger_fingerprint(conn, spec))
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+            self.rebuilds += 1
+            self._checked = None
+
+    def sku_demand(self, filters: dict, time_range: dict, months, last_issue_date: str, max_cycles=None, stream=False):
+        """Rows of the sku_demand query (a generator when streaming), or None when the ledger cannot answer it"""
+        spec = self.spec(last_issue_date, max_cycles)
+        if not self.ensure(spec):
+            return None
+        first, last, _ = spec
+
+        conditions = []
+        params = {}
+        if months:
+            # Only 'YYYY-MM' strings can equal strftime('%Y-%m', ...)
+            targets = sorted({month_index(m) for m in months} - {None})
+            if not targets:
+                return []
+            if targets[0] < first or targets[-1] > last:
+                return None
+            conditions.append("l.month IN (SELECT value FROM json_each(:months))")
+            params["months"] = json.dumps([month_label(target) for target in targets])
+        else:
+            low, high = month_index(time_range.get("from")), month_index(time_range.get("to"))
+            if low is None or high is None or high > last:
+                return None
+            conditions.append("l.month BETWEEN :low AND :high")
+            params["low"] = month_label(max(low, first))
+            params["high"] = month_label(high)
+
+        for key, condition in (
+            ("department", "g.department_key = LOWER(:department)"),
+            ("gender", "l.gender_key = LOWER(:gender)"),
+            ("sku", "g.item_key = LOWER(:sku)"),
+        ):
+            value = filters.get(key)
+            if not value:
+                continue
+            if not isinstance(value, str):
+                return None
+            if key == "department":
+                value = canonicalize_department(value)
+            conditions.append(condition)
+            params[key] = value
+
+        sql = DEMAND_SQL.format(conditions=" AND ".join(conditions))
+        sql = sql_registry.statement("demand_ledger", "sku_demand", sql)
+        query = self.database.iter_query if stream else self.database.execute_query
+        return query(sql, params)
+
+    def _current(self):
+        return (str(self.database.path), self.database.data_signature())
+
+    def _refresh(self, spec) -> bool:
+        with self.database.connect() as conn:
+            if not supported(conn):
+                logger.info("Demand ledger disabled: entitlement frequency is not an integer")
+                return False
+            if ledger_fingerprint(conn, spec) is None:
+                return False
+            if current(conn, spec):
+                return True
+
+        try:
+            with self.database.connect_writable() as conn:
+                conn.isolation_level = None
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    fingerprint = ledger_fingerprint(conn, spec)
+                    if stored_fingerprint(conn, "demand_ledger") != fingerprint:
+                        logger.info(f"Rebuilding demand ledger for {month_label(spec[0])}..{month_label(spec[1])}")
+                        build(conn, spec, fingerprint)
+                        self.rebuilds += 1
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error:
+            # Read-only deployments without a current ledger compute demand on the fly
+            logger.exception("Could not refresh the demand ledger")
+            return False
+        return True
+
+
+demand_ledger = DemandLedger()
+
+
+def refresh_demand_ledger():
+    """Startup / ingest, after the normalized tables: rebuild the ledger for the sku_demand spec if stale"""
+    # Same spec the sku_demand queries use
+    from tools.uniform_entitlement_kpi import DEMAND_MAX_CYCLES, LAST_ISSUE_DATE
+    return demand_ledger.refresh(demand_ledger.spec(LAST_ISSUE_DATE, DEMAND_MAX_CYCLES))
+
+
+if __name__ == "__main__":
+    # Ingest step, after tools.normalize: python -m tools.demand_ledger
+    from tools.uniform_entitlement_kpi import DEMAND_MAX_CYCLES, LAST_ISSUE_DATE
+
+    logging.basicConfig(level=logging.INFO)
+    spec = demand_ledger.spec(LAST_ISSUE_DATE, DEMAND_MAX_CYCLES)
+    if spec is None:
+        raise SystemExit(f"LAST_ISSUE_DATE {LAST_ISSUE_DATE} is not a month end")
+    demand_ledger.rebuild(spec)
+    logger.info(f"Demand ledger rebuilt for {month_label(spec[0])}..{month_label(spec[1])}")
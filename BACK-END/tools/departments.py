@@ -0,0 +1,74 @@
+import re
+
+# =========================================================
+# ENTITLEMENT DEPARTMENTS
+# How the entitlement sheet's department codes map to the department
+# names used in the employee sheet. Matched on UPPER(department) exactly
+# (no trimming); anything else is kept as TRIM(department). This is the
+# original CASE expression - change it only together with the data.
+# =========================================================
+ENTITLEMENT_DEPARTMENTS = {
+    "AOCS": "Airport Operations & Customer Services",
+    "INFLIGHTS": "Inflight Services",
+    "INFLIGHT": "Inflight Services",
+    "ENGINEERING": "Engineering",
+    "CARGO": "Cargo",
+}
+
+# =========================================================
+# DEPARTMENT ALIASES
+# How users phrase departments in questions and filters ("cabin crew",
+# "pilots", "AOCS"). Only used on the query side - never when building
+# the entitlement tables. Keys are lower-case, whitespace collapsed.
+# =========================================================
+DEPARTMENT_ALIASES = {
+    "aocs": "Airport Operations & Customer Services",
+    "airport ops": "Airport Operations & Customer Services",
+    "airport operations": "Airport Operations & Customer Services",
+    "airport operations & customer services": "Airport Operations & Customer Services",
+    "inflight": "Inflight Services",
+    "inflights": "Inflight Services",
+    "ifs": "Inflight Services",
+    "cabin crew": "Inflight Services",
+    "inflight services": "Inflight Services",
+    "engineering": "Engineering",
+    "tech": "Engineering",
+    "flight ops": "Flight Operations",
+    "pilots": "Flight Operations",
+    "flight operations": "Flight Operations",
+    "flight safety": "Flight Safety",
+    "occ": "Operation Control Center",
+    "operation control center": "Operation Control Center",
+    "cargo": "Cargo",
+}
+
+ALIAS_TABLE = "department_alias"
+
+
+def alias_key(name: str) -> str:
+    return re.sub(r"\s+", " ", name or "").strip().lower()
+
+
+def canonical_department(name: str):
+    """Canonical department for a known alias, otherwise None"""
+    return DEPARTMENT_ALIASES.get(alias_key(name))
+
+
+def canonicalize_department(name: str) -> str:
+    """Canonical department for a known alias, otherwise the name unchanged"""
+    return canonical_department(name) or name
+
+
+def write_alias_table(conn):
+    """(Re)creates the department_alias lookup table from ENTITLEMENT_DEPARTMENTS"""
+    conn.execute(f"DROP TABLE IF EXISTS {ALIAS_TABLE}")
+    conn.execute(f"""
+        CREATE TABLE {ALIAS_TABLE} (
+            alias_key TEXT PRIMARY KEY,
+            department TEXT NOT NULL
+        )
+    """)
+    conn.executemany(
+        f"INSERT INTO {ALIAS_TABLE} (alias_key, department) VALUES (?, ?)",
+        sorted(ENTITLEMENT_DEPARTMENTS.items())
+    )
@@ -1,38 +1,51 @@
-from database import db
+from tools.columnar import columnar
+from tools.departments import canonicalize_department
+from tools.kpi_cache import cached_kpi
+from tools.normalize import (
+    EMPLOYEE_TABLE,
+    ELIGIBLE_DEPARTMENTS_TABLE,
+    ensure_normalized
+)
+from tools.pagination import PAGE_PARAMS
+from tools.sql_registry import sql_registry
 
-# -------------------------------
-# TABLES
-# -------------------------------
-EMPLOYEE_TABLE = "active_and_inactive_employees_details_as_on_01_09_2025_sheet1"
-ENTITLEMENT_TABLE = "entitlement_detail_entitlement"
+SUPPORTED_METRICS = (
+    "total",
+    "active",
+    "inactive",
+    "status",
+    "eligible_employees",
+    "ineligible_employees",
+    "eligible_departments",
+    "total_departments",
+    "department_eligibility",
+    "eligibility_by_gender",
+    "eligibility_trend",
+    "headcount_vs_eligibility",
+    "department_summary",
+)
+SUPPORTED_GROUP_BY = ("none", "department", "gender", "location", "status")
 
 
-# -------------------------------
-# HELPER: NORMALIZED ELIGIBLE DEPARTMENTS
-# -------------------------------
-ELIGIBLE_DEPARTMENTS_CTE = f"""
-WITH entitlement_departments AS (
-    SELECT DISTINCT
-        CASE
-            WHEN UPPER(department) = 'AOCS'
-                THEN 'Airport Operations & Customer Services'
-            WHEN UPPER(department) IN ('INFLIGHTS', 'INFLIGHT')
-                THEN 'Inflight Services'
-            WHEN UPPER(department) = 'ENGINEERING'
-                THEN 'Engineering'
-            WHEN UPPER(department) = 'CARGO'
-                THEN 'Cargo'
-            ELSE TRIM(department)
-        END AS normalized_department
-    FROM {ENTITLEMENT_TABLE}
-)
-"""
+def fetch_rows(sql, sql_params, metric, group_by, filters, time_range):
+    """Rows from the OLAP cube / columnar engine when one can answer the query, SQL otherwise"""
+    # Registered before the engines so every shape is known, answered in memory or not
+    sql_registry.register("employee_kpi", metric, sql)
+    for engine in columnar.engines():
+        rows = engine.rows(metric, group_by, filters, time_range)
+        if rows is not None:
+            return rows
+
+    return sql_registry.execute("employee_kpi", metric, sql, sql_params)
 
 
 # =================================================
 # MAIN KPI FUNCTION
 # =================================================
+@cached_kpi("employee_kpi")
 def employee_kpi_mcp(params):
+    ensure_normalized()
+
     metric = params.get("metric", "total").strip().lower()
     group_by = params.get("group_by", "none")
     filters = params.get("filters", {})
@@ -63,19 +76,19 @@ def employee_kpi_mcp(params):
     # 🎯 FILTERS
     # -------------------------------------------------
     if filters.get("department"):
-        where.append("LOWER(function) = LOWER(:department)")
-        sql_params["department"] = filters["department"]
+        where.append("function_key = LOWER(:department)")
+        sql_params["department"] = canonicalize_department(filters["department"])
 
     if filters.get("gender"):
-        where.append("LOWER(gender_picklist_label) = LOWER(:gender)")
+        where.append("gender_key = LOWER(:gender)")
         sql_params["gender"] = filters["gender"]
 
     if filters.get("location"):
-        where.append("LOWER(baselocationtext) = LOWER(:location)")
+        where.append("location_key = LOWER(:location)")
         sql_params["location"] = filters["location"]
 
     if filters.get("status"):
-        where.append("LOWER(status) = LOWER(:status)")
+        where.append("status_key = LOWER(:status)")
         sql_params["status"] = filters["status"]
 
     # =================================================
@@ -83,14 +96,13 @@ def employee_kpi_mcp(params):
     # =================================================
     if metric == "department_eligibility":
         sql = f"""
-        {ELIGIBLE_DEPARTMENTS_CTE}
         SELECT
             e.function AS department,
             CASE
                 WHEN ed.normalized_department IS NOT NULL
                  AND COUNT(
                      DISTINCT CASE
-                         WHEN LOWER(e.status) = 'active'
+                         WHEN e.status_key = 'active'
                          THEN e.iga_code
                      END
                  ) > 0
@@ -100,13 +112,13 @@ def employee_kpi_mcp(params):
             COUNT(DISTINCT e.iga_code) AS total_employees,
             COUNT(
                 DISTINCT CASE
-                    WHEN LOWER(e.status) = 'active'
+                    WHEN e.status_key = 'active'
                     THEN e.iga_code
                 END
             ) AS active_employees
         FROM {EMPLOYEE_TABLE} e
-        LEFT JOIN entitlement_departments ed
-            ON LOWER(e.function) = LOWER(ed.normalized_department)
+        LEFT JOIN {ELIGIBLE_DEPARTMENTS_TABLE} ed
+            ON e.function_key = ed.department_key
         WHERE {' AND '.join(where)}
         GROUP BY e.function, ed.normalized_department
         ORDER BY e.function
@@ -114,7 +126,7 @@ def employee_kpi_mcp(params):
         return {
             "success": True,
             "metric": metric,
-            "data": db.execute_query(sql, sql_params)
+            "data": fetch_rows(sql, sql_params, metric, group_by, filters, time_range)
         }
     elif metric == "eligible_employees":
         select = "COUNT(DISTINCT e.iga_code) AS value"
@@ -138,18 +150,17 @@ def employee_kpi_mcp(params):
             
         # Default to active only if no explicit status filter AND not grouping by status
         if not filters.get("status") and group_by != "status":
-            local_where.append("LOWER(e.status) = 'active'")
+            local_where.append("e.status_key = 'active'")
 
         sql = f"""
-        {ELIGIBLE_DEPARTMENTS_CTE}
         SELECT {select}
         FROM {EMPLOYEE_TABLE} e
-        JOIN entitlement_departments ed
-            ON LOWER(e.function) = LOWER(ed.normalized_department)
+        JOIN {ELIGIBLE_DEPARTMENTS_TABLE} ed
+            ON e.function_key = ed.department_key
         WHERE {' AND '.join(local_where)}
         {group}
         """
-        data = db.execute_query(sql, sql_params)
+        data = fetch_rows(sql, sql_params, metric, group_by, filters, time_range)
         
         final_metric = metric
         final_group_by = group_by
@@ -183,30 +194,28 @@ def employee_kpi_mcp(params):
         }
     elif metric == "ineligible_employees":
         sql = f"""
-        {ELIGIBLE_DEPARTMENTS_CTE}
         SELECT COUNT(DISTINCT e.iga_code) AS value
         FROM {EMPLOYEE_TABLE} e
-        LEFT JOIN entitlement_departments ed
-            ON LOWER(e.function) = LOWER(ed.normalized_department)
-        WHERE LOWER(e.status) = 'active'
+        LEFT JOIN {ELIGIBLE_DEPARTMENTS_TABLE} ed
+            ON e.function_key = ed.department_key
+        WHERE e.status_key = 'active'
           AND ed.normalized_department IS NULL
           AND {' AND '.join(where)}
         """
         return {
             "success": True,
             "metric": metric,
-            "data": db.execute_query(sql, sql_params)
+            "data": fetch_rows(sql, sql_params, metric, group_by, filters, time_range)
         }
     elif metric == "eligible_departments":
         sql = f"""
-        {ELIGIBLE_DEPARTMENTS_CTE}
         SELECT COUNT(DISTINCT normalized_department) AS value
-        FROM entitlement_departments
+        FROM {ELIGIBLE_DEPARTMENTS_TABLE}
         """
         return {
             "success": True,
             "metric": metric,
-            "data": db.execute_query(sql, {})
+            "data": fetch_rows(sql, {}, metric, group_by, filters, time_range)
         }
     elif metric == "total_departments":
         sql = f"""
@@ -216,18 +225,19 @@ def employee_kpi_mcp(params):
         return {
             "success": True,
             "metric": metric,
-            "data": db.execute_query(sql, {})
+            "data": fetch_rows(sql, {}, metric, group_by, filters, time_range)
         }
     elif metric == "eligibility_by_gender":
-        # Redirect to unified grouping logic
-        params["metric"] = "eligible_employees"
-        params["group_by"] = "gender"
-        return employee_kpi_mcp(params)
+        # Redirect to unified grouping logic - on a copy without page params, so
+        # the inner call caches (and returns) the full result for the outer page_of
+        redirected = {key: value for key, value in params.items() if key not in PAGE_PARAMS}
+        redirected.update(metric="eligible_employees", group_by="gender")
+        return employee_kpi_mcp(redirected)
     elif metric == "eligibility_trend":
         trend_where = list(where)
         # Default to active if no status filter provided
         if not filters.get("status"):
-            trend_where.append("LOWER(e.status) = 'active'")
+            trend_where.append("e.status_key = 'active'")
         
         trend_where.append("ed.normalized_department IS NOT NULL")
 
@@ -239,13 +249,12 @@ def employee_kpi_mcp(params):
             sql_params["end_date"] = f"{time_range['to']}-31"
 
         sql = f"""
-        {ELIGIBLE_DEPARTMENTS_CTE}
         SELECT
             strftime('%Y-%m', e.dateofjoining) AS month,
             COUNT(DISTINCT e.iga_code) AS eligible_employees
         FROM {EMPLOYEE_TABLE} e
-        JOIN entitlement_departments ed
-            ON LOWER(e.function) = LOWER(ed.normalized_department)
+        JOIN {ELIGIBLE_DEPARTMENTS_TABLE} ed
+            ON e.function_key = ed.department_key
         WHERE {' AND '.join(trend_where)}
         GROUP BY month
         ORDER BY month
@@ -253,13 +262,13 @@ def employee_kpi_mcp(params):
         return {
             "success": True,
             "metric": metric,
-            "data": db.execute_query(sql, sql_params)
+            "data": fetch_rows(sql, sql_params, metric, group_by, filters, time_range)
         }
     elif metric == "headcount_vs_eligibility":
         trend_where = list(where)
         # Default to active if no status filter provided
         if not filters.get("status"):
-            trend_where.append("LOWER(e.status) = 'active'")
+            trend_where.append("e.status_key = 'active'")
 
         if time_range:
             trend_where.append(
@@ -269,7 +278,6 @@ def employee_kpi_mcp(params):
             sql_params["end_date"] = f"{time_range['to']}-31"
 
         sql = f"""
-        {ELIGIBLE_DEPARTMENTS_CTE}
         SELECT
             strftime('%Y-%m', e.dateofjoining) AS month,
             COUNT(DISTINCT e.iga_code) AS total_headcount,
@@ -280,8 +288,8 @@ def employee_kpi_mcp(params):
                 END
             ) AS eligible_headcount
         FROM {EMPLOYEE_TABLE} e
-        LEFT JOIN entitlement_departments ed
-            ON LOWER(e.function) = LOWER(ed.normalized_department)
+        LEFT JOIN {ELIGIBLE_DEPARTMENTS_TABLE} ed
+            ON e.function_key = ed.department_key
         WHERE {' AND '.join(trend_where)}
         GROUP BY month
         ORDER BY month
@@ -289,15 +297,15 @@ def employee_kpi_mcp(params):
         return {
             "success": True,
             "metric": metric,
-            "data": db.execute_query(sql, sql_params)
+            "data": fetch_rows(sql, sql_params, metric, group_by, filters, time_range)
         }
     elif metric == "department_summary":
         sql = f"""
         SELECT
             function AS department,
             COUNT(DISTINCT iga_code) AS total_employees,
-            COUNT(DISTINCT CASE WHEN LOWER(status) = 'active' THEN iga_code END) AS active_employees,
-            COUNT(DISTINCT CASE WHEN LOWER(status) = 'inactive' THEN iga_code END) AS inactive_employees,
+            COUNT(DISTINCT CASE WHEN status_key = 'active' THEN iga_code END) AS active_employees,
+            COUNT(DISTINCT CASE WHEN status_key = 'inactive' THEN iga_code END) AS inactive_employees,
             COUNT(DISTINCT baselocationtext) AS number_of_locations_present
         FROM {EMPLOYEE_TABLE} e
         WHERE {' AND '.join(where)}
@@ -309,7 +317,7 @@ def employee_kpi_mcp(params):
             "metric": metric,
             "group_by": "department",
             "filters": filters,
-            "data": db.execute_query(sql, sql_params)
+            "data": fetch_rows(sql, sql_params, metric, group_by, filters, time_range)
         }
     else:
         # =================================================
@@ -322,12 +330,12 @@ def employee_kpi_mcp(params):
         elif metric == "active":
             select = "COUNT(DISTINCT iga_code) AS value"
             if not filters.get("status"):
-                where.append("LOWER(status) = 'active'")
+                where.append("status_key = 'active'")
             group = ""
         elif metric == "inactive":
             select = "COUNT(DISTINCT iga_code) AS value"
             if not filters.get("status"):
-                where.append("LOWER(status) = 'inactive'")
+                where.append("status_key = 'inactive'")
             group = ""
         elif metric == "status":
             select = "status AS label, COUNT(DISTINCT iga_code) AS value"
@@ -356,8 +364,8 @@ def employee_kpi_mcp(params):
                 select = """
                     function AS department,
                     COUNT(DISTINCT iga_code) AS total_employees,
-                    COUNT(DISTINCT CASE WHEN LOWER(status) = 'active' THEN iga_code END) AS active_employees,
-                    COUNT(DISTINCT CASE WHEN LOWER(status) = 'inactive' THEN iga_code END) AS inactive_employees,
+                    COUNT(DISTINCT CASE WHEN status_key = 'active' THEN iga_code END) AS active_employees,
+                    COUNT(DISTINCT CASE WHEN status_key = 'inactive' THEN iga_code END) AS inactive_employees,
                     COUNT(DISTINCT baselocationtext) AS number_of_locations_present
                 """
             group = "GROUP BY function"
@@ -409,5 +417,5 @@ def employee_kpi_mcp(params):
             "group_by": group_by,
             "filters": filters,
             "time_range": time_range,
-            "data": db.execute_query(sql, sql_params)
+            "data": fetch_rows(sql, sql_params, metric, group_by, filters, time_range)
         }
\ No newline at end of file
@@ -0,0 +1,114 @@
+import functools
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from database import db
+from tools.pagination import PAGE_PARAMS, STREAM_PAGE_ERROR, page_of
+
+
+class KPIResultCache:
+    """
+    In-memory cache of KPI tool results.
+
+    Keyed on a canonical hash of (tool, metric, group_by, filters, time_range).
+    The whole cache is dropped as soon as the database signature changes,
+    so results never outlive the snapshot they were computed from.
+    """
+
+    def __init__(self, database=db, max_entries: int = 512):
+        self.database = database
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._signature = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(tool: str, params: dict) -> str:
+        canonical = {
+            "tool": tool,
+            "metric": params.get("metric"),
+            "group_by": params.get("group_by"),
+            "filters": params.get("filters"),
+            "time_range": params.get("time_range")
+        }
+        raw = json.dumps(canonical, sort_keys=True, default=str)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        """Returns (result or None, signature the lookup was made against)"""
+        signature = self.database.data_signature()
+        with self._lock:
+            if signature != self._signature:
+                self._entries.clear()
+                self._signature = signature
+
+            if key not in self._entries:
+                self.misses += 1
+                return None, signature
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key], signature
+
+    def set(self, key: str, result, signature):
+        with self._lock:
+            # The data changed while the result was being computed
+            if signature != self._signature:
+                return
+
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+kpi_cache = KPIResultCache()
+
+
+def cached_kpi(tool: str):
+    """
+    Decorator for the *_kpi_mcp functions.
+    Cached results are shared between callers and must be treated as read-only.
+    Streaming calls (params["stream"]) hold live row generators and bypass the
+    cache; they cannot be paged, so page params are rejected rather than ignored.
+    Page params are not part of the key: the full result is cached and each
+    page (limit / cursor / order_by) is cut from it.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(params):
+            if params.get("stream"):
+                if any(params.get(name) is not None for name in PAGE_PARAMS):
+                    raise ValueError(STREAM_PAGE_ERROR)
+                return func(params)
+
+            # Key before calling - some metrics rewrite params while redirecting
+            key = KPIResultCache.make_key(tool, params)
+
+            result, signature = kpi_cache.get(key)
+            if result is None:
+                result = func(params)
+                kpi_cache.set(key, result, signature)
+
+            return page_of(result, params)
+
+        return wrapper
+
+    return decorator
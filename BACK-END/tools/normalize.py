@@ -0,0 +1,257 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+
+from database import db
+from tools.departments import ALIAS_TABLE, ENTITLEMENT_DEPARTMENTS, write_alias_table
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------
+# SOURCE TABLES (as loaded from the Excel sheets)
+# -------------------------------
+EMPLOYEE_SOURCE = "active_and_inactive_employees_details_as_on_01_09_2025_sheet1"
+ENTITLEMENT_SOURCE = "entitlement_detail_entitlement"
+
+# -------------------------------
+# DERIVED TABLES
+# Lower-cased *_key columns are computed by SQLite's own LOWER() so
+# "key = LOWER(:param)" matches exactly what "LOWER(col) = LOWER(:param)" did,
+# but can use an index.
+# -------------------------------
+EMPLOYEE_TABLE = "employee_normalized"
+ENTITLEMENT_TABLE = "entitlement_normalized"
+ELIGIBLE_DEPARTMENTS_TABLE = "eligible_departments"
+META_TABLE = "normalized_meta"
+
+# Entitlement departments are mapped through the department_alias table -
+# same result as the original CASE on UPPER(department), ELSE TRIM(department)
+CANONICAL_DEPARTMENT = "COALESCE(a.department, TRIM(s.department))"
+
+# Also used by the change feed to re-derive individual employees
+EMPLOYEE_SELECT = f"""
+SELECT
+    s.*,
+    LOWER(s.function) AS function_key,
+    LOWER(s.status) AS status_key,
+    LOWER(s.gender_picklist_label) AS gender_key,
+    UPPER(SUBSTR(s.gender_picklist_label, 1, 1)) AS gender_initial,
+    LOWER(s.baselocationtext) AS location_key
+FROM {EMPLOYEE_SOURCE} s
+"""
+
+BUILD_STATEMENTS = [
+    f"DROP TABLE IF EXISTS {EMPLOYEE_TABLE}",
+    f"CREATE TABLE {EMPLOYEE_TABLE} AS {EMPLOYEE_SELECT}",
+    f"CREATE INDEX idx_{EMPLOYEE_TABLE}_function ON {EMPLOYEE_TABLE} (function_key, status_key)",
+    f"CREATE INDEX idx_{EMPLOYEE_TABLE}_status ON {EMPLOYEE_TABLE} (status_key)",
+    f"CREATE INDEX idx_{EMPLOYEE_TABLE}_gender ON {EMPLOYEE_TABLE} (gender_key)",
+    f"CREATE INDEX idx_{EMPLOYEE_TABLE}_location ON {EMPLOYEE_TABLE} (location_key)",
+    f"CREATE INDEX idx_{EMPLOYEE_TABLE}_joining ON {EMPLOYEE_TABLE} (dateofjoining)",
+
+    f"DROP TABLE IF EXISTS {ENTITLEMENT_TABLE}",
+    f"""
+    CREATE TABLE {ENTITLEMENT_TABLE} AS
+    SELECT
+        {CANONICAL_DEPARTMENT} AS department,
+        TRIM(s.item_name) AS item_name,
+        UPPER(TRIM(s.gender)) AS gender,
+        TRIM(s.base_location) AS base_location,
+        s.frequency,
+        s.quantity,
+        LOWER({CANONICAL_DEPARTMENT}) AS department_key,
+        LOWER(TRIM(s.item_name)) AS item_key,
+        LOWER(TRIM(s.base_location)) AS base_location_key
+    FROM {ENTITLEMENT_SOURCE} s
+    LEFT JOIN {ALIAS_TABLE} a
+        ON a.alias_key = UPPER(s.department)
+    """,
+    f"CREATE INDEX idx_{ENTITLEMENT_TABLE}_department ON {ENTITLEMENT_TABLE} (department_key)",
+    f"CREATE INDEX idx_{ENTITLEMENT_TABLE}_item ON {ENTITLEMENT_TABLE} (item_key)",
+
+    f"DROP TABLE IF EXISTS {ELIGIBLE_DEPARTMENTS_TABLE}",
+    f"""
+    CREATE TABLE {ELIGIBLE_DEPARTMENTS_TABLE} AS
+    SELECT DISTINCT
+        department AS normalized_department,
+        department_key
+    FROM {ENTITLEMENT_TABLE}
+    """,
+    f"CREATE INDEX idx_{ELIGIBLE_DEPARTMENTS_TABLE}_key ON {ELIGIBLE_DEPARTMENTS_TABLE} (department_key)",
+]
+
+
+# Fingerprints are the sum of one digest per source row, so the change
+# feed can shift them by the touched rows instead of re-hashing the sheets
+FINGERPRINT_MODULUS = 1 << 160
+
+
+def row_digest(table: str, row) -> int:
+    return int.from_bytes(hashlib.sha1(repr((table, tuple(row))).encode("utf-8")).digest(), "big")
+
+
+def rows_digest(conn, table: str, where: str = "1", params=()) -> int:
+    """Sum of the row digests of the matching rows"""
+    return sum(row_digest(table, row) for row in conn.execute(f"SELECT * FROM {table} WHERE {where}", params))
+
+
+def format_fingerprint(value: int) -> str:
+    return f"{value % FINGERPRINT_MODULUS:040x}"
+
+
+def source_fingerprint(conn) -> str:
+    """Content hash of the source tables - the derived tables are stale when it changes"""
+    # Editing the entitlement department map must also trigger a rebuild
+    total = row_digest("ENTITLEMENT_DEPARTMENTS", sorted(ENTITLEMENT_DEPARTMENTS.items()))
+    for table in (EMPLOYEE_SOURCE, ENTITLEMENT_SOURCE):
+        total += rows_digest(conn, table)
+    return format_fingerprint(total)
+
+
+def shift_fingerprint(fingerprint: str, removed: int, added: int) -> str:
+    """The fingerprint once rows digesting to `removed` are replaced by rows digesting to `added`"""
+    return format_fingerprint(int(fingerprint, 16) - removed + added)
+
+
+def stored_fingerprint(conn, name: str = "normalized"):
+    try:
+        row = conn.execute(
+            f"SELECT fingerprint FROM {META_TABLE} WHERE name = ?", (name,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+
+def record_fingerprint(conn, name: str, fingerprint: str):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {META_TABLE} (
+            name TEXT PRIMARY KEY,
+            fingerprint TEXT,
+            built_at TEXT
+        )
+    """)
+    conn.execute(
+        f"INSERT OR REPLACE INTO {META_TABLE} VALUES (?, ?, datetime('now'))",
+        (name, fingerprint)
+    )
+
+
+def build(conn, fingerprint: str):
+    """Rebuilds every derived table inside the caller's transaction"""
+    write_alias_table(conn)
+    for statement in BUILD_STATEMENTS:
+        conn.execute(statement)
+    record_fingerprint(conn, "normalized", fingerprint)
+
+
+class NormalizedTables:
+    """
+    Keeps the derived tables in step with the source tables.
+
+    refresh() hashes the source tables and rebuilds when the hash differs
+    from the one recorded at the last build - it runs at ingest and at
+    server / API startup. The request path (ensure) only compares the cheap
+    database signature and checks that the derived tables exist; it never
+    hashes or writes.
+    """
+
+    def __init__(self, database=db):
+        self.database = database
+        self.rebuilds = 0
+        self._checked = None
+        self._lock = threading.Lock()
+
+    def ensure(self):
+        if self._current() == self._checked:
+            return
+
+        with self._lock:
+            current = self._current()
+            if current == self._checked:
+                return
+
+            with self.database.connect() as conn:
+                if stored_fingerprint(conn) is None:
+                    raise RuntimeError(
+                        "Normalized tables are missing - run `python -m tools.normalize` "
+                        "or start the MCP server / dashboard API to build them"
+                    )
+            self._checked = current
+
+    def refresh(self):
+        """Rebuilds the derived tables when the source tables changed (ingest / startup)"""
+        with self._lock:
+            try:
+                self._refresh()
+            except sqlite3.Error:
+                # Read-only deployments keep serving the tables built at ingest
+                with self.database.connect() as conn:
+                    if stored_fingerprint(conn) is None:
+                        raise
+                logger.exception("Could not refresh normalized tables, serving the existing ones")
+
+            self._checked = self._current()
+
+    def rebuild(self):
+        """Unconditional rebuild, for the ingest step"""
+        with self._lock:
+            with self.database.connect_writable() as conn:
+                conn.isolation_level = None
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    build(conn, source_fingerprint(conn))
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+            self.rebuilds += 1
+            self._checked = self._current()
+
+    def _current(self):
+        return (str(self.database.path), self.database.data_signature())
+
+    def _refresh(self):
+        with self.database.connect() as conn:
+            fingerprint = source_fingerprint(conn)
+            if stored_fingerprint(conn) == fingerprint:
+                return
+
+        with self.database.connect_writable() as conn:
+            conn.isolation_level = None
+            # IMMEDIATE serialises concurrent rebuilds across processes
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                fingerprint = source_fingerprint(conn)
+                if stored_fingerprint(conn) != fingerprint:
+                    logger.info("Rebuilding normalized employee/entitlement tables")
+                    build(conn, fingerprint)
+                    self.rebuilds += 1
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+
+normalized_tables = NormalizedTables()
+
+
+def ensure_normalized():
+    """Request path: cheap signature check only"""
+    normalized_tables.ensure()
+
+
+def refresh_normalized():
+    """Startup / ingest: rebuild the derived tables and the demand ledger if the source tables changed"""
+    normalized_tables.refresh()
+    # Imported here: the ledger module builds on this one
+    from tools.demand_ledger import refresh_demand_ledger
+    refresh_demand_ledger()
+
+
+if __name__ == "__main__":
+    # Ingest step: python -m tools.normalize
+    logging.basicConfig(level=logging.INFO)
+    normalized_tables.rebuild()
+    logger.info("Normalized tables rebuilt")
@@ -0,0 +1,95 @@
+import re
+
+from tools.columnar import ColumnarEngine, UnsupportedData, np
+from tools.normalize import EMPLOYEE_TABLE, ELIGIBLE_DEPARTMENTS_TABLE
+
+# -------------------------------
+# CUBE
+# One cell per distinct (department, status, gender, location, join month,
+# relieve month) combination, weighted by the employees in it. Every
+# employee_kpi filter / group_by is a roll-up over these cells.
+# -------------------------------
+CUBE_SQL = f"""
+SELECT
+    e.function,
+    e.status,
+    e.gender_picklist_label,
+    e.baselocationtext,
+    SUBSTR(e.dateofjoining, 1, 7) AS dateofjoining,
+    SUBSTR(e.dateofrelieving, 1, 7) AS dateofrelieving,
+    strftime('%Y-%m', e.dateofjoining) AS join_month,
+    e.function_key,
+    e.status_key,
+    e.gender_key,
+    e.location_key,
+    ed.normalized_department,
+    COUNT(e.iga_code) AS employees
+FROM {EMPLOYEE_TABLE} e
+LEFT JOIN {ELIGIBLE_DEPARTMENTS_TABLE} ed
+    ON e.function_key = ed.department_key
+GROUP BY 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12
+"""
+
+MONTH_PATTERN = re.compile(r"\d{4}-\d{2}")
+DATE_PATTERN = re.compile(r"\d{4}-\d{2}-(\d{2})(.*)", re.DOTALL)
+
+
+def month_comparable(value) -> bool:
+    """
+    True when comparing the date string against 'YYYY-MM-01' / 'YYYY-MM-31'
+    gives the same answer as comparing its 'YYYY-MM' prefix against 'YYYY-MM'.
+    """
+    if value is None:
+        return True
+    if not isinstance(value, str):
+        return False
+
+    match = DATE_PATTERN.fullmatch(value)
+    if not match:
+        return False
+
+    day, rest = match.groups()
+    if day == "31":
+        return rest == ""
+    return "01" <= day <= "30"
+
+
+class EmployeeCube(ColumnarEngine):
+    """
+    ColumnarEngine over cube cells instead of rows.
+
+    Counts are summed cell weights, which equals COUNT(DISTINCT iga_code)
+    only while iga_code is unique; time ranges are answered at month
+    granularity, so only well-formed 'YYYY-MM' bounds are accepted.
+    """
+
+    def load_counts(self, records):
+        self.iga = None
+        self.iga_null_code = None
+        self.weights = np.fromiter(
+            (row["employees"] for row in records), dtype=np.int64, count=len(records)
+        )
+        self.iga_unique = True
+
+    def bounds(self, from_month, to_month):
+        for month in (from_month, to_month):
+            if not isinstance(month, str) or not MONTH_PATTERN.fullmatch(month):
+                return None
+        return from_month, to_month
+
+
+def build_cube(conn, eligible_departments: int, total_departments: int) -> EmployeeCube:
+    """Aggregates the normalized employee table into an EmployeeCube"""
+    counted, distinct = conn.execute(
+        f"SELECT COUNT(iga_code), COUNT(DISTINCT iga_code) FROM {EMPLOYEE_TABLE}"
+    ).fetchone()
+    if counted != distinct:
+        raise UnsupportedData("iga_code is not unique")
+
+    for column in ("dateofjoining", "dateofrelieving"):
+        for (value,) in conn.execute(f"SELECT DISTINCT {column} FROM {EMPLOYEE_TABLE}"):
+            if not month_comparable(value):
+                raise UnsupportedData(f"{column} holds {value!r}")
+
+    cells = conn.execute(CUBE_SQL).fetchall()
+    return EmployeeCube(cells, eligible_departments, total_departments)
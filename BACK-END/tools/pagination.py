@@ -0,0 +1,180 @@
+import base64
+import bisect
+import json
+import threading
+from collections import OrderedDict
+
+from tools.columnar import sqlite_sort_key
+
+# -------------------------------
+# KEYSET PAGINATION
+# Row-returning metrics accept limit / cursor / order_by. The full result
+# is computed (and cached) once per snapshot; pages are cut from a sorted
+# key index of it, so a page costs O(log n + limit) and the payload only
+# carries the visible rows. The cursor is not pushed into the SQL: a cold
+# first page still runs the whole query. Streams are never paged - page
+# params on a streaming call are an error.
+#
+# order_by: "column", "-column" (descending), or several comma separated.
+# Ties are broken by the metric's own row order, so pages never overlap.
+# -------------------------------
+PAGE_PARAMS = ("limit", "cursor", "order_by")
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+SORT_INDEX_CACHE_SIZE = 64
+STREAM_PAGE_ERROR = "limit / cursor / order_by cannot be combined with streaming - use /dashboard/kpi to page"
+
+
+class Descending:
+    """Sort key wrapper that reverses the comparison"""
+    __slots__ = ("key",)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+
+def parse_order_by(order_by) -> list:
+    """'-total_quantity_needed,item_name' → [("total_quantity_needed", True), ("item_name", False)]"""
+    if not order_by:
+        return []
+    if not isinstance(order_by, str):
+        raise ValueError("order_by must be a string such as 'department' or '-total_employees'")
+
+    terms = []
+    for term in order_by.split(","):
+        term = term.strip()
+        descending = term.startswith("-")
+        column = term.lstrip("+-").strip()
+        if not column:
+            raise ValueError(f"Invalid order_by: {order_by!r}")
+        terms.append((column, descending))
+    return terms
+
+
+def sort_key(values, terms, position: int):
+    return tuple(
+        Descending(sqlite_sort_key(value)) if descending else sqlite_sort_key(value)
+        for value, (_, descending) in zip(values, terms)
+    ) + (position,)
+
+
+def encode_cursor(order_by: str, values: list, position: int) -> str:
+    raw = json.dumps({"o": order_by or "", "k": values, "p": position}, default=str)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, order_by: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        token = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        values, position = token["k"], int(token["p"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+    if token.get("o", "") != (order_by or ""):
+        raise ValueError("cursor was issued for a different order_by")
+    return values, position
+
+
+class SortIndex:
+    """Sorted keys for one (result rows, order_by) pair"""
+
+    def __init__(self, rows: list, terms: list):
+        self.rows = rows
+        keyed = sorted(
+            (sort_key([row.get(column) for column, _ in terms], terms, position), position)
+            for position, row in enumerate(rows)
+        )
+        self.keys = [key for key, _ in keyed]
+        self.order = [position for _, position in keyed]
+
+
+class SortIndexCache:
+    """
+    Small LRU of SortIndex objects. Results come from the KPI cache, so the
+    same list object is paged repeatedly until the snapshot changes.
+    """
+
+    def __init__(self, max_entries: int = SORT_INDEX_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, rows: list, terms: list) -> SortIndex:
+        key = (id(rows), tuple(terms))
+        with self._lock:
+            index = self._entries.get(key)
+            # id() can be reused once a result is dropped - check identity
+            if index is not None and index.rows is rows:
+                self._entries.move_to_end(key)
+                return index
+
+        index = SortIndex(rows, terms)
+        with self._lock:
+            self._entries[key] = index
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+
+sort_indexes = SortIndexCache()
+
+
+def paginate(result: dict, limit=None, cursor=None, order_by=None) -> dict:
+    """Copy of a tool result with one page of its data and a "page" block"""
+    rows = result.get("data")
+    if not isinstance(rows, list):
+        return result
+
+    if limit is None:
+        limit = DEFAULT_PAGE_SIZE
+    if isinstance(limit, bool) or not isinstance(limit, int) or not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be an integer between 1 and {MAX_PAGE_SIZE}")
+
+    terms = parse_order_by(order_by)
+    columns = set().union(*(row.keys() for row in rows)) if rows else set()
+    unknown = [column for column, _ in terms if rows and column not in columns]
+    if unknown:
+        raise ValueError(
+            f"Cannot order by {', '.join(unknown)}. Available: {', '.join(sorted(columns))}"
+        )
+
+    index = sort_indexes.get(rows, terms)
+    start = 0
+    if cursor:
+        values, position = decode_cursor(cursor, order_by)
+        start = bisect.bisect_right(index.keys, sort_key(values, terms, position))
+
+    positions = index.order[start:start + limit]
+    page = [rows[position] for position in positions]
+
+    next_cursor = None
+    if start + limit < len(rows):
+        last = rows[positions[-1]]
+        next_cursor = encode_cursor(order_by, [last.get(column) for column, _ in terms], positions[-1])
+
+    return {
+        **result,
+        "data": page,
+        "page": {
+            "limit": limit,
+            "order_by": order_by,
+            "returned": len(page),
+            "total_rows": len(rows),
+            "next_cursor": next_cursor
+        }
+    }
+
+
+def page_of(result: dict, params: dict) -> dict:
+    """The result untouched when params carry no page params, otherwise one page of it"""
+    if all(params.get(name) is None for name in PAGE_PARAMS):
+        return result
+    return paginate(result, params.get("limit"), params.get("cursor"), params.get("order_by"))
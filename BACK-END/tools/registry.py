@@ -0,0 +1,207 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from database import POOL_SIZE, past_deadline, query_deadline
+from mcp_client import MCPError
+
+from tools.employee_kpi import employee_kpi_mcp
+from tools.pagination import PAGE_PARAMS
+from tools.wire_format import apply_format
+from tools.uniform_entitlement_kpi import STREAMING_METRICS, uniform_entitlement_kpi_mcp
+
+logger = logging.getLogger(__name__)
+
+
+# -------------------------------
+# TOOL REGISTRY
+# Shared by the MCP server and the in-process transport so both
+# build the same params and the same result envelope.
+# -------------------------------
+TOOLS = {
+    "employee_kpi": employee_kpi_mcp,
+    "uniform_entitlement_kpi": uniform_entitlement_kpi_mcp,
+}
+
+# Metrics that can hand back a lazy row generator (see stream_tool)
+STREAMABLE = {
+    "uniform_entitlement_kpi": STREAMING_METRICS,
+}
+
+STREAM_CHUNK_ROWS = 500  # rows per NDJSON "rows" record
+
+
+def build_params(tool_name: str, arguments: dict) -> dict:
+    """Flat tool arguments → params dict, with the MCP tool defaults applied"""
+    arguments = arguments or {}
+
+    if tool_name == "employee_kpi":
+        params = {
+            "metric": arguments.get("metric", "total"),
+            "group_by": arguments.get("group_by", "none"),
+            "filters": arguments.get("filters") or {},
+            "time_range": arguments.get("time_range")
+        }
+    else:
+        params = {
+            "metric": arguments.get("metric"),
+            "filters": arguments.get("filters") or {},
+            "time_range": arguments.get("time_range") or None
+        }
+
+    # Keyset pagination (tools.pagination) - only passed on when asked for
+    for name in PAGE_PARAMS:
+        if arguments.get(name) is not None:
+            params[name] = arguments[name]
+    return params
+
+
+def run_tool(tool_name: str, arguments: dict, stream: bool = False) -> dict:
+    """
+    Runs a registered tool and returns the JSON payload the MCP server would send,
+    in the wire format named by arguments["format"] (tools.wire_format).
+    With stream=True a streamable metric returns its data as a row generator.
+    """
+    if tool_name not in TOOLS:
+        return {
+            "final": True,
+            "status": "error",
+            "reason": f"Unknown tool: {tool_name}"
+        }
+
+    params = build_params(tool_name, arguments)
+    logger.info(f"{tool_name} params = {params}")
+    if stream:
+        params["stream"] = True
+
+    try:
+        data = TOOLS[tool_name](params)
+        result = {
+            "final": True,
+            "status": "success",
+            **data
+        }
+        # NDJSON streams have their own record shape
+        return result if stream else apply_format(result, (arguments or {}).get("format"))
+    except Exception as e:
+        logger.exception(f"{tool_name} failed")
+        return {
+            "final": True,
+            "status": "error",
+            "reason": str(e)
+        }
+
+
+# -------------------------------
+# NDJSON STREAMING
+# A result is sent as newline-delimited records:
+#   {"type": "meta", ...envelope without data...}
+#   {"type": "rows", "data": [...]}      (zero or more)
+#   {"type": "end", "rows": n, ...}      (plus "summary" when the metric has one)
+# A failure after the meta record is reported as {"type": "error", "reason": ...}.
+# -------------------------------
+def stream_result(result: dict, chunk_size: int = STREAM_CHUNK_ROWS):
+    """Splits a tool result (data as a list or a row generator) into NDJSON records"""
+    envelope = dict(result)
+    data = envelope.pop("data", None)
+    summary = envelope.pop("summary", None)
+
+    # Non-tabular data (e.g. the coverage matrix) travels whole in the meta record
+    if data is not None and not isinstance(data, list) and not hasattr(data, "__next__"):
+        envelope["data"] = data
+        data = None
+
+    yield {"type": "meta", **envelope}
+
+    count = 0
+    try:
+        chunk = []
+        for row in data or ():
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                count += len(chunk)
+                yield {"type": "rows", "data": chunk}
+                chunk = []
+        if chunk:
+            count += len(chunk)
+            yield {"type": "rows", "data": chunk}
+    except Exception as e:
+        logger.exception("Streaming rows failed")
+        yield {"type": "error", "reason": str(e)}
+        return
+    finally:
+        if hasattr(data, "close"):
+            data.close()
+
+    end = {"type": "end", "rows": count}
+    if summary is not None:
+        end["summary"] = summary
+    yield end
+
+
+def stream_tool(tool_name: str, arguments: dict, chunk_size: int = STREAM_CHUNK_ROWS):
+    """
+    run_tool as NDJSON records. Streamable metrics read their rows from a
+    database cursor while the records are consumed; the rest are chunked
+    from the finished result.
+    """
+    metric = build_params(tool_name, arguments).get("metric")
+    stream = metric in STREAMABLE.get(tool_name, ())
+    yield from stream_result(run_tool(tool_name, arguments, stream=stream), chunk_size)
+
+
+# One worker per pooled connection, so tool threads never queue on the pool
+TOOL_WORKERS = POOL_SIZE
+
+
+def run_tool_until(timeout: float, tool_name: str, arguments: dict) -> dict:
+    """run_tool with its SQL interrupted once timeout seconds have passed"""
+    with query_deadline(timeout):
+        result = run_tool(tool_name, arguments)
+        # An interrupted query comes back as an error result - report the timeout instead
+        if past_deadline():
+            raise TimeoutError(f"{tool_name} ran past {timeout}s")
+        return result
+
+
+class InProcessToolClient:
+    """
+    Drop-in replacement for MCPClient when the API and the tools share a host:
+    calls the registry directly, skipping the HTTP hop and JSON-RPC encoding.
+
+    Calls run on a dedicated bounded executor, not the default one shared
+    with Starlette. The timeout is enforced on the database connection: a
+    call past it is interrupted at its next SQL step and frees its worker.
+    Pure-Python steps (cube, columnar stores) run to completion, so for
+    those the timeout only releases the caller.
+    """
+
+    def __init__(self, workers: int = TOOL_WORKERS):
+        self.workers = workers
+        self._executor = None
+
+    async def start(self):
+        pass
+
+    async def aclose(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="tool")
+        return self._executor
+
+    async def call_tool(self, tool_name: str, arguments: dict, timeout: float = None):
+        call = asyncio.get_running_loop().run_in_executor(
+            self.executor, run_tool_until, timeout, tool_name, arguments
+        )
+        if not timeout:
+            return await call
+
+        try:
+            return await asyncio.wait_for(call, timeout)
+        except (asyncio.TimeoutError, TimeoutError):
+            raise MCPError(f"{tool_name} timed out after {timeout}s")
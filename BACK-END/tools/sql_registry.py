@@ -0,0 +1,165 @@
+import logging
+import re
+import threading
+import time
+
+from database import CACHED_STATEMENTS, db
+
+logger = logging.getLogger(__name__)
+
+# -------------------------------
+# SQL SHAPE REGISTRY
+# Instrumentation only: records each statement the KPI tools run in this
+# process under its (tool, metric) label, counts calls and can dump
+# EXPLAIN QUERY PLAN per shape. It does not build or prepare any SQL -
+# the tools build one text per query shape with stable :param names, and
+# sqlite3's per-connection statement cache (CACHED_STATEMENTS) is what
+# reuses the prepared statements.
+# -------------------------------
+PARAM_PATTERN = re.compile(r"(?<![:\w]):([A-Za-z_]\w*)")
+
+
+class QueryShape:
+    def __init__(self, tool: str, metric: str, sql: str):
+        self.tool = tool
+        self.metric = metric
+        self.sql = sql
+        self.params = tuple(sorted(set(PARAM_PATTERN.findall(sql))))
+        self.calls = 0
+        self.first_seen = time.time()
+
+    def describe(self) -> dict:
+        return {
+            "tool": self.tool,
+            "metric": self.metric,
+            "params": list(self.params),
+            "calls": self.calls,
+            "sql": self.sql
+        }
+
+
+class SqlRegistry:
+    def __init__(self, database=db):
+        self.database = database
+        self._shapes = {}
+        self._lock = threading.Lock()
+
+    def register(self, tool: str, metric: str, sql: str) -> QueryShape:
+        shape = self._shapes.get(sql)
+        if shape is None:
+            with self._lock:
+                shape = self._shapes.get(sql)
+                if shape is None:
+                    shape = QueryShape(tool, metric, sql)
+                    self._shapes[sql] = shape
+                    if len(self._shapes) == CACHED_STATEMENTS + 1:
+                        logger.warning(
+                            f"More than {CACHED_STATEMENTS} SQL shapes registered - "
+                            "raise database.CACHED_STATEMENTS to keep them all prepared"
+                        )
+        return shape
+
+    def statement(self, tool: str, metric: str, sql: str) -> str:
+        """Registers the statement, counts the call and returns its canonical text"""
+        shape = self.register(tool, metric, sql)
+        shape.calls += 1
+        return shape.sql
+
+    def execute(self, tool: str, metric: str, sql: str, params: dict = None, stream: bool = False):
+        sql = self.statement(tool, metric, sql)
+        if stream:
+            return self.database.iter_query(sql, params)
+        return self.database.execute_query(sql, params)
+
+    def shapes(self) -> list:
+        with self._lock:
+            return sorted(self._shapes.values(), key=lambda s: (s.tool, s.metric, s.first_seen))
+
+    def explain(self, shape: QueryShape) -> list:
+        """EXPLAIN QUERY PLAN with every parameter bound to NULL"""
+        with self.database.connect() as conn:
+            rows = conn.execute(
+                f"EXPLAIN QUERY PLAN {shape.sql}", {name: None for name in shape.params}
+            ).fetchall()
+        return [row["detail"] for row in rows]
+
+    def explain_all(self) -> list:
+        report = []
+        for shape in self.shapes():
+            entry = shape.describe()
+            try:
+                entry["plan"] = self.explain(shape)
+            except Exception as e:
+                entry["plan_error"] = str(e)
+            report.append(entry)
+        return report
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "shapes": len(self._shapes),
+                "statement_cache_size": CACHED_STATEMENTS,
+                "calls": sum(shape.calls for shape in self._shapes.values())
+            }
+
+    def clear(self):
+        with self._lock:
+            self._shapes.clear()
+
+
+sql_registry = SqlRegistry()
+
+
+def register_all_shapes():
+    """
+    Offline plan audit only - runs every metric over every filter
+    combination the tools accept so that all SQL shapes get registered
+    (engines answering a query still register the SQL they would fall back
+    to). Calls the tools past the KPI result cache so it is neither read
+    nor filled.
+    """
+    from itertools import combinations
+
+    from tools.employee_kpi import SUPPORTED_GROUP_BY, SUPPORTED_METRICS as EMPLOYEE_METRICS, employee_kpi_mcp
+    from tools.uniform_entitlement_kpi import SUPPORTED_METRICS as UNIFORM_METRICS, uniform_entitlement_kpi_mcp
+
+    employee_kpi = employee_kpi_mcp.__wrapped__
+    uniform_entitlement_kpi = uniform_entitlement_kpi_mcp.__wrapped__
+
+    def subsets(values: dict):
+        keys = list(values)
+        for size in range(len(keys) + 1):
+            for chosen in combinations(keys, size):
+                yield {key: values[key] for key in chosen}
+
+    window = {"from": "2025-09", "to": "2026-08"}
+    employee_filters = {"department": "Cargo", "gender": "Female", "location": "Delhi", "status": "Active"}
+    for metric in EMPLOYEE_METRICS:
+        if metric == "eligibility_by_gender":
+            continue  # redirects to eligible_employees by gender through the cache - same shapes
+        for group_by in SUPPORTED_GROUP_BY:
+            for filters in subsets(employee_filters):
+                for time_range in (None, window):
+                    employee_kpi({
+                        "metric": metric, "group_by": group_by, "filters": filters, "time_range": time_range
+                    })
+
+    demand_filters = {"department": "Cargo", "gender": "Female", "sku": "Shirt"}
+    for metric in UNIFORM_METRICS:
+        for filters in subsets(demand_filters):
+            uniform_entitlement_kpi({"metric": metric, "filters": filters, "time_range": window})
+            if metric == "sku_demand":
+                uniform_entitlement_kpi({
+                    "metric": metric, "filters": {**filters, "months": ["2025-10", "2026-01"]}, "time_range": None
+                })
+
+
+if __name__ == "__main__":
+    # Offline plan audit, against a copy of the database: python -m tools.sql_registry
+    import json
+
+    from tools.sql_registry import register_all_shapes, sql_registry as registry
+
+    logging.basicConfig(level=logging.WARNING)
+    register_all_shapes()
+    print(json.dumps({"stats": registry.stats(), "shapes": registry.explain_all()}, indent=2))
@@ -1,45 +1,94 @@
-from database import db
+from tools.departments import canonicalize_department
+from tools.coverage_matrix import coverage
+from tools.kpi_cache import cached_kpi
+from tools.demand_engine import demand, month_index
+from tools.demand_ledger import demand_ledger
+from tools.normalize import EMPLOYEE_TABLE, ENTITLEMENT_TABLE, ensure_normalized
+from tools.sql_registry import sql_registry
 from datetime import datetime
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
-EMPLOYEE_TABLE = "active_and_inactive_employees_details_as_on_01_09_2025_sheet1"
-ENTITLEMENT_TABLE = "entitlement_detail_entitlement"
+TOOL_NAME = "uniform_entitlement_kpi"
 LAST_ISSUE_DATE = "2025-08-31"
 
-ENTITLEMENT_CTE = f"""
-WITH entitlement_data AS (
-    SELECT
-        CASE
-            WHEN UPPER(department) = 'AOCS'
-                THEN 'Airport Operations & Customer Services'
-            WHEN UPPER(department) IN ('INFLIGHTS', 'INFLIGHT')
-                THEN 'Inflight Services'
-            WHEN UPPER(department) = 'ENGINEERING'
-                THEN 'Engineering'
-            WHEN UPPER(department) = 'CARGO'
-                THEN 'Cargo'
-            ELSE TRIM(department)
-        END AS department,
-        TRIM(item_name) AS item_name,
-        UPPER(TRIM(gender)) AS gender,
-        TRIM(base_location) AS base_location,
-        frequency,
-        quantity
-    FROM {ENTITLEMENT_TABLE}
+# Issuance cycles counted per employee x SKU; None = no cap
+# (the old fixed months_generator stopped at 20)
+DEMAND_MAX_CYCLES = None
+
+SUPPORTED_METRICS = (
+    "unique_skus",
+    "skus_by_department",
+    "skus_by_gender",
+    "skus_by_location",
+    "skus_by_frequency",
+    "entitlement_coverage_matrix",
+    "sku_demand",
+    "employees_with_demand",
+    "all_uniform_entitlements",
+    "total_employees",
 )
-"""
 
+# Metrics whose rows are produced lazily when called with params["stream"]
+STREAMING_METRICS = ("all_uniform_entitlements", "sku_demand")
+
+def run_sql(metric: str, sql: str, sql_params: dict = None, stream: bool = False):
+    """Runs a metric's SQL through the shape registry (rows lazily when streaming)"""
+    return sql_registry.execute(TOOL_NAME, metric, sql, sql_params, stream)
+
+
+def demand_cycle_bound(last_month) -> int:
+    """
+    Cycles any active employee can reach by last_month (a month index).
+    Frequencies are whole months, so it is at most the months since the
+    earliest join, plus one for an issue rolling over into the next month.
+    """
+    if last_month is None:
+        return 0
+
+    first_join = run_sql("sku_demand", f"""
+        SELECT MIN(date(dateofjoining)) AS first_join
+        FROM {EMPLOYEE_TABLE}
+        WHERE status_key = 'active'
+    """)[0]["first_join"]
+    if not first_join:
+        return 0
+
+    return max(last_month - month_index(first_join[:7]) + 1, 0)
+
+
+def count_demand(summary: dict, row: dict):
+    """Adds one sku_demand row to the summary totals"""
+    summary["total_skus"] += 1
+    if row.get('sku_gender') == 'Both/Common':
+        summary["common_skus"] += 1
+    else:
+        summary["department_specific_skus"] += 1
+    summary["total_quantity"] += row.get('total_quantity_needed', 0)
+
+
+def counted_demand(rows, summary: dict):
+    """Streams rows while filling in the summary; it is complete once the rows are exhausted"""
+    for row in rows:
+        count_demand(summary, row)
+        yield row
+
+
+@cached_kpi("uniform_entitlement_kpi")
 def uniform_entitlement_kpi_mcp(params):
+    ensure_normalized()
+
     metric = params.get("metric")
     logger.info(f"uniform_entitlement_kpi_mcp received metric: '{metric}'")
     logger.info(f"Is metric == 'entitlement_coverage_matrix'? {metric == 'entitlement_coverage_matrix'}")
 
     filters = params.get("filters", {})
     time_range = params.get("time_range") or {}
+    stream = bool(params.get("stream")) and metric in STREAMING_METRICS
 
-    where_emp = ["LOWER(e.status) = 'active'"]
+    where_emp = ["e.status_key = 'active'"]
     where_ent = ["1=1"]
     sql_params = {}
 
@@ -48,31 +97,29 @@ def uniform_entitlement_kpi_mcp(params):
         Total count of unique SKU items in the system
         """
         sql = f"""
-        {ENTITLEMENT_CTE}
         SELECT COUNT(DISTINCT item_name) AS value
-        FROM entitlement_data
+        FROM {ENTITLEMENT_TABLE}
         WHERE {' AND '.join(where_ent)}
         """
         return {
             "metric": metric,
             "message": "Total unique SKUs in the system",
-            "data": db.execute_query(sql, sql_params)
+            "data": run_sql(metric, sql, sql_params)
         }
     elif metric == "skus_by_department":
         """
         SKU count grouped by department
         """
         if filters.get("department"):
-            where_ent.append("LOWER(ed.department) = LOWER(:dept)")
-            sql_params["dept"] = filters["department"]
+            where_ent.append("ed.department_key = LOWER(:dept)")
+            sql_params["dept"] = canonicalize_department(filters["department"])
 
         sql = f"""
-        {ENTITLEMENT_CTE}
         SELECT 
             department,
             COUNT(DISTINCT item_name) AS sku_count,
             COUNT(*) AS total_entitlement_records
-        FROM entitlement_data ed
+        FROM {ENTITLEMENT_TABLE} ed
         WHERE {' AND '.join(where_ent)}
         GROUP BY department
         ORDER BY sku_count DESC
@@ -81,18 +128,17 @@ def uniform_entitlement_kpi_mcp(params):
             "metric": metric,
             "filters": filters,
             "message": "SKU count by department",
-            "data": db.execute_query(sql, sql_params)
+            "data": run_sql(metric, sql, sql_params)
         }
     elif metric == "skus_by_gender":
         """
         SKU count grouped by gender
         """
         if filters.get("department"):
-            where_ent.append("LOWER(ed.department) = LOWER(:dept)")
-            sql_params["dept"] = filters["department"]
+            where_ent.append("ed.department_key = LOWER(:dept)")
+            sql_params["dept"] = canonicalize_department(filters["department"])
 
         sql = f"""
-        {ENTITLEMENT_CTE}
         SELECT 
             CASE 
                 WHEN gender = 'M' THEN 'Male'
@@ -101,7 +147,7 @@ def uniform_entitlement_kpi_mcp(params):
                 ELSE gender
             END AS gender,
             COUNT(DISTINCT item_name) AS sku_count
-        FROM entitlement_data ed
+        FROM {ENTITLEMENT_TABLE} ed
         WHERE {' AND '.join(where_ent)}
         GROUP BY gender
         ORDER BY sku_count DESC
@@ -110,22 +156,21 @@ def uniform_entitlement_kpi_mcp(params):
             "metric": metric,
             "filters": filters,
             "message": "SKU count by gender",
-            "data": db.execute_query(sql, sql_params)
+            "data": run_sql(metric, sql, sql_params)
         }
     elif metric == "skus_by_location":
         """
         SKU count grouped by base location
         """
         if filters.get("department"):
-            where_ent.append("LOWER(ed.department) = LOWER(:dept)")
-            sql_params["dept"] = filters["department"]
+            where_ent.append("ed.department_key = LOWER(:dept)")
+            sql_params["dept"] = canonicalize_department(filters["department"])
 
         sql = f"""
-        {ENTITLEMENT_CTE}
         SELECT 
             base_location,
             COUNT(DISTINCT item_name) AS sku_count
-        FROM entitlement_data ed
+        FROM {ENTITLEMENT_TABLE} ed
         WHERE {' AND '.join(where_ent)}
         GROUP BY base_location
         ORDER BY sku_count DESC
@@ -134,18 +179,17 @@ def uniform_entitlement_kpi_mcp(params):
             "metric": metric,
             "filters": filters,
             "message": "SKU count by location",
-            "data": db.execute_query(sql, sql_params)
+            "data": run_sql(metric, sql, sql_params)
         }
     elif metric == "skus_by_frequency":
         """
         SKU count grouped by frequency (how often items are issued)
         """
         if filters.get("department"):
-            where_ent.append("LOWER(ed.department) = LOWER(:dept)")
-            sql_params["dept"] = filters["department"]
+            where_ent.append("ed.department_key = LOWER(:dept)")
+            sql_params["dept"] = canonicalize_department(filters["department"])
 
         sql = f"""
-        {ENTITLEMENT_CTE}
         SELECT 
             frequency,
             CASE 
@@ -156,7 +200,7 @@ def uniform_entitlement_kpi_mcp(params):
                 ELSE frequency || ' months'
             END AS frequency_label,
             COUNT(DISTINCT item_name) AS sku_count
-        FROM entitlement_data ed
+        FROM {ENTITLEMENT_TABLE} ed
         WHERE {' AND '.join(where_ent)}
         GROUP BY frequency
         ORDER BY frequency
@@ -165,43 +209,12 @@ def uniform_entitlement_kpi_mcp(params):
             "metric": metric,
             "filters": filters,
             "message": "SKU count by frequency",
-            "data": db.execute_query(sql, sql_params)
+            "data": run_sql(metric, sql, sql_params)
         }
     elif metric == "entitlement_coverage_matrix":
-        # First, get all unique, normalized departments
-        dept_sql = f"""
-        {ENTITLEMENT_CTE}
-        SELECT DISTINCT department FROM entitlement_data ORDER BY department
-        """
-        dept_rows = db.execute_query(dept_sql, {})
-        departments = [row['department'] for row in dept_rows]
-
-        # Build dynamic CASE statements for the pivot
-        case_statements = []
-        for dept in departments:
-            # The column name needs to be quoted to handle special characters
-            new_line = "MAX(CASE WHEN department = '" + dept.replace("'", "''") + "' THEN 1 ELSE 0 END) AS \"" + dept + "\" "
-            case_statements.append(new_line)
-
-        case_sql = ', '.join(case_statements)
-
-        # Build the final pivot query
-        sql = f"""
-        {ENTITLEMENT_CTE}
-        SELECT
-            item_name AS \"SKU Name\",
-            {case_sql}
-        FROM entitlement_data
-        GROUP BY item_name
-        ORDER BY item_name
-        """
-
-        result_data = db.execute_query(sql, {})
-        
-        matrix_data = {}
-        for row in result_data:
-            sku_name = row.pop("SKU Name")
-            matrix_data[sku_name] = row
+        # Single GROUP BY pass pivoted into per-SKU bitsets, cached per snapshot
+        matrix = coverage.matrix()
+        matrix_data = matrix.sparse() if filters.get("sparse") else matrix.dense()
 
         return {
             "metric": metric,
@@ -221,14 +234,13 @@ def uniform_entitlement_kpi_mcp(params):
         specific_months = filters.get("months", [])  # e.g., ["2025-09", "2025-12", "2026-03"]
         
         if specific_months:
-            # Specific months mode
-            month_conditions = []
-            for i, month in enumerate(specific_months):
-                param_name = f"month_{i}"
-                month_conditions.append(f"strftime('%Y-%m', date(e.dateofjoining, '+' || (nums.n * ed.frequency) || ' months')) = :{param_name}")
-                sql_params[param_name] = month
-            
-            date_filter = f"({' OR '.join(month_conditions)})"
+            # Specific months mode - one JSON array param keeps a single query shape
+            # whatever the number of months (see tools.sql_registry)
+            date_filter = (
+                "strftime('%Y-%m', date(e.dateofjoining, '+' || (nums.n * ed.frequency) || ' months')) "
+                "IN (SELECT value FROM json_each(:months))"
+            )
+            sql_params["months"] = json.dumps(specific_months)
             sql_params["last_issue_date"] = LAST_ISSUE_DATE
             
         elif time_range.get("from") and time_range.get("to"):
@@ -270,32 +282,27 @@ def uniform_entitlement_kpi_mcp(params):
 
         # Apply department filter
         if filters.get("department"):
-            where_emp.append("LOWER(e.function) = LOWER(:dept)")
-            sql_params["dept"] = filters["department"]
+            where_emp.append("e.function_key = LOWER(:dept)")
+            sql_params["dept"] = canonicalize_department(filters["department"])
         
         # Apply gender filter
         if filters.get("gender"):
-            where_emp.append("LOWER(e.gender_picklist_label) = LOWER(:gender)")
+            where_emp.append("e.gender_key = LOWER(:gender)")
             sql_params["gender"] = filters["gender"]
         
         # Apply SKU filter
         if filters.get("sku"):
-            where_ent.append("LOWER(ed.item_name) = LOWER(:sku)")
+            where_ent.append("ed.item_key = LOWER(:sku)")
             sql_params["sku"] = filters["sku"]
         
         # Only items with frequency > 0 (recurring items)
         where_ent.append("ed.frequency > 0")
 
         sql = f"""
-        {ENTITLEMENT_CTE}
-        , months_generator AS (
-            SELECT 0 AS n UNION ALL SELECT 1 UNION ALL SELECT 2 
-            UNION ALL SELECT 3 UNION ALL SELECT 4 UNION ALL SELECT 5
-            UNION ALL SELECT 6 UNION ALL SELECT 7 UNION ALL SELECT 8
-            UNION ALL SELECT 9 UNION ALL SELECT 10 UNION ALL SELECT 11
-            UNION ALL SELECT 12 UNION ALL SELECT 13 UNION ALL SELECT 14
-            UNION ALL SELECT 15 UNION ALL SELECT 16 UNION ALL SELECT 17
-            UNION ALL SELECT 18 UNION ALL SELECT 19 UNION ALL SELECT 20
+        WITH RECURSIVE months_generator(n) AS (
+            SELECT 0
+            UNION ALL
+            SELECT n + 1 FROM months_generator WHERE n < :max_cycles
         ),
         employee_sku_occurrences AS (
             SELECT 
@@ -311,12 +318,12 @@ def uniform_entitlement_kpi_mcp(params):
                 e.baselocationtext,
                 COUNT(*) as occurrence_count
             FROM {EMPLOYEE_TABLE} e
-            JOIN entitlement_data ed 
-                ON LOWER(e.function) = LOWER(ed.department)
+            JOIN {ENTITLEMENT_TABLE} ed 
+                ON e.function_key = ed.department_key
             CROSS JOIN months_generator nums
             WHERE {' AND '.join(where_emp)}
               AND {' AND '.join(where_ent)}
-              AND (ed.gender = 'B' OR UPPER(SUBSTR(e.gender_picklist_label, 1, 1)) = ed.gender)
+              AND (ed.gender = 'B' OR e.gender_initial = ed.gender)
               AND {date_filter}
             GROUP BY 
                 ed.department, 
@@ -355,25 +362,51 @@ def uniform_entitlement_kpi_mcp(params):
             sku_gender
         ORDER BY total_quantity_needed DESC
         """
-        
-        result_data = db.execute_query(sql, sql_params)
-        
+        # Registered up front so the shape is known even when the ledger or engine answers
+        sql_registry.register(TOOL_NAME, metric, sql)
+
+        # Materialized ledger first, then the in-memory engine, then SQL
+        result_data = demand_ledger.sku_demand(
+            filters, time_range, specific_months, LAST_ISSUE_DATE, DEMAND_MAX_CYCLES, stream
+        )
+        engine = demand.engine() if result_data is None else None
+        if engine is not None:
+            result_data = engine.sku_demand(
+                filters, time_range, specific_months, LAST_ISSUE_DATE, DEMAND_MAX_CYCLES
+            )
+
+        if result_data is None:
+            if DEMAND_MAX_CYCLES is not None:
+                sql_params["max_cycles"] = DEMAND_MAX_CYCLES
+            elif specific_months:
+                indexes = [m for m in map(month_index, specific_months) if m is not None]
+                sql_params["max_cycles"] = demand_cycle_bound(max(indexes, default=None))
+            else:
+                # Bounds are compared as strings - allow for the whole end year
+                sql_params["max_cycles"] = demand_cycle_bound(end_dt.year * 12 + 11)
+
+            result_data = run_sql(metric, sql, sql_params, stream)
+
         # Calculate common vs department-specific SKUs
-        common_skus = [row for row in result_data if row.get('sku_gender') == 'Both/Common']
-        dept_specific = [row for row in result_data if row.get('sku_gender') != 'Both/Common']
-        
+        summary = {
+            "total_skus": 0,
+            "common_skus": 0,
+            "department_specific_skus": 0,
+            "total_quantity": 0
+        }
+        if stream:
+            result_data = counted_demand(result_data, summary)
+        else:
+            for row in result_data:
+                count_demand(summary, row)
+
         return {
             "metric": metric,
             "filters": filters,
             "time_range": time_range if not specific_months else None,
             "specific_months": specific_months if specific_months else None,
             "message": "SKU demand calculation",
-            "summary": {
-                "total_skus": len(result_data),
-                "common_skus": len(common_skus),
-                "department_specific_skus": len(dept_specific),
-                "total_quantity": sum(row.get('total_quantity_needed', 0) for row in result_data)
-            },
+            "summary": summary,
             "data": result_data
         }
     elif metric == "employees_with_demand":
@@ -388,24 +421,23 @@ def uniform_entitlement_kpi_mcp(params):
         sql_params["last_issue_date"] = LAST_ISSUE_DATE
 
         if filters.get("department"):
-            where_emp.append("LOWER(e.function) = LOWER(:dept)")
-            sql_params["dept"] = filters["department"]
+            where_emp.append("e.function_key = LOWER(:dept)")
+            sql_params["dept"] = canonicalize_department(filters["department"])
         
         where_ent.append("ed.frequency > 0")
 
         sql = f"""
-        {ENTITLEMENT_CTE}
-        , employees_with_items AS (
+        WITH employees_with_items AS (
             SELECT DISTINCT
                 e.iga_code,
                 e.gender_picklist_label
             FROM {EMPLOYEE_TABLE} e
-            JOIN entitlement_data ed 
-                ON LOWER(e.function) = LOWER(ed.department)
+            JOIN {ENTITLEMENT_TABLE} ed 
+                ON e.function_key = ed.department_key
             WHERE {' AND '.join(where_emp)}
               AND {' AND '.join(where_ent)}
-              AND (ed.gender = 'B' OR UPPER(SUBSTR(e.gender_picklist_label, 1, 1)) = ed.gender)
-              AND (UPPER(ed.base_location) = 'ALL' OR LOWER(ed.base_location) = LOWER(e.baselocationtext))
+              AND (ed.gender = 'B' OR e.gender_initial = ed.gender)
+              AND (ed.base_location_key = 'all' OR ed.base_location_key = e.location_key)
               AND EXISTS (
                   SELECT 1 
                   FROM ( 
@@ -441,14 +473,13 @@ def uniform_entitlement_kpi_mcp(params):
             "filters": filters,
             "time_range": time_range,
             "message": "Total unique employees who will receive items in date range",
-            "data": db.execute_query(sql, sql_params)
+            "data": run_sql(metric, sql, sql_params)
         }
     elif metric == "all_uniform_entitlements":
         """
         Complete list of uniform entitlement rules for local filtering.
         """
         sql = f"""
-        {ENTITLEMENT_CTE}
         SELECT 
             item_name AS sku,
             department,
@@ -460,7 +491,7 @@ def uniform_entitlement_kpi_mcp(params):
             END AS gender,
             base_location,
             frequency
-        FROM entitlement_data
+        FROM {ENTITLEMENT_TABLE}
         WHERE {' AND '.join(where_ent)}
         ORDER BY department, item_name
         """
@@ -469,12 +500,12 @@ def uniform_entitlement_kpi_mcp(params):
             "status": "success",
             "metric": metric,
             "message": "Complete list of uniform entitlement rules for local filtering.",
-            "data": db.execute_query(sql, sql_params)
+            "data": run_sql(metric, sql, sql_params, stream)
         }
     elif metric == "total_employees":
         if filters.get("department"):
-            where_emp.append("LOWER(e.function) = LOWER(:dept)")
-            sql_params["dept"] = filters["department"]
+            where_emp.append("e.function_key = LOWER(:dept)")
+            sql_params["dept"] = canonicalize_department(filters["department"])
 
         sql = f"""
         SELECT
@@ -499,7 +530,7 @@ def uniform_entitlement_kpi_mcp(params):
             "metric": metric,
             "filters": filters,
             "message": "Total active employees",
-            "data": db.execute_query(sql, sql_params)
+            "data": run_sql(metric, sql, sql_params)
         }
     else:
         raise ValueError(f"Unsupported metric: {metric}")
@@ -0,0 +1,68 @@
+try:
+    import msgpack
+except ImportError:  # optional - binary responses fall back to JSON without it
+    msgpack = None
+
+# -------------------------------
+# WIRE FORMATS
+# "rows" (default): data is a list of row objects, as the tools return it.
+# "columnar": key names are sent once -
+#     list data  → {"columns": [...], "rows": [[...], ...]}
+#     dict data  → {"index": [...], "columns": [...], "rows": [[...], ...]}
+#                  (dict of row objects, e.g. the coverage matrix)
+# Anything else (scalars, empty lists) is sent unchanged.
+# -------------------------------
+WIRE_FORMATS = ("rows", "columnar")
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_MEDIA_TYPES = (MSGPACK_MEDIA_TYPE, "application/x-msgpack")
+
+
+def column_names(rows) -> list:
+    """Union of row keys in first-seen order"""
+    columns = {}
+    for row in rows:
+        for name in row:
+            columns.setdefault(name, None)
+    return list(columns)
+
+
+def to_columnar(data):
+    if isinstance(data, list) and data and all(isinstance(row, dict) for row in data):
+        columns = column_names(data)
+        return {
+            "columns": columns,
+            "rows": [[row.get(name) for name in columns] for row in data]
+        }
+
+    if isinstance(data, dict) and data and all(isinstance(row, dict) for row in data.values()):
+        columns = column_names(data.values())
+        return {
+            "index": list(data),
+            "columns": columns,
+            "rows": [[row.get(name) for name in columns] for row in data.values()]
+        }
+
+    return data
+
+
+def apply_format(result: dict, wire_format) -> dict:
+    """Tool result in the requested wire format"""
+    if not wire_format or wire_format == "rows":
+        return result
+    if wire_format not in WIRE_FORMATS:
+        raise ValueError(f"Unsupported format '{wire_format}'. Supported: {', '.join(WIRE_FORMATS)}")
+    if "data" not in result:
+        return result
+    return {**result, "format": wire_format, "data": to_columnar(result["data"])}
+
+
+def wants_msgpack(accept: str) -> bool:
+    """True when the Accept header asks for MessagePack and it can be produced"""
+    if msgpack is None or not accept:
+        return False
+    accepted = [part.split(";")[0].strip().lower() for part in accept.split(",")]
+    return any(media_type in accepted for media_type in MSGPACK_MEDIA_TYPES)
+
+
+def pack(result) -> bytes:
+    return msgpack.packb(result, default=str, use_bin_type=True)
@@ -1,7 +1,7 @@
 import { useState, useMemo } from 'react';
 import { Users, UserCheck } from 'lucide-react';
 import { useQuery } from '@tanstack/react-query'; // ✅ IMPORT
-import { fetchDashboardData } from '@/lib/api'; // ✅ IMPORT
+import { fetchDashboardBatch } from '@/lib/api'; // ✅ IMPORT
 import {
   PieChart,
   Pie,
@@ -58,43 +58,32 @@ export function ActiveEmployeesTab() {
     return query;
   };
 
-  // ================= API QUERIES =================
-  const { data: totalEmployeesData, isLoading: isLoadingTotal } = useQuery({
-    queryKey: ['totalEmployees', deptFilter, locationFilter, statusFilter, genderFilter],
-    queryFn: () => fetchDashboardData(constructQuery('total number of employees')),
+  // ================= API QUERY =================
+  // Every tile of the tab in one /dashboard/batch request
+  const { data: tiles, isLoading } = useQuery({
+    queryKey: ['activeEmployeesTab', deptFilter, locationFilter, statusFilter, genderFilter],
+    queryFn: () => fetchDashboardBatch([
+      { id: 'totalEmployees', question: constructQuery('total number of employees') },
+      { id: 'activeEmployees', question: constructQuery('total number of active employees') },
+      // Charts
+      { id: 'statusDist', question: constructQuery('total employees breakdown by status') },
+      { id: 'activeByDept', question: constructQuery('active employees breakdown by department') },
+      { id: 'activeByGender', question: constructQuery('active employees breakdown by gender') },
+      { id: 'eligibleByMonth', question: constructQuery('eligible employees breakdown by issuance month') },
+      // Table
+      { id: 'deptSummary', question: constructQuery('department summary') },
+    ]),
   });
 
-  const { data: activeEmployeesData, isLoading: isLoadingActive } = useQuery({
-    queryKey: ['activeEmployees', deptFilter, locationFilter, genderFilter],
-    queryFn: () => fetchDashboardData(constructQuery('total number of active employees')),
-  });
-
-  // Charts
-  const { data: statusDistData } = useQuery({
-    queryKey: ['statusDist', deptFilter, locationFilter, genderFilter],
-    queryFn: () => fetchDashboardData(constructQuery('total employees breakdown by status')),
-  });
-
-  const { data: activeByDeptData } = useQuery({
-    queryKey: ['activeByDept', deptFilter, locationFilter, genderFilter],
-    queryFn: () => fetchDashboardData(constructQuery('active employees breakdown by department')),
-  });
-
-  const { data: activeByGenderData } = useQuery({
-    queryKey: ['activeByGender', deptFilter, locationFilter, genderFilter],
-    queryFn: () => fetchDashboardData(constructQuery('active employees breakdown by gender')),
-  });
-
-  const { data: eligibleByMonthData } = useQuery({
-    queryKey: ['eligibleByMonth', deptFilter, locationFilter, genderFilter],
-    queryFn: () => fetchDashboardData(constructQuery('eligible employees breakdown by issuance month')),
-  });
-
-  // Table
-  const { data: deptSummaryData } = useQuery({
-    queryKey: ['deptSummary', deptFilter, locationFilter, genderFilter],
-    queryFn: () => fetchDashboardData(constructQuery('department summary')),
-  });
+  const totalEmployeesData = tiles?.totalEmployees;
+  const activeEmployeesData = tiles?.activeEmployees;
+  const statusDistData = tiles?.statusDist;
+  const activeByDeptData = tiles?.activeByDept;
+  const activeByGenderData = tiles?.activeByGender;
+  const eligibleByMonthData = tiles?.eligibleByMonth;
+  const deptSummaryData = tiles?.deptSummary;
+  const isLoadingTotal = isLoading;
+  const isLoadingActive = isLoading;
 
 
   // ================= DATA PROCESSING =================
@@ -1,6 +1,6 @@
 import { useMemo, useState } from "react";
 import { useQuery } from "@tanstack/react-query";
-import { fetchDashboardData } from "@/lib/api";
+import { streamKpiData } from "@/lib/api";
 import { FilterPanel } from "./FilterPanel";
 import { DataTable } from "./DataTable";
 import { KPICard } from "./KPICard";
@@ -46,7 +46,11 @@ export default function DemandForecastTab() {
   ====================== */
   const { data: masterData, isLoading } = useQuery({
     queryKey: ['demandMasterData'],
-    queryFn: () => fetchDashboardData('total demand SKU'),
+    queryFn: () => streamKpiData({
+      tool: 'uniform_entitlement_kpi',
+      metric: 'sku_demand',
+      time_range: { from: '2025-09', to: '2026-09' },
+    }),
   });
 
   /* =====================
@@ -1,7 +1,7 @@
 import { useMemo } from 'react';
 import { Building2, CheckCircle, XCircle } from 'lucide-react';
 import { useQuery } from '@tanstack/react-query'; // ✅ IMPORT
-import { fetchDashboardData } from '@/lib/api'; // ✅ IMPORT
+import { fetchDashboardBatch } from '@/lib/api'; // ✅ IMPORT
 import {
   BarChart,
   Bar,
@@ -20,21 +20,20 @@ import { DataTable } from './DataTable';
 import { DepartmentEligibility } from '@/data/mockData';
 
 export function DepartmentEligibilityTab() {
-  // ================= API QUERIES =================
-  const { data: totalDeptsData, isLoading: isLoadingTotal } = useQuery({
-    queryKey: ['totalDepts'],
-    queryFn: () => fetchDashboardData('total number of departments'),
+  // ================= API QUERY =================
+  // Every tile of the tab in one /dashboard/batch request
+  const { data: tiles, isLoading: isLoadingEligDepts } = useQuery({
+    queryKey: ['departmentEligibilityTab'],
+    queryFn: () => fetchDashboardBatch([
+      { id: 'totalDepts', tool: 'employee_kpi', arguments: { metric: 'total_departments' } },
+      { id: 'eligibleDepts', tool: 'employee_kpi', arguments: { metric: 'eligible_departments' } },
+      { id: 'deptEligibility', tool: 'employee_kpi', arguments: { metric: 'department_eligibility', format: 'columnar' } },
+    ]),
   });
 
-  const { data: eligibleDeptsData, isLoading: isLoadingEligDepts } = useQuery({
-    queryKey: ['eligibleDepts_page'],
-    queryFn: () => fetchDashboardData('total number of eligible departments'),
-  });
-
-  const { data: deptEligibilityData } = useQuery({
-    queryKey: ['deptEligibilityTable'],
-    queryFn: () => fetchDashboardData('department eligibility summary'),
-  });
+  const totalDeptsData = tiles?.totalDepts;
+  const eligibleDeptsData = tiles?.eligibleDepts;
+  const deptEligibilityData = tiles?.deptEligibility;
 
   // KPI Calculations
   const totalDepartments = totalDeptsData?.data?.[0]?.value || 0;
@@ -1,7 +1,7 @@
 import { useState, useMemo } from 'react';
 import { Users, UserCheck, Percent, Building2 } from 'lucide-react';
 import { useQuery } from '@tanstack/react-query'; // ✅ IMPORT
-import { fetchDashboardData } from '@/lib/api'; // ✅ IMPORT
+import { fetchDashboardBatch } from '@/lib/api'; // ✅ IMPORT
 import {
   PieChart,
   Pie,
@@ -60,50 +60,35 @@ export function EligibleEmployeesTab() {
     return query;
   };
 
-  // ================= API QUERIES =================
-  // ================= API QUERIES =================
-  const { data: totalEmployeesData, isLoading: isLoadingTotal } = useQuery({
-    queryKey: ['totalEmployees_elig', deptFilter, locationFilter, genderFilter, monthFilter],
-    queryFn: () => fetchDashboardData(constructQuery('total number of employees')),
+  // ================= API QUERY =================
+  // Every tile of the tab in one /dashboard/batch request
+  const { data: tiles, isLoading } = useQuery({
+    queryKey: ['eligibleEmployeesTab', deptFilter, locationFilter, genderFilter, monthFilter],
+    queryFn: () => fetchDashboardBatch([
+      { id: 'totalEmployees', question: constructQuery('total number of employees') },
+      { id: 'eligibleEmployees', question: constructQuery('total number of eligible employees') },
+      { id: 'eligibleDepts', tool: 'employee_kpi', arguments: { metric: 'eligible_departments' } },
+      // Charts
+      { id: 'eligibleByDept', question: constructQuery('eligible employees breakdown by department') },
+      { id: 'eligibleByGender', question: constructQuery('eligible employees breakdown by gender') },
+      { id: 'eligibleByMonth', question: constructQuery('eligible employees breakdown by issuance month') },
+      { id: 'eligibleTrend', question: constructQuery('headcount vs eligible trend') },
+      // Table
+      { id: 'eligibleSummary', question: constructQuery('eligible employee summary') },
+    ]),
   });
 
-  const { data: eligibleEmployeesData, isLoading: isLoadingEligible } = useQuery({
-    queryKey: ['eligibleEmployees', deptFilter, locationFilter, genderFilter, monthFilter],
-    queryFn: () => fetchDashboardData(constructQuery('total number of eligible employees')),
-  });
-
-  const { data: eligibleDeptsData, isLoading: isLoadingEligDepts } = useQuery({
-    queryKey: ['eligibleDepts', deptFilter, locationFilter],
-    queryFn: () => fetchDashboardData('total number of eligible departments'),
-  });
-
-  // Charts
-  const { data: eligibleByDeptData } = useQuery({
-    queryKey: ['eligibleByDept', deptFilter, locationFilter, genderFilter, monthFilter],
-    queryFn: () => fetchDashboardData(constructQuery('eligible employees breakdown by department')),
-  });
-
-  const { data: eligibleByGenderData } = useQuery({
-    queryKey: ['eligibleByGender', deptFilter, locationFilter, genderFilter, monthFilter],
-    queryFn: () => fetchDashboardData(constructQuery('eligible employees breakdown by gender')),
-  });
-
-  const { data: eligibleByMonthData } = useQuery({
-    queryKey: ['eligibleByMonth', deptFilter, locationFilter, genderFilter, monthFilter],
-    queryFn: () => fetchDashboardData(constructQuery('eligible employees breakdown by issuance month')),
-  });
-
-
-  const { data: eligibleTrendData } = useQuery({
-    queryKey: ['eligibleTrend', deptFilter, locationFilter, genderFilter],
-    queryFn: () => fetchDashboardData(constructQuery('headcount vs eligible trend')),
-  });
-
-  // Table
-  const { data: eligibleSummaryData } = useQuery({
-    queryKey: ['eligibleSummary', deptFilter, locationFilter, genderFilter, monthFilter],
-    queryFn: () => fetchDashboardData(constructQuery('eligible employee summary')),
-  });
+  const totalEmployeesData = tiles?.totalEmployees;
+  const eligibleEmployeesData = tiles?.eligibleEmployees;
+  const eligibleDeptsData = tiles?.eligibleDepts;
+  const eligibleByDeptData = tiles?.eligibleByDept;
+  const eligibleByGenderData = tiles?.eligibleByGender;
+  const eligibleByMonthData = tiles?.eligibleByMonth;
+  const eligibleTrendData = tiles?.eligibleTrend;
+  const eligibleSummaryData = tiles?.eligibleSummary;
+  const isLoadingTotal = isLoading;
+  const isLoadingEligible = isLoading;
+  const isLoadingEligDepts = isLoading;
 
 
   // ================= DATA PROCESSING =================
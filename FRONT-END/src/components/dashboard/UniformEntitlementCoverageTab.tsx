@@ -1,6 +1,6 @@
 import { useState, useMemo } from "react";
 import { useQuery } from "@tanstack/react-query"; // ✅ IMPORT
-import { fetchDashboardData } from "@/lib/api"; // ✅ IMPORT
+import { streamKpiData } from "@/lib/api"; // ✅ IMPORT
 import { KPICard } from "./KPICard";
 import { FilterPanel } from "./FilterPanel";
 import { ChartCard } from "./ChartCard";
@@ -35,7 +35,7 @@ export default function UniformEntitlementCoverageTab() {
   // Consolidate into a single master query for speed and consistency
   const { data: masterData, isLoading } = useQuery({
     queryKey: ['entitlementMasterData'],
-    queryFn: () => fetchDashboardData('all uniform entitlement details'),
+    queryFn: () => streamKpiData({ tool: 'uniform_entitlement_kpi', metric: 'all_uniform_entitlements' }),
   });
 
   /* =====================
@@ -10,6 +10,16 @@ export interface BackendResponse {
     data: any[];
     summary?: any;
     message?: string;
+    page?: PageInfo;
+}
+
+/** Present when the query asked for limit / cursor / order_by */
+export interface PageInfo {
+    limit: number;
+    order_by: string | null;
+    returned: number;
+    total_rows: number;
+    next_cursor: string | null;
 }
 
 export const fetchDashboardData = async (question: string): Promise<BackendResponse> => {
@@ -28,3 +38,154 @@ export const fetchDashboardData = async (question: string): Promise<BackendRespo
 
     return response.json();
 };
+
+export interface KpiQuery {
+    tool: 'employee_kpi' | 'uniform_entitlement_kpi';
+    metric: string;
+    group_by?: string;
+    filters?: Record<string, unknown>;
+    time_range?: { from: string; to: string };
+    /** Keyset pagination: pass page.next_cursor back with the same order_by */
+    limit?: number;
+    cursor?: string;
+    order_by?: string; // "column", "-column" for descending, comma separated
+    /** "columnar" sends key names once; the response is expanded back to rows here */
+    format?: 'rows' | 'columnar';
+}
+
+/** data as sent with format: "columnar" (index is present for keyed results such as the coverage matrix) */
+export interface ColumnarData {
+    columns: string[];
+    rows: unknown[][];
+    index?: string[];
+}
+
+const isColumnar = (data: unknown): data is ColumnarData =>
+    !!data && typeof data === 'object' && !Array.isArray(data)
+    && Array.isArray((data as ColumnarData).columns) && Array.isArray((data as ColumnarData).rows);
+
+/** Columnar data → the row objects (or keyed row objects) the "rows" format carries */
+export const fromColumnar = (data: ColumnarData): any => {
+    const rows = data.rows.map((values) =>
+        Object.fromEntries(data.columns.map((column, i) => [column, values[i]]))
+    );
+    if (!data.index) return rows;
+    return Object.fromEntries(data.index.map((key, i) => [key, rows[i]]));
+};
+
+const expandResponse = (result: BackendResponse & { format?: string }): BackendResponse => {
+    if (result?.format !== 'columnar' || !isColumnar(result.data)) return result;
+    const { format, ...rest } = result;
+    return { ...rest, data: fromColumnar(result.data) };
+};
+
+export const fetchKpiData = async (query: KpiQuery): Promise<BackendResponse> => {
+    const response = await fetch('http://127.0.0.1:9000/dashboard/kpi', {
+        method: 'POST',
+        headers: {
+            'accept': 'application/json',
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(query),
+    });
+
+    if (!response.ok) {
+        throw new Error('Network response was not ok');
+    }
+
+    return expandResponse(await response.json());
+};
+
+export interface BatchRequestItem {
+    id: string;
+    question?: string;
+    tool?: string;
+    arguments?: Record<string, unknown>;
+}
+
+export const fetchDashboardBatch = async (
+    requests: BatchRequestItem[]
+): Promise<Record<string, BackendResponse>> => {
+    const response = await fetch('http://127.0.0.1:9000/dashboard/batch', {
+        method: 'POST',
+        headers: {
+            'accept': 'application/json',
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ requests }),
+    });
+
+    if (!response.ok) {
+        throw new Error('Network response was not ok');
+    }
+
+    const payload = await response.json();
+    return Object.fromEntries(
+        Object.entries(payload.results as Record<string, BackendResponse>)
+            .map(([id, result]) => [id, expandResponse(result)])
+    );
+};
+
+type StreamRecord =
+    | ({ type: 'meta' } & Partial<BackendResponse>)
+    | { type: 'rows'; data: any[] }
+    | { type: 'end'; rows: number; summary?: any }
+    | { type: 'error'; reason: string; error_type?: string };
+
+/**
+ * NDJSON variant of fetchKpiData for large results (entitlement catalogue,
+ * multi-year demand). Chunks are parsed as they arrive instead of one large
+ * JSON.parse at the end; the promise resolves to the same shape
+ * fetchKpiData returns, and rejects on an error record.
+ */
+export const streamKpiData = async (query: KpiQuery): Promise<BackendResponse> => {
+    const response = await fetch('http://127.0.0.1:9000/dashboard/kpi/stream', {
+        method: 'POST',
+        headers: {
+            'accept': 'application/x-ndjson',
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(query),
+    });
+
+    if (!response.ok || !response.body) {
+        throw new Error('Network response was not ok');
+    }
+
+    let result = { data: [] } as BackendResponse;
+    const rows: any[] = [];
+
+    const handle = (line: string) => {
+        if (!line.trim()) return;
+        const record = JSON.parse(line) as StreamRecord;
+        if (record.type === 'meta') {
+            const { type, ...envelope } = record;
+            result = { ...result, ...envelope } as BackendResponse;
+        } else if (record.type === 'rows') {
+            rows.push(...record.data);
+        } else if (record.type === 'end') {
+            if (record.summary !== undefined) result.summary = record.summary;
+        } else if (record.type === 'error') {
+            throw new Error(record.reason);
+        }
+    };
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop() ?? '';
+        lines.forEach(handle);
+    }
+    handle(buffer + decoder.decode());
+
+    // Non-tabular results (e.g. the coverage matrix) arrive whole in the meta record
+    if (rows.length || !result.data) {
+        result.data = rows;
+    }
+    return result;
+};